@@ -89,9 +89,9 @@ def parse_server_hosts(file_path):
                 variables = ' '.join(parts[1:]) if len(parts) > 1 else ''
                 
                 host_entry = {
-                    "hostname": escape_sql(hostname),
-                    "ip_address": escape_sql(ip_address),
-                    "vars": escape_sql(variables)
+                    "hostname": hostname,
+                    "ip_address": ip_address,
+                    "vars": variables
                 }
                 server_hosts[current_group].append(host_entry)
 
@@ -137,13 +137,13 @@ def parse_service_info(file_path):
             status_port = parts[6]
             management_endpoint = parts[7]
             services[service_name] = {
-                "type": escape_sql(service_type),
+                "type": service_type,
                 "docker": docker,
-                "package": escape_sql(service_package),
-                "config": escape_sql(config_files),
-                "deploy_dir": escape_sql(deploy_dir),
-                "status_port": escape_sql(status_port),
-                "management_endpoint": escape_sql(management_endpoint)
+                "package": service_package,
+                "config": config_files,
+                "deploy_dir": deploy_dir,
+                "status_port": status_port,
+                "management_endpoint": management_endpoint
             }
     return services
 
@@ -161,17 +161,20 @@ def parse_server_mapping(file_path):
             if server_group not in server_groups:
                 server_groups[server_group] = []
             server_groups[server_group].append({
-                "server_host_group": escape_sql(server_host_group),
-                "services": [escape_sql(service) for service in services]
+                "server_host_group": server_host_group,
+                "services": services
             })
     return server_groups
 
 def generate_sql(domain_name, domain_name_alias_list, server_hosts_data, service_info, server_mapping):
+    """
+    Builds the INSERT script for one domain. Parsed values are raw; they are escaped here.
+    """
     server_hosts, parent_groups = server_hosts_data  # Unpack the tuple
     sql_commands = []
     sql_commands.append(f"INSERT INTO Domain (id, name) VALUES (NULL, '{escape_sql(domain_name)}');")
     sql_commands.append(f"SET @domain_id = LAST_INSERT_ID();")
-    sql_commands.append(f"SET @id_prefix = @domain_id * 1000;")
+    sql_commands.append(f"SET @id_prefix = @domain_id * 1000000;")
     
     # Insert aliases for this domain into ResourceAlias
     for alias in domain_name_alias_list:
@@ -195,18 +198,18 @@ def generate_sql(domain_name, domain_name_alias_list, server_hosts_data, service
     
     for idx, (group, hosts) in enumerate(filtered_server_hosts.items(), start=1):
         host_group_ids[group] = f"(@id_prefix + {idx})"
-        sql_commands.append(f"INSERT INTO ServerHostGroup (id, domain_id, name) VALUES ({host_group_ids[group]}, @domain_id, '{group}');")
+        sql_commands.append(f"INSERT INTO ServerHostGroup (id, domain_id, name) VALUES ({host_group_ids[group]}, @domain_id, '{escape_sql(group)}');")
         for host in hosts:
-            sql_commands.append(f"INSERT INTO ServerHost (id, domain_id, hostname, ip_address, server_host_group_id, vars) VALUES (@id_prefix + {server_host_id_counter}, @domain_id, '{host['hostname']}', '{host['ip_address']}', {host_group_ids[group]}, '{host['vars']}');")
+            sql_commands.append(f"INSERT INTO ServerHost (id, domain_id, hostname, ip_address, server_host_group_id, vars) VALUES (@id_prefix + {server_host_id_counter}, @domain_id, '{escape_sql(host['hostname'])}', '{escape_sql(host['ip_address'])}', {host_group_ids[group]}, '{escape_sql(host['vars'])}');")
             server_host_id_counter += 1
     
     for idx, (service, info) in enumerate(service_info.items(), start=1):
         service_ids[service] = f"(@id_prefix + {idx})"
-        sql_commands.append(f"INSERT INTO Service (id, domain_id, name, service_type, docker, service_package_name, service_config_file, service_deploy_dir, status_port, management_endpoint) VALUES ({service_ids[service]}, @domain_id, '{service}', '{info['type']}', {int(info['docker'])}, '{info['package']}', '{info['config']}', '{info['deploy_dir']}', {info['status_port'] if info['status_port'].isdigit() else 'NULL'}, '{info['management_endpoint']}');")
+        sql_commands.append(f"INSERT INTO Service (id, domain_id, name, service_type, docker, service_package_name, service_config_file, service_deploy_dir, status_port, management_endpoint) VALUES ({service_ids[service]}, @domain_id, '{escape_sql(service)}', '{escape_sql(info['type'])}', {int(info['docker'])}, '{escape_sql(info['package'])}', '{escape_sql(info['config'])}', '{escape_sql(info['deploy_dir'])}', {info['status_port'] if info['status_port'].isdigit() else 'NULL'}, '{escape_sql(info['management_endpoint'])}');")
     
     for idx, (server_group, mappings) in enumerate(server_mapping.items(), start=1):
         server_group_ids[server_group] = f"(@id_prefix + {idx})"
-        sql_commands.append(f"INSERT INTO ServerGroup (id, domain_id, name) VALUES ({server_group_ids[server_group]}, @domain_id, '{server_group}');")
+        sql_commands.append(f"INSERT INTO ServerGroup (id, domain_id, name) VALUES ({server_group_ids[server_group]}, @domain_id, '{escape_sql(server_group)}');")
         for mapping in mappings:
             host_group_id = host_group_ids.get(mapping['server_host_group'], 'NULL')
             if server_group_ids[server_group] == 'NULL' or host_group_id == 'NULL':
@@ -1,22 +1,7 @@
 #!/bin/bash
 
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/dev1
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/dev2
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/DevQAEurope
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/DevQAGlobal
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/DevQAJapan
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/DevQAUS
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/eu
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/globalnew
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/jp
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/minidr
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/ottawa
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/paris
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/RE
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/RG
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/RJ
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/staging
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/stagingtst
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/us
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/us_burnaby
-python3 generate_sql.py /etc/fcld/serverconf/FortiGateCloud/deployconf/us_plano
+# Parses all domains in parallel and loads them directly into the database.
+# generate_sql.py is still available to produce a per-domain .sql script.
+python3 import_domains.py --base-dir /etc/fcld/serverconf/FortiGateCloud/deployconf \
+    dev1 dev2 DevQAEurope DevQAGlobal DevQAJapan DevQAUS eu globalnew jp minidr \
+    ottawa paris RE RG RJ staging stagingtst us us_burnaby us_plano
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Parallel, direct-to-database inventory importer.
+
+Replaces the generate_sql.py + replay-the-.sql-file flow: every domain folder is parsed
+in its own worker process and loaded straight into MariaDB with batched multi-row
+INSERTs, inside one transaction per domain (the old rows of that domain are replaced
+atomically). Rows/sec per table are reported at the end.
+
+Usage:
+    python3 import_domains.py [--workers N] [--batch-size N] <domain_folder> [<domain_folder> ...]
+    python3 import_domains.py --base-dir /etc/fcld/serverconf/FortiGateCloud/deployconf dev1 dev2 ...
+
+Database settings come from the same environment variables as the application
+(DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD). Like generate_sql.py, domain aliases
+are read from resource_alias.yml in the current working directory.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pymysql
+
+from generate_sql import (get_domain_name_aliases, parse_server_hosts,
+                          parse_service_info, parse_server_mapping)
+
+# Row ids are explicit: domain_id * ID_STRIDE + n per table, as in generate_sql()
+ID_STRIDE = 1000000
+
+# MariaDB errors after which the whole domain transaction is retried:
+# 1213 deadlock found, 1205 lock wait timeout exceeded
+RETRYABLE_ERRORS = (1213, 1205)
+TRANSACTION_RETRIES = 3
+
+# Insert order respects the foreign keys
+TABLE_COLUMNS = {
+    "ResourceAlias": ("resource_type", "resource_id", "alias"),
+    "ServerHostGroup": ("id", "domain_id", "name"),
+    "ServerHost": ("id", "domain_id", "hostname", "ip_address", "server_host_group_id", "vars"),
+    "Service": ("id", "domain_id", "name", "service_type", "docker", "service_package_name",
+                "service_config_file", "service_deploy_dir", "status_port", "management_endpoint"),
+    "ServerGroup": ("id", "domain_id", "name"),
+    "ServerGroupMapping": ("id", "domain_id", "server_group_id", "server_host_group_id", "service_id"),
+}
+
+
+def db_settings() -> dict:
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": int(os.getenv("DB_PORT", 3306)),
+        "database": os.getenv("DB_NAME", "serverconf"),
+        "user": os.getenv("DB_USER", "root"),
+        "password": os.getenv("DB_PASSWORD", ""),
+    }
+
+
+def parse_domain(folder_path: str) -> dict:
+    """
+    Parses one domain folder into the structures generate_sql() consumes.
+    """
+    domain_name = os.path.basename(os.path.normpath(folder_path))
+    return {
+        "domain_name": domain_name,
+        "aliases": get_domain_name_aliases(domain_name),
+        "server_hosts_data": parse_server_hosts(os.path.join(folder_path, 'serverHosts')),
+        "service_info": parse_service_info(os.path.join(folder_path, 'serviceInfo.conf')),
+        "server_mapping": parse_server_mapping(os.path.join(folder_path, 'serverMapping.conf')),
+    }
+
+
+def content_hash(parsed: dict) -> str:
+    """
+    Stable sha256 of a parsed domain (serverHosts, serviceInfo.conf, serverMapping.conf, aliases).
+    """
+    canonical = json.dumps(parsed, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def bump_data_version(cursor, domain_name: str, digest: str, changes: dict):
+    """
+    Records that a domain changed: increments its DataVersion row and stores what changed.
+    """
+    cursor.execute(
+        "INSERT INTO DataVersion (domain_name, content_hash, version, last_changes) VALUES (%s, %s, 1, %s) "
+        "ON DUPLICATE KEY UPDATE version = version + 1, content_hash = VALUES(content_hash), "
+        "last_changes = VALUES(last_changes)",
+        (domain_name, digest, json.dumps(changes, sort_keys=True)),
+    )
+
+
+def build_domain_rows(parsed: dict, domain_id: int) -> tuple:
+    """
+    Builds the row tuples of every table for one domain, with the same id layout
+    as generate_sql() (id_prefix = domain_id * ID_STRIDE).
+
+    Returns:
+        tuple: ({table: [row tuple, ...]}, [warning, ...])
+
+    Raises:
+        ValueError: If a table needs ID_STRIDE or more rows, i.e. its ids would run
+                    into the next domain's range.
+    """
+    server_hosts, parent_groups = parsed["server_hosts_data"]
+    id_prefix = domain_id * ID_STRIDE
+    rows = {table: [] for table in TABLE_COLUMNS}
+    warnings = []
+
+    for alias in parsed["aliases"]:
+        rows["ResourceAlias"].append(("domain", domain_id, alias))
+
+    # Filter out child groups, exactly like generate_sql()
+    parent_groups_set = set(parent_groups.values())
+    filtered_server_hosts = {
+        group: hosts for group, hosts in server_hosts.items()
+        if group not in parent_groups or group in parent_groups_set
+    }
+
+    host_group_ids = {}
+    server_host_id = 1
+    for idx, (group, hosts) in enumerate(filtered_server_hosts.items(), start=1):
+        host_group_ids[group] = id_prefix + idx
+        rows["ServerHostGroup"].append((host_group_ids[group], domain_id, group))
+        for host in hosts:
+            rows["ServerHost"].append((id_prefix + server_host_id, domain_id, host["hostname"],
+                                       host["ip_address"], host_group_ids[group], host["vars"]))
+            server_host_id += 1
+
+    service_ids = {}
+    for idx, (service, info) in enumerate(parsed["service_info"].items(), start=1):
+        service_ids[service] = id_prefix + idx
+        status_port = int(info["status_port"]) if info["status_port"].isdigit() else None
+        rows["Service"].append((service_ids[service], domain_id, service, info["type"], int(info["docker"]),
+                                info["package"], info["config"], info["deploy_dir"], status_port,
+                                info["management_endpoint"]))
+
+    mapping_id = 1
+    for idx, (server_group, mappings) in enumerate(parsed["server_mapping"].items(), start=1):
+        server_group_id = id_prefix + idx
+        rows["ServerGroup"].append((server_group_id, domain_id, server_group))
+        for mapping in mappings:
+            host_group_id = host_group_ids.get(mapping["server_host_group"])
+            if host_group_id is None:
+                continue
+            for service in mapping["services"]:
+                service_id = service_ids.get(service)
+                if service_id is None:
+                    warnings.append(f"{server_group}: unknown service '{service}' skipped")
+                    continue
+                rows["ServerGroupMapping"].append((id_prefix + mapping_id, domain_id, server_group_id,
+                                                   host_group_id, service_id))
+                mapping_id += 1
+
+    for table, table_rows in rows.items():
+        if table != "ResourceAlias" and len(table_rows) >= ID_STRIDE:
+            raise ValueError(f"{parsed['domain_name']}: {len(table_rows)} {table} rows do not fit "
+                             f"the id range of one domain ({ID_STRIDE - 1})")
+    return rows, warnings
+
+
+def insert_rows(cursor, table: str, rows: list, batch_size: int):
+    """
+    Inserts rows with multi-row INSERT statements of at most `batch_size` rows.
+    """
+    columns = TABLE_COLUMNS[table]
+    row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    prefix = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        params = [value for row in batch for value in row]
+        cursor.execute(prefix + ", ".join([row_sql] * len(batch)), params)
+
+
+def run_transaction(connection, work, retries: int = TRANSACTION_RETRIES):
+    """
+    Runs `work(cursor)` in one transaction and commits, rolling back on any error.
+    Deadlocks and lock wait timeouts are retried with backoff, since parallel workers
+    write to the same tables.
+
+    Returns:
+        The value returned by the successful `work` call.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with connection.cursor() as cursor:
+                connection.begin()
+                result = work(cursor)
+            connection.commit()
+            return result
+        except pymysql.err.MySQLError as e:
+            connection.rollback()
+            if not e.args or e.args[0] not in RETRYABLE_ERRORS or attempt == retries:
+                raise
+            time.sleep(0.2 * 2 ** attempt)
+        except Exception:
+            connection.rollback()
+            raise
+
+
+def import_domain(folder_path: str, batch_size: int = 500) -> dict:
+    """
+    Worker entry point: parses one domain folder and replaces that domain in the database
+    inside a single transaction.
+
+    Returns:
+        dict: Per-table row counts and timings for the report.
+    """
+    started = time.perf_counter()
+    parsed = parse_domain(folder_path)
+    parse_s = time.perf_counter() - started
+    domain_name = parsed["domain_name"]
+
+    def replace_domain(cursor):
+        # Replace the domain: ON DELETE CASCADE removes its hosts, groups, services and mappings
+        cursor.execute("SELECT id FROM Domain WHERE name = %s", (domain_name,))
+        old = cursor.fetchone()
+        if old:
+            cursor.execute("DELETE FROM ResourceAlias WHERE resource_type = 'domain' AND resource_id = %s",
+                           (old[0],))
+            cursor.execute("DELETE FROM Domain WHERE id = %s", (old[0],))
+        cursor.execute("INSERT INTO Domain (name) VALUES (%s)", (domain_name,))
+        domain_id = cursor.lastrowid
+
+        rows, warnings = build_domain_rows(parsed, domain_id)
+        timings = {}
+        for table, table_rows in rows.items():
+            table_started = time.perf_counter()
+            insert_rows(cursor, table, table_rows, batch_size)
+            timings[table] = (len(table_rows), time.perf_counter() - table_started)
+        bump_data_version(cursor, domain_name, content_hash(parsed),
+                          {"mode": "full", "inserted": {t: n for t, (n, _) in timings.items()}})
+        return domain_id, timings, warnings
+
+    connection = pymysql.connect(**db_settings(), autocommit=False)
+    try:
+        domain_id, timings, warnings = run_transaction(connection, replace_domain)
+    finally:
+        connection.close()
+
+    return {
+        "domain": domain_name,
+        "domain_id": domain_id,
+        "parse_s": parse_s,
+        "total_s": time.perf_counter() - started,
+        "tables": timings,
+        "warnings": warnings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import domain folders directly into the inventory database.")
+    parser.add_argument("folders", nargs="+", help="domain folders (or names when --base-dir is given)")
+    parser.add_argument("--base-dir", help="directory containing the domain folders")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="parallel worker processes")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per multi-row INSERT")
+    args = parser.parse_args()
+
+    folders = [os.path.join(args.base_dir, f) if args.base_dir else f for f in args.folders]
+    started = time.perf_counter()
+    totals = {}
+    failures = 0
+
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(folders)))) as executor:
+        futures = {executor.submit(import_domain, folder, args.batch_size): folder for folder in folders}
+        for future in as_completed(futures):
+            folder = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"[ERROR] {folder}: {e}")
+                continue
+            row_count = sum(count for count, _ in report["tables"].values())
+            print(f"{report['domain']:<16} id={report['domain_id']:<4} rows={row_count:<6} "
+                  f"parse={report['parse_s']:.2f}s total={report['total_s']:.2f}s")
+            for warning in report["warnings"]:
+                print(f"  [WARNING] {warning}")
+            for table, (count, seconds) in report["tables"].items():
+                total_count, total_seconds = totals.get(table, (0, 0.0))
+                totals[table] = (total_count + count, total_seconds + seconds)
+
+    elapsed = time.perf_counter() - started
+    print(f"\n{'table':<20} {'rows':>8} {'insert s':>9} {'rows/s':>10}")
+    for table in TABLE_COLUMNS:
+        count, seconds = totals.get(table, (0, 0.0))
+        rate = count / seconds if seconds else 0.0
+        print(f"{table:<20} {count:>8} {seconds:>9.2f} {rate:>10.0f}")
+    print(f"\nImported {len(folders) - failures}/{len(folders)} domains in {elapsed:.2f}s")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 
+DROP TABLE IF EXISTS DataVersion;
 DROP TABLE IF EXISTS ServerGroupMapping;
 DROP TABLE IF EXISTS ServerGroup;
 DROP TABLE IF EXISTS Service;
@@ -69,4 +70,14 @@ CREATE TABLE ResourceAlias (
     resource_type VARCHAR(100),           -- e.g. "domain", "service", etc.
     resource_id BIGINT UNSIGNED NOT NULL, -- references the actual resource's ID
     alias VARCHAR(255) NOT NULL
+);
+
+-- Bumped by db/import_domains.py and db/sync_domains.py; the application reads it as the
+-- inventory data version (metadata caches, SQLite replica) instead of CHECKSUM TABLE
+CREATE TABLE DataVersion (
+    domain_name VARCHAR(255) NOT NULL PRIMARY KEY,
+    content_hash CHAR(64),                -- sha256 of the parsed domain folder content
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    last_changes TEXT,                    -- JSON summary of the last applied inserts/updates/deletes
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
\ No newline at end of file
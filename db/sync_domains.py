@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Incremental, diff-based inventory sync.
+
+For every domain folder the parsed serverHosts / serviceInfo.conf / serverMapping.conf
+content (plus aliases) is hashed and compared with the hash stored in DataVersion.
+Unchanged domains are skipped without touching the inventory tables. Changed domains are
+diffed against the rows already in the database by natural key (group name, hostname,
+service name, ...) and only the needed INSERT / UPDATE / DELETE statements are applied,
+in one transaction per domain. Existing row ids are preserved, so nothing is dropped and
+reloaded; new rows continue the domain's explicit id range (domain_id * ID_STRIDE + n, as
+written by import_domains.py). The domain's DataVersion is bumped with a summary of what
+changed, which is what the application checks to invalidate its metadata caches and replica.
+
+Usage:
+    python3 sync_domains.py [--dry-run] <domain_folder> [<domain_folder> ...]
+    python3 sync_domains.py --base-dir /etc/fcld/serverconf/FortiGateCloud/deployconf dev1 dev2 ...
+"""
+
+import argparse
+import os
+import sys
+from collections import Counter
+
+import pymysql
+
+from import_domains import (ID_STRIDE, db_settings, parse_domain, content_hash, bump_data_version,
+                            build_domain_rows, insert_rows)
+
+SERVICE_FIELDS = ("service_type", "docker", "service_package_name", "service_config_file",
+                  "service_deploy_dir", "status_port", "management_endpoint")
+
+
+def desired_state(parsed: dict) -> dict:
+    """
+    Describes a parsed domain by natural keys, independent of row ids.
+    """
+    server_hosts, parent_groups = parsed["server_hosts_data"]
+    parent_groups_set = set(parent_groups.values())
+    host_groups = [group for group in server_hosts
+                   if group not in parent_groups or group in parent_groups_set]
+
+    hosts = {}
+    for group in host_groups:
+        seen = Counter()
+        for host in server_hosts[group]:
+            # (group, hostname, n) keeps duplicate hostnames within a group apart
+            key = (group, host["hostname"], seen[host["hostname"]])
+            seen[host["hostname"]] += 1
+            hosts[key] = (host["ip_address"], host["vars"])
+
+    services = {}
+    for name, info in parsed["service_info"].items():
+        status_port = int(info["status_port"]) if info["status_port"].isdigit() else None
+        services[name] = (info["type"], int(info["docker"]), info["package"], info["config"],
+                          info["deploy_dir"], status_port, info["management_endpoint"])
+
+    host_group_set = set(host_groups)
+    mappings = Counter()
+    for server_group, entries in parsed["server_mapping"].items():
+        for entry in entries:
+            if entry["server_host_group"] not in host_group_set:
+                continue
+            for service in entry["services"]:
+                if service in services:
+                    mappings[(server_group, entry["server_host_group"], service)] += 1
+
+    return {
+        "aliases": set(parsed["aliases"]),
+        "host_groups": host_groups,
+        "hosts": hosts,
+        "services": services,
+        "server_groups": list(parsed["server_mapping"].keys()),
+        "mappings": mappings,
+    }
+
+
+def current_state(cursor, domain_id: int) -> dict:
+    """
+    Reads a domain's rows from the database, keyed the same way as desired_state().
+    """
+    cursor.execute("SELECT id, alias FROM ResourceAlias WHERE resource_type = 'domain' AND resource_id = %s",
+                   (domain_id,))
+    aliases = {alias: row_id for row_id, alias in cursor.fetchall()}
+
+    cursor.execute("SELECT id, name FROM ServerHostGroup WHERE domain_id = %s ORDER BY id", (domain_id,))
+    host_groups = {name: row_id for row_id, name in cursor.fetchall()}
+
+    cursor.execute(
+        "SELECT h.id, g.name, h.hostname, h.ip_address, h.vars FROM ServerHost h "
+        "JOIN ServerHostGroup g ON g.id = h.server_host_group_id WHERE h.domain_id = %s ORDER BY h.id",
+        (domain_id,))
+    hosts = {}
+    seen = Counter()
+    for row_id, group, hostname, ip_address, host_vars in cursor.fetchall():
+        key = (group, hostname, seen[(group, hostname)])
+        seen[(group, hostname)] += 1
+        hosts[key] = (row_id, (ip_address, host_vars))
+
+    cursor.execute(f"SELECT id, name, {', '.join(SERVICE_FIELDS)} FROM Service WHERE domain_id = %s", (domain_id,))
+    services = {}
+    for row in cursor.fetchall():
+        values = list(row[2:])
+        values[1] = int(values[1]) if values[1] is not None else None  # docker BOOLEAN
+        services[row[1]] = (row[0], tuple(values))
+
+    cursor.execute("SELECT id, name FROM ServerGroup WHERE domain_id = %s", (domain_id,))
+    server_groups = {name: row_id for row_id, name in cursor.fetchall()}
+
+    cursor.execute(
+        "SELECT m.id, sg.name, hg.name, s.name FROM ServerGroupMapping m "
+        "JOIN ServerGroup sg ON sg.id = m.server_group_id "
+        "JOIN ServerHostGroup hg ON hg.id = m.server_host_group_id "
+        "JOIN Service s ON s.id = m.service_id WHERE m.domain_id = %s ORDER BY m.id",
+        (domain_id,))
+    mappings = {}
+    for row_id, server_group, host_group, service in cursor.fetchall():
+        mappings.setdefault((server_group, host_group, service), []).append(row_id)
+
+    return {"aliases": aliases, "host_groups": host_groups, "hosts": hosts, "services": services,
+            "server_groups": server_groups, "mappings": mappings}
+
+
+def apply_diff(cursor, domain_id: int, desired: dict, current: dict) -> dict:
+    """
+    Applies the minimal set of statements turning `current` into `desired`.
+
+    Returns:
+        dict: {"inserted": {table: n}, "updated": {table: n}, "deleted": {table: n}}
+    """
+    changes = {"inserted": Counter(), "updated": Counter(), "deleted": Counter()}
+
+    def delete(table, ids):
+        ids = list(ids)
+        if ids:
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+            changes["deleted"][table] += len(ids)
+
+    last_ids = {}
+
+    def next_id(table):
+        # Continue after the domain's highest id, inside its range of ID_STRIDE ids
+        if table not in last_ids:
+            cursor.execute(f"SELECT MAX(id) FROM {table} WHERE domain_id = %s", (domain_id,))
+            last_ids[table] = max((cursor.fetchone() or (None,))[0] or 0, domain_id * ID_STRIDE)
+        last_ids[table] += 1
+        if last_ids[table] >= (domain_id + 1) * ID_STRIDE:
+            raise ValueError(f"{table}: id range of domain {domain_id} is exhausted")
+        return last_ids[table]
+
+    def insert(table, columns, values):
+        if table != "ResourceAlias":
+            columns, values = ("id",) + columns, (next_id(table),) + values
+        cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(values))})",
+                       values)
+        changes["inserted"][table] += 1
+        return values[0] if table != "ResourceAlias" else cursor.lastrowid
+
+    # Deletes first, children before parents (FKs would cascade, but counts stay exact)
+    stale_mappings = []
+    for key, ids in current["mappings"].items():
+        keep = desired["mappings"].get(key, 0)
+        stale_mappings.extend(ids[keep:])
+    delete("ServerGroupMapping", stale_mappings)
+    delete("ServerHost", [row_id for key, (row_id, _) in current["hosts"].items() if key not in desired["hosts"]])
+    delete("ServerHostGroup", [row_id for name, row_id in current["host_groups"].items()
+                               if name not in set(desired["host_groups"])])
+    delete("Service", [row_id for name, (row_id, _) in current["services"].items() if name not in desired["services"]])
+    delete("ServerGroup", [row_id for name, row_id in current["server_groups"].items()
+                           if name not in set(desired["server_groups"])])
+    delete("ResourceAlias", [row_id for alias, row_id in current["aliases"].items() if alias not in desired["aliases"]])
+
+    for alias in sorted(desired["aliases"] - set(current["aliases"])):
+        insert("ResourceAlias", ("resource_type", "resource_id", "alias"), ("domain", domain_id, alias))
+
+    # New rows get the next id of the domain's range; existing rows keep theirs
+    host_group_ids = {name: row_id for name, row_id in current["host_groups"].items()}
+    for name in desired["host_groups"]:
+        if name not in host_group_ids:
+            host_group_ids[name] = insert("ServerHostGroup", ("domain_id", "name"), (domain_id, name))
+
+    service_ids = {}
+    for name, values in desired["services"].items():
+        existing = current["services"].get(name)
+        if existing is None:
+            service_ids[name] = insert("Service", ("domain_id", "name") + SERVICE_FIELDS, (domain_id, name) + values)
+            continue
+        service_ids[name] = existing[0]
+        if existing[1] != values:
+            cursor.execute(f"UPDATE Service SET {', '.join(f'{f} = %s' for f in SERVICE_FIELDS)} WHERE id = %s",
+                           values + (existing[0],))
+            changes["updated"]["Service"] += 1
+
+    server_group_ids = {name: row_id for name, row_id in current["server_groups"].items()}
+    for name in desired["server_groups"]:
+        if name not in server_group_ids:
+            server_group_ids[name] = insert("ServerGroup", ("domain_id", "name"), (domain_id, name))
+
+    for key, (ip_address, host_vars) in desired["hosts"].items():
+        existing = current["hosts"].get(key)
+        if existing is None:
+            insert("ServerHost", ("domain_id", "hostname", "ip_address", "server_host_group_id", "vars"),
+                   (domain_id, key[1], ip_address, host_group_ids[key[0]], host_vars))
+        elif existing[1] != (ip_address, host_vars):
+            cursor.execute("UPDATE ServerHost SET ip_address = %s, vars = %s WHERE id = %s",
+                           (ip_address, host_vars, existing[0]))
+            changes["updated"]["ServerHost"] += 1
+
+    for key, count in desired["mappings"].items():
+        missing = count - len(current["mappings"].get(key, []))
+        server_group, host_group, service = key
+        for _ in range(missing):
+            insert("ServerGroupMapping", ("domain_id", "server_group_id", "server_host_group_id", "service_id"),
+                   (domain_id, server_group_ids[server_group], host_group_ids[host_group], service_ids[service]))
+
+    return {kind: dict(counter) for kind, counter in changes.items()}
+
+
+def sync_domain(connection, folder_path: str, dry_run: bool = False) -> dict:
+    """
+    Brings one domain in the database in line with its folder, touching only changed rows.
+    """
+    parsed = parse_domain(folder_path)
+    domain_name = parsed["domain_name"]
+    digest = content_hash(parsed)
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT content_hash FROM DataVersion WHERE domain_name = %s", (domain_name,))
+        row = cursor.fetchone()
+        cursor.execute("SELECT id FROM Domain WHERE name = %s", (domain_name,))
+        domain_row = cursor.fetchone()
+        if row and row[0] == digest and domain_row:
+            return {"domain": domain_name, "status": "unchanged"}
+
+        connection.begin()
+        try:
+            if domain_row is None:
+                # New domain: plain bulk insert
+                cursor.execute("INSERT INTO Domain (name) VALUES (%s)", (domain_name,))
+                domain_id = cursor.lastrowid
+                rows, _ = build_domain_rows(parsed, domain_id)
+                for table, table_rows in rows.items():
+                    insert_rows(cursor, table, table_rows, 500)
+                changes = {"inserted": {table: len(table_rows) for table, table_rows in rows.items() if table_rows},
+                           "updated": {}, "deleted": {}}
+            else:
+                domain_id = domain_row[0]
+                changes = apply_diff(cursor, domain_id, desired_state(parsed), current_state(cursor, domain_id))
+
+            changes["mode"] = "incremental"
+            bump_data_version(cursor, domain_name, digest, changes)
+            if dry_run:
+                connection.rollback()
+            else:
+                connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+    return {"domain": domain_name, "status": "dry-run" if dry_run else "synced", "changes": changes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally sync domain folders into the inventory database.")
+    parser.add_argument("folders", nargs="+", help="domain folders (or names when --base-dir is given)")
+    parser.add_argument("--base-dir", help="directory containing the domain folders")
+    parser.add_argument("--dry-run", action="store_true", help="compute and report changes, then roll back")
+    args = parser.parse_args()
+
+    folders = [os.path.join(args.base_dir, f) if args.base_dir else f for f in args.folders]
+    connection = pymysql.connect(**db_settings(), autocommit=False)
+    failures = 0
+    try:
+        for folder in folders:
+            try:
+                report = sync_domain(connection, folder, args.dry_run)
+            except Exception as e:
+                failures += 1
+                print(f"[ERROR] {folder}: {e}")
+                continue
+            if report["status"] == "unchanged":
+                print(f"{report['domain']:<16} unchanged")
+                continue
+            summary = ", ".join(
+                f"{kind} {table}={count}"
+                for kind in ("inserted", "updated", "deleted")
+                for table, count in report["changes"][kind].items()
+            ) or "no row changes"
+            print(f"{report['domain']:<16} {report['status']}: {summary}")
+    finally:
+        connection.close()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import weakref
+from typing import Any, AsyncIterator, Callable, Coroutine, Iterator
+
+_loop = None
+_loop_lock = threading.Lock()
+
+# Per-event-loop singletons (async DB pools, async HTTP clients are bound to one loop)
+_loop_locals = weakref.WeakKeyDictionary()
+_loop_locals_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the shared event loop running in a daemon thread, starting it on first use.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="aidb-async-loop", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def run_coroutine(coro: Coroutine) -> Any:
+    """
+    Runs a coroutine on the shared background event loop and blocks until it finishes.
+
+    This is what lets the synchronous API (Flask views, CLI) be a thin wrapper around
+    the async pipeline while all in-flight questions share one loop, one async DB pool
+    and one async OpenAI client.
+    """
+    loop = _get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_coroutine() cannot be called from the background loop itself; await instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def loop_local(key: str, factory: Callable[[], Any]) -> Any:
+    """
+    Returns an object unique to (current event loop, key), creating it with `factory` on first use.
+    Must be called from within a running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _loop_locals_lock:
+        values = _loop_locals.setdefault(loop, {})
+        if key not in values:
+            values[key] = factory()
+        return values[key]
+
+
+def iterate_async_generator(agen: AsyncIterator) -> Iterator:
+    """
+    Consumes an async generator on the shared background event loop from synchronous code,
+    yielding each item as soon as it is produced (used for streaming responses).
+    """
+    loop = _get_background_loop()
+    try:
+        while True:
+            try:
+                item = asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        # Also runs when the consumer stops early (e.g. the HTTP client disconnected)
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Latency and throughput benchmark for the question pipeline.
+
+  1. With --load-db, db/init/01-schema.sql and 02-serverconf.sql are loaded into a separate
+     database (--db-name) on the configured MariaDB server, which the run then uses.
+  2. fake_openai_server is started in-process with the given latency and canned SQL/summary
+     responses, and the OpenAI client is pointed at it.
+  3. Each target is driven at increasing concurrency:
+       pipeline  process_question() (per-stage timings from the response metadata)
+       flask     POST /ask against web_server.app served over HTTP
+       gradio    SQLChatBot.process_query() through the shared pipeline slots
+  4. p50/p95/p99 per stage and throughput are printed, the run is appended to the results
+     file, and compared with the previous run that used the same settings.
+
+Usage:
+    python benchmark.py --load-db --llm-latency 0.3 --concurrency 1,4,16 --requests 60
+    python benchmark.py --targets pipeline --fail-on-regression
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+from config_reader import Config
+from fake_openai_server import FakeOpenAIServer
+
+INIT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "db", "init")
+INIT_FILES = ("01-schema.sql", "02-serverconf.sql")
+
+# Same mix as the chat examples: fast-path shapes and questions that need the LLM
+DEFAULT_QUESTIONS = [
+    ("How many domains do we have?", "en"),
+    ("Please list all the server IPs and their servergroup running the logserver service in domain dev2.", "en"),
+    ("In dev1, how many servers are running the configportal service? please list all of them", "en"),
+    ("172.16.97.128是什么server", "zh"),
+    ("在dev1 domain中，一共有多少个server正在运行configportal service", "zh"),
+    ("dev1里面有多少个server运行Logserver服务，请列出ip", "zh"),
+]
+
+TARGETS = ("pipeline", "flask", "gradio")
+PERCENTILES = (50, 95, 99)
+
+
+def load_database(db_name: str):
+    """
+    Recreates `db_name` from the init scripts, the way the MariaDB container initializes itself.
+    """
+    import pymysql
+    from pymysql.constants import CLIENT
+
+    connection = pymysql.connect(host=Config.DB_HOST, port=Config.DB_PORT, user=Config.DB_USER,
+                                 password=Config.DB_PASSWORD, charset="utf8mb4",
+                                 client_flag=CLIENT.MULTI_STATEMENTS)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{db_name}` DEFAULT CHARACTER SET utf8mb4")
+            cursor.execute(f"USE `{db_name}`")
+            for filename in INIT_FILES:
+                start = time.perf_counter()
+                with open(os.path.join(INIT_DIR, filename), encoding="utf-8") as f:
+                    # The dump selects its own database; keep it inside the benchmark database
+                    script = f.read().replace("`serverconf`", f"`{db_name}`")
+                cursor.execute(script)
+                while cursor.nextset():
+                    pass
+                print(f"Loaded {filename} into {db_name} in {time.perf_counter() - start:.1f}s")
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize_samples(samples: list) -> dict:
+    """
+    Returns {stage: {"count", "mean", "p50", "p95", "p99"}} over the per-request stage timings.
+    """
+    by_stage = {}
+    for sample in samples:
+        for stage, value in sample.items():
+            by_stage.setdefault(stage, []).append(value)
+    stats = {}
+    for stage, values in by_stage.items():
+        values.sort()
+        stats[stage] = {"count": len(values), "mean": round(sum(values) / len(values), 2)}
+        for pct in PERCENTILES:
+            stats[stage][f"p{pct}"] = round(percentile(values, pct), 2)
+    return stats
+
+
+def run_level(call, questions: list, concurrency: int, requests: int) -> dict:
+    """
+    Sends `requests` questions through `call` from `concurrency` threads.
+
+    Args:
+        call (callable): call(question, language) -> {stage: ms}; raises on failure.
+    """
+    samples = []
+    errors = []
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def worker():
+        while True:
+            i = next(counter)
+            if i >= requests:
+                return
+            question, language = questions[i % len(questions)]
+            start = time.perf_counter()
+            try:
+                stages = call(question, language)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            stages["total_ms"] = (time.perf_counter() - start) * 1000
+            with lock:
+                samples.append(stages)
+
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f"bench-{i}") for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+        "stages": summarize_samples(samples),
+    }
+
+
+# -- targets -------------------------------------------------------------------
+
+def pipeline_target():
+    from main import process_question
+
+    def call(question, language):
+        response = process_question(question, language)
+        return dict(response.metadata.get("timings", {}))
+    return call, None
+
+
+def flask_target():
+    from werkzeug.serving import make_server
+    import web_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log line per request
+    web_server.warm_up(retry_interval=1.0)
+    server = make_server("127.0.0.1", 0, web_server.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-flask", daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/ask"
+
+    def call(question, language):
+        body = json.dumps({"question": question, "language": language}).encode("utf-8")
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=300) as response:
+            payload = json.loads(response.read())
+        if "error" in payload:
+            raise RuntimeError(payload["error"])
+        return {}
+    return call, server.shutdown
+
+
+def gradio_target():
+    from chat_logger import ChatLogger
+    from gradio_chat import SQLChatBot, TRANSLATIONS
+
+    spill_dir = tempfile.mkdtemp(prefix="bench-chat-")
+    logger = ChatLogger(spill_dir=spill_dir)
+
+    def call(question, language):
+        # One bot per request, like one Gradio session per user
+        bot = SQLChatBot(logger)
+        bot.current_lang = language
+        texts = TRANSLATIONS[language]
+        queued_prefix = texts["queued"].split("{")[0]
+        error_prefix = texts["error"].split("{")[0]
+        start = time.perf_counter()
+        stages = {}
+        answer = None
+        for history, _, _ in bot.process_query(question, []):
+            answer = history[-1][1]
+            text = str(answer)
+            if "first_token_ms" not in stages and text != texts["loading"] and not text.startswith(queued_prefix):
+                stages["first_token_ms"] = (time.perf_counter() - start) * 1000
+        if answer is None or str(answer).startswith(error_prefix):
+            raise RuntimeError(str(answer))
+        return stages
+    return call, None
+
+
+TARGET_FACTORIES = {"pipeline": pipeline_target, "flask": flask_target, "gradio": gradio_target}
+
+
+# -- results -------------------------------------------------------------------
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def settings_key(settings: dict) -> str:
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def load_previous(path: str, key: str):
+    """Returns the last stored run with the same settings key, or None."""
+    previous = None
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("settings_key") == key:
+                previous = record
+    return previous
+
+
+def compare(current: dict, previous: dict, threshold: float) -> list:
+    """
+    Compares total p50/p95 latency and throughput per target and concurrency.
+
+    Returns:
+        list: Human-readable regression lines (changes worse than `threshold`, a fraction).
+    """
+    regressions = []
+    print(f"\nCompared with run {previous['timestamp']} ({previous.get('commit') or 'unknown commit'}):")
+    for target, levels in current["results"].items():
+        before = {level["concurrency"]: level for level in previous["results"].get(target, [])}
+        for level in levels:
+            old = before.get(level["concurrency"])
+            if old is None or "total_ms" not in level["stages"] or "total_ms" not in old["stages"]:
+                continue
+            changes = []
+            for metric in ("p50", "p95"):
+                new_value, old_value = level["stages"]["total_ms"][metric], old["stages"]["total_ms"][metric]
+                delta = (new_value - old_value) / old_value if old_value else 0.0
+                changes.append((f"total {metric}", delta, delta > threshold))
+            new_rps, old_rps = level["throughput_rps"], old["throughput_rps"]
+            delta = (new_rps - old_rps) / old_rps if old_rps else 0.0
+            changes.append(("throughput", delta, -delta > threshold))
+            text = ", ".join(f"{name} {delta:+.1%}" for name, delta, _ in changes)
+            worse = [name for name, _, regressed in changes if regressed]
+            flag = "  REGRESSION: " + ", ".join(worse) if worse else ""
+            print(f"  {target:<9} c={level['concurrency']:<4} {text}{flag}")
+            if worse:
+                regressions.append(f"{target} c={level['concurrency']}: " + ", ".join(worse))
+    return regressions
+
+
+def print_level(target: str, level: dict):
+    total = level["stages"].get("total_ms", {})
+    print(f"\n{target} c={level['concurrency']}: {level['requests']} requests, {level['errors']} errors, "
+          f"{level['throughput_rps']} req/s, p50/p95/p99 {total.get('p50', 0)}/{total.get('p95', 0)}/"
+          f"{total.get('p99', 0)} ms")
+    for stage, stats in sorted(level["stages"].items()):
+        print(f"    {stage:<22} n={stats['count']:<5} mean={stats['mean']:<9} p50={stats['p50']:<9} "
+              f"p95={stats['p95']:<9} p99={stats['p99']}")
+    for error in level["error_samples"]:
+        print(f"    error: {error[:200]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process_question, /ask and the Gradio bot against a fake LLM.")
+    parser.add_argument("--targets", default="pipeline,flask,gradio", help=f"comma-separated subset of {','.join(TARGETS)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=60, help="requests per target and concurrency level")
+    parser.add_argument("--questions", help="file with one question per line (default: the chat examples)")
+    parser.add_argument("--load-db", action="store_true", help="(re)load db/init into --db-name first")
+    parser.add_argument("--db-name", default="serverconf_bench", help="database the benchmark runs against")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds per fake completion")
+    parser.add_argument("--llm-rate-limit-every", type=int, default=0, help="answer every n-th completion with 429")
+    parser.add_argument("--sql", help="canned statement returned for SQL-generation prompts")
+    parser.add_argument("--summary", help="canned summary text")
+    parser.add_argument("--sql-cache", action="store_true", help="keep the question-to-SQL cache enabled")
+    parser.add_argument("--no-fast-path", action="store_true", help="send every question through the LLM path")
+    parser.add_argument("--results", default="bench_results/benchmark.jsonl", help="file runs are appended to")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [(line.strip(), "zh" if any("一" <= ch <= "鿿" for ch in line) else "en")
+                         for line in f if line.strip()]
+    else:
+        questions = DEFAULT_QUESTIONS
+
+    if args.load_db:
+        load_database(args.db_name)
+
+    fake_options = {}
+    if args.sql:
+        fake_options["sql"] = args.sql
+    if args.summary:
+        fake_options["summary"] = args.summary
+    llm = FakeOpenAIServer(latency=args.llm_latency, rate_limit_every=args.llm_rate_limit_every, **fake_options)
+    llm.start()
+
+    # Must be set before the pipeline modules create pools, caches and clients
+    Config.DB_NAME = args.db_name
+    Config.OPENAI_BASE_URL = llm.base_url
+    Config.OPENAI_API_KEY = Config.OPENAI_API_KEY or "benchmark"
+    Config.SQL_CACHE_ENABLED = args.sql_cache
+    Config.FAST_PATH_ENABLED = not args.no_fast_path
+
+    settings = {
+        "targets": targets, "concurrency": levels, "requests": args.requests,
+        "questions": hashlib.sha256(json.dumps(questions).encode("utf-8")).hexdigest()[:12],
+        "llm_latency": args.llm_latency, "llm_rate_limit_every": args.llm_rate_limit_every,
+        "sql": args.sql, "summary": args.summary, "sql_cache": args.sql_cache,
+        "fast_path": not args.no_fast_path,
+    }
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "host": socket.gethostname(),
+        "cpus": os.cpu_count(),
+        "settings": settings,
+        "settings_key": settings_key(settings),
+        "results": {},
+    }
+
+    for target in targets:
+        call, stop = TARGET_FACTORIES[target]()
+        try:
+            # One untimed round so connection pools, caches and clients are warm
+            for question, language in questions:
+                try:
+                    call(question, language)
+                except Exception as e:
+                    print(f"{target} warm-up: {type(e).__name__}: {e}")
+            run["results"][target] = []
+            for concurrency in levels:
+                level = run_level(call, questions, concurrency, args.requests)
+                run["results"][target].append(level)
+                print_level(target, level)
+        finally:
+            if stop is not None:
+                stop()
+    run["fake_llm"] = dict(llm.stats)
+    llm.shutdown()
+
+    previous = load_previous(args.results, run["settings_key"])
+    regressions = compare(run, previous, args.threshold) if previous else []
+    if previous is None:
+        print("\nNo previous run with these settings; this run becomes the baseline.")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+    with open(args.results, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run, ensure_ascii=False) + "\n")
+    print(f"\nResults appended to {args.results}")
+
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
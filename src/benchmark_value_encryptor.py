@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark for result_summarizer.ValueEncryptor.
+
+Encrypts synthetic inventory-like result sets (hostname / ip / domain / service columns,
+with realistic value repetition) and decrypts a summary text that references every
+placeholder. Prints time per cell so linear scaling is easy to see.
+
+Usage:
+    python benchmark_value_encryptor.py [--sizes 12500,25000,50000,100000] [--legacy]
+"""
+
+import argparse
+import hashlib
+import time
+
+from result_summarizer import ValueEncryptor
+
+COLUMNS = 4
+
+
+class LegacyValueEncryptor:
+    """The previous implementation: one hash per cell, one str.replace pass per placeholder."""
+
+    def __init__(self):
+        self.value_map = {}
+
+    def encrypt_value(self, value):
+        placeholder = f"VAL_{hashlib.sha256(str(value).encode('utf-8')).hexdigest()[:6]}"
+        if placeholder not in self.value_map:
+            self.value_map[placeholder] = value
+        return placeholder
+
+    def decrypt_text(self, text):
+        result = text
+        for placeholder, value in self.value_map.items():
+            result = result.replace(placeholder, str(value))
+        return result
+
+
+def make_rows(cells: int) -> list:
+    rows = []
+    for i in range(cells // COLUMNS):
+        rows.append({
+            "hostname": f"host-{i}",
+            "ip_address": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            "domain_name": f"domain{i % 20}",
+            "service": f"service{i % 300}",
+        })
+    return rows
+
+
+def run(encryptor_cls, cells: int) -> dict:
+    rows = make_rows(cells)
+    encryptor = encryptor_cls()
+
+    start = time.perf_counter()
+    placeholders = [encryptor.encrypt_value(value) for row in rows for value in row.values()]
+    encrypt_s = time.perf_counter() - start
+
+    # A summary mentioning each distinct placeholder once, separated by prose
+    text = " and ".join(dict.fromkeys(placeholders))
+    start = time.perf_counter()
+    encryptor.decrypt_text(text)
+    decrypt_s = time.perf_counter() - start
+
+    return {
+        "cells": len(placeholders),
+        "distinct": len(encryptor.value_map),
+        "encrypt_s": encrypt_s,
+        "decrypt_s": decrypt_s,
+        "collisions": getattr(encryptor, "collisions", None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="12500,25000,50000,100000",
+                        help="comma separated cell counts")
+    parser.add_argument("--legacy", action="store_true",
+                        help="also run the previous implementation (slow: quadratic decrypt)")
+    args = parser.parse_args()
+
+    implementations = [("current", ValueEncryptor)]
+    if args.legacy:
+        implementations.append(("legacy", LegacyValueEncryptor))
+
+    print(f"{'impl':<8} {'cells':>8} {'distinct':>9} {'encrypt s':>10} {'decrypt s':>10} {'us/cell':>8} {'collisions':>10}")
+    for name, cls in implementations:
+        for cells in [int(size) for size in args.sizes.split(",")]:
+            r = run(cls, cells)
+            per_cell_us = (r["encrypt_s"] + r["decrypt_s"]) / r["cells"] * 1e6
+            print(f"{name:<8} {r['cells']:>8} {r['distinct']:>9} {r['encrypt_s']:>10.3f} "
+                  f"{r['decrypt_s']:>10.3f} {per_cell_us:>8.2f} {str(r['collisions']):>10}")
+
+
+if __name__ == "__main__":
+    main()
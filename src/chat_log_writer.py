@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Append-only JSONL chat log written by a background thread.
+
+The request path neither serializes nor touches the disk: write() only puts the record
+on a queue. A single writer thread drains the queue in batches, appends one compact JSON
+line per record, fsyncs according to the configured policy and rotates the file by size
+or age, gzip-compressing rotated files when enabled.
+"""
+
+import atexit
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from config_reader import Config
+from result_set import json_default
+
+FSYNC_POLICIES = ("batch", "interval", "never")
+
+_STOP = object()
+
+
+class JsonlLogWriter:
+    """
+    Batched, rotating JSONL appender.
+
+    Args:
+        directory (str): Folder holding the active file and rotated files.
+        basename (str): Active file is <basename>.jsonl, rotated ones <basename>-<timestamp>.jsonl[.gz].
+        max_bytes (int): Rotate once the active file reaches this size (0 = never).
+        rotate_seconds (float): Rotate once the active file is this old (0 = never).
+        compress (bool): gzip rotated files.
+        fsync (str): "batch" (after every batch), "interval" (at most every fsync_interval s) or "never".
+        batch_size (int): Maximum records written per batch.
+        flush_interval (float): Longest time a record waits in the queue before being written.
+        queue_size (int): Pending records kept before new ones are dropped (0 = unbounded).
+        keep_rotated (int): Rotated files kept, the oldest are deleted first (0 = keep all).
+    """
+
+    def __init__(self, directory: str, basename: str = "chat", max_bytes: int = 64 * 1024 * 1024,
+                 rotate_seconds: float = 86400, compress: bool = True, fsync: str = "batch",
+                 fsync_interval: float = 1.0, batch_size: int = 256, flush_interval: float = 0.5,
+                 queue_size: int = 10000, keep_rotated: int = 0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.basename = basename
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.keep_rotated = keep_rotated
+
+        self._queue = queue.Queue(maxsize=max(0, queue_size))
+        self._file = None
+        self._opened_at = 0.0
+        self._last_fsync = 0.0
+        self._dirty = False      # written but not yet fsynced
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0,
+                       "rotations": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, name="chat-log-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.basename + ".jsonl")
+
+    def write(self, record: dict) -> bool:
+        """
+        Enqueues one record; never blocks. Returns False if the record was dropped.
+        """
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._stats_lock:
+            self._stats["enqueued"] += 1
+        return True
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """
+        Writes everything still queued, then stops the writer thread.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot["pending"] = self._queue.qsize()
+        return snapshot
+
+    # -- writer thread -------------------------------------------------------
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Idle: make the last batch durable under the interval policy, rotate by age
+                if self._dirty and self.fsync == "interval":
+                    self._sync()
+                self._maybe_rotate()
+                continue
+            batch = []
+            for record in self._drain(first):
+                if record is _STOP:
+                    stopping = True
+                else:
+                    batch.append(record)
+            if batch:
+                self._write_batch(batch)
+        if self._file is not None:
+            self._sync(force=True)
+            self._file.close()
+            self._file = None
+
+    def _drain(self, first):
+        yield first
+        for _ in range(self.batch_size - 1):
+            try:
+                yield self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _write_batch(self, batch: list):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(json.dumps(record, ensure_ascii=False, separators=(",", ":"),
+                                        default=json_default))
+            except (TypeError, ValueError):
+                with self._stats_lock:
+                    self._stats["errors"] += 1
+        try:
+            self._maybe_rotate()
+            if self._file is None:
+                self._open()
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+            self._dirty = True
+            self._sync()
+        except OSError as e:
+            print("An exception occurred while writing the chat log:", e)
+            with self._stats_lock:
+                self._stats["errors"] += 1
+            return
+        with self._stats_lock:
+            self._stats["written"] += len(lines)
+            self._stats["batches"] += 1
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._opened_at = time.time()
+
+    def _sync(self, force: bool = False):
+        if self.fsync == "never" and not force:
+            return
+        now = time.monotonic()
+        if force or self.fsync == "batch" or now - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+            self._dirty = False
+
+    def _maybe_rotate(self):
+        if self._file is None:
+            return
+        too_big = self.max_bytes and self._file.tell() >= self.max_bytes
+        too_old = self.rotate_seconds and time.time() - self._opened_at >= self.rotate_seconds
+        if not (too_big or too_old) or self._file.tell() == 0:
+            return
+        self._sync(force=True)
+        self._file.close()
+        self._file = None
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        rotated = os.path.join(self.directory, f"{self.basename}-{stamp}.jsonl")
+        suffix = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = os.path.join(self.directory, f"{self.basename}-{stamp}-{suffix}.jsonl")
+            suffix += 1
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        with self._stats_lock:
+            self._stats["rotations"] += 1
+        if self.keep_rotated:
+            self._prune_rotated()
+
+    def _prune_rotated(self):
+        pattern = os.path.join(glob.escape(self.directory), glob.escape(self.basename) + "-*.jsonl*")
+        rotated = sorted(glob.glob(pattern), key=os.path.getmtime)
+        for path in rotated[:-self.keep_rotated]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_chat_log_writer() -> JsonlLogWriter:
+    """
+    Returns the process-wide chat log writer configured from Config, started on first use.
+    """
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = JsonlLogWriter(
+                    directory=Config.CHAT_LOG_DIR,
+                    max_bytes=Config.CHAT_LOG_MAX_BYTES,
+                    rotate_seconds=Config.CHAT_LOG_ROTATE_SECONDS,
+                    compress=Config.CHAT_LOG_COMPRESS,
+                    fsync=Config.CHAT_LOG_FSYNC,
+                    fsync_interval=Config.CHAT_LOG_FSYNC_INTERVAL,
+                    batch_size=Config.CHAT_LOG_BATCH_SIZE,
+                    flush_interval=Config.CHAT_LOG_FLUSH_INTERVAL,
+                )
+                # Flush what is still queued when the process exits normally
+                atexit.register(_writer.close)
+    return _writer
@@ -1,71 +1,349 @@
-from dataclasses import dataclass
+from collections import OrderedDict
 from datetime import datetime
 from typing import List, Optional, Dict, Any
+import hashlib
 import json
+import os
+import queue
+import threading
+import time
 import uuid
+from config_reader import Config
+from result_set import ResultSet, json_default
+
+# Metadata fields carrying bulky payloads; they are kept once in the PayloadStore
+PAYLOAD_KEYS = ("query_results", "result", "messages", "encrypted_results", "value_map")
 
-@dataclass
 class Message:
-    content: str
-    role: str
-    timestamp: datetime
-    metadata: Optional[Dict[str, Any]] = None
+    __slots__ = ("content", "role", "timestamp", "metadata")
+
+    def __init__(self, content: str, role: str, timestamp: datetime, metadata: Optional[Dict[str, Any]] = None):
+        self.content = content
+        self.role = role
+        self.timestamp = timestamp
+        self.metadata = metadata
 
-@dataclass
 class Conversation:
-    conversation_id: str
-    messages: List[Message]
-    metadata: dict
+    __slots__ = ("conversation_id", "messages", "metadata", "last_active")
+
+    def __init__(self, conversation_id: str, messages: List[Message], metadata: dict):
+        self.conversation_id = conversation_id
+        self.messages = messages
+        self.metadata = metadata
+        self.last_active = time.monotonic()
+
+class PayloadStore:
+    """
+    Content-addressed store for message payloads.
+
+    Payloads are kept as compact JSON text keyed by their sha256, with a reference count,
+    so identical result sets or prompts referenced from several fields or turns are held
+    in memory once.
+    """
 
-class ChatLogger:
     def __init__(self):
-        self.conversations = {}
-        
+        self._blobs = {}   # digest -> [json text, refcount]
+        self.dedup_hits = 0
+
+    @staticmethod
+    def encode(payload) -> tuple:
+        """
+        Returns (digest, json text) of a payload; pure, so it can run without the logger lock.
+        """
+        text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), sort_keys=True,
+                          default=json_default)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest(), text
+
+    def put(self, payload) -> str:
+        return self.add(*self.encode(payload))
+
+    def add(self, digest: str, text: str) -> str:
+        entry = self._blobs.get(digest)
+        if entry is None:
+            self._blobs[digest] = [text, 1]
+        else:
+            entry[1] += 1
+            self.dedup_hits += 1
+        return digest
+
+    def get(self, digest: str):
+        return json.loads(self._blobs[digest][0])
+
+    def release(self, digest: str):
+        entry = self._blobs.get(digest)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._blobs[digest]
+
+    def stats(self) -> dict:
+        return {"blobs": len(self._blobs),
+                "bytes": sum(len(text) for text, _ in self._blobs.values()),
+                "dedup_hits": self.dedup_hits}
+
+class ChatLogger:
+    def __init__(self, writer=None, max_conversations: int = None, idle_seconds: float = None,
+                 spill_dir: str = None):
+        """
+        Args:
+            writer: Optional append-only log backend (see chat_log_writer.JsonlLogWriter);
+                    every message is enqueued to it as one JSON line.
+            max_conversations (int): Conversations kept in memory; the least recently active
+                                     ones are spilled to `spill_dir` beyond that.
+            idle_seconds (float): Conversations idle for longer are spilled as well (0 = never).
+            spill_dir (str): Folder for spilled conversations; they are reloaded on next access.
+
+        Message metadata is kept as given and compacted into the PayloadStore by a background
+        thread, and spill files are written outside the lock, so adding a message only costs
+        the request thread a few dictionary operations.
+        """
+        self.conversations = OrderedDict()  # least recently active first
+        self.writer = writer
+        self.max_conversations = max_conversations if max_conversations is not None else Config.CHAT_LOGGER_MAX_CONVERSATIONS
+        self.idle_seconds = idle_seconds if idle_seconds is not None else Config.CHAT_LOGGER_IDLE_SECONDS
+        self.spill_dir = spill_dir or Config.CHAT_LOGGER_SPILL_DIR
+        self.payloads = PayloadStore()
+        self._lock = threading.RLock()
+        self._spilled = 0
+        # Conversations taken out of memory whose spill file is still being written
+        self._spilling = {}
+        self._compact_queue = queue.SimpleQueue()
+        self._compactor = None
+
     def create_conversation(self) -> str:
         conversation_id = str(uuid.uuid4())
-        self.conversations[conversation_id] = Conversation(
-            conversation_id=conversation_id,
-            messages=[],
-            metadata={}
-        )
-        return conversation_id
-            
-    def add_message(self, conversation_id: str, content: str, role: str, metadata: Optional[dict] = None):
-        # 如果会话不存在，使用提供的 conversation_id 创建新会话
-        if conversation_id not in self.conversations:
+        with self._lock:
             self.conversations[conversation_id] = Conversation(
                 conversation_id=conversation_id,
                 messages=[],
                 metadata={}
             )
-            
-        message = Message(
-            content=content,
-            role=role,
-            timestamp=datetime.now(),
-            metadata=metadata
-        )
-        
-        self.conversations[conversation_id].messages.append(message)
-            
+            spills = self._evict(keep=conversation_id)
+        self._write_spills(spills)
+        return conversation_id
+
+    def add_message(self, conversation_id: str, content: str, role: str, metadata: Optional[dict] = None):
+        timestamp = datetime.now()
+        with self._lock:
+            # 如果会话不存在，使用提供的 conversation_id 创建新会话
+            conversation = self._get(conversation_id, create=True)
+
+            # str() drops attributes of Response objects, which carry the whole pipeline state
+            message = Message(
+                content=str(content),
+                role=role,
+                timestamp=timestamp,
+                metadata=metadata
+            )
+            conversation.messages.append(message)
+            spills = self._evict(keep=conversation_id)
+        self._schedule_compaction(conversation_id, message)
+        self._write_spills(spills)
+
+        if self.writer is not None:
+            # Only enqueues; serialization and disk I/O happen on the writer thread
+            self.writer.write({
+                "conversation_id": conversation_id,
+                "role": role,
+                "timestamp": timestamp.isoformat(),
+                "content": content,
+                "metadata": metadata
+            })
+
+    def get_conversation_data(self, conversation_id: str) -> dict:
+        """
+        Returns the conversation as a JSON-ready dict with payloads expanded, reloading it if spilled.
+        """
+        with self._lock:
+            conversation = self._get(conversation_id, create=False)
+            if conversation is None:
+                raise KeyError(f"Conversation {conversation_id} not found")
+            data = self._to_data(conversation)
+            spills = self._evict(keep=conversation_id)
+        self._write_spills(spills)
+        return data
+
     def save_to_file(self, conversation_id: str, filename: str):
-        if conversation_id not in self.conversations:
-            raise KeyError(f"Conversation {conversation_id} not found")
-            
-        conversation = self.conversations[conversation_id]
-        data = {
+        data = self.get_conversation_data(conversation_id)
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            # Query results are ResultSets and are written as {"columns", "rows", "truncated"}
+            json.dump(data, f, ensure_ascii=False, indent=2, default=json_default)
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {"conversations": len(self.conversations), "spilled": self._spilled}
+            snapshot.update(self.payloads.stats())
+        return snapshot
+
+    # -- payload de-duplication -------------------------------------------------
+
+    def _compact(self, value, blobs: list, key: str = None):
+        """
+        Replaces ResultSets and PAYLOAD_KEYS values by {"$payload": digest} references and
+        collects the (digest, json text) blobs to add to the PayloadStore. Needs no lock.
+        """
+        if isinstance(value, ResultSet) or (key in PAYLOAD_KEYS and value):
+            if isinstance(value, list):
+                # Each result set inside is stored on its own, so it is shared across turns
+                value = [self._compact(item, blobs) for item in value]
+            digest, text = PayloadStore.encode(value)
+            blobs.append((digest, text))
+            return {"$payload": digest}
+        if isinstance(value, dict):
+            return {k: self._compact(v, blobs, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._compact(item, blobs) for item in value]
+        return value
+
+    def _schedule_compaction(self, conversation_id: str, message: Message):
+        if not message.metadata:
+            return
+        if self._compactor is None:
+            with self._lock:
+                if self._compactor is None:
+                    self._compactor = threading.Thread(target=self._run_compactor, name="chat-log-compactor",
+                                                       daemon=True)
+                    self._compactor.start()
+        self._compact_queue.put((conversation_id, message))
+
+    def _run_compactor(self):
+        while True:
+            conversation_id, message = self._compact_queue.get()
+            raw = message.metadata
+            blobs = []
+            try:
+                compacted = self._compact(raw, blobs)
+            except Exception as e:
+                print("An exception occurred while compacting chat metadata:", e)
+                continue
+            with self._lock:
+                conversation = self.conversations.get(conversation_id)
+                # Skip messages spilled (and released) in the meantime; they stay as given
+                if conversation is None or message.metadata is not raw \
+                        or not any(msg is message for msg in reversed(conversation.messages)):
+                    continue
+                for digest, text in blobs:
+                    self.payloads.add(digest, text)
+                message.metadata = compacted
+
+    def _expand(self, value):
+        if isinstance(value, dict):
+            if len(value) == 1 and "$payload" in value:
+                return self._expand(self.payloads.get(value["$payload"]))
+            return {k: self._expand(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._expand(item) for item in value]
+        return value
+
+    def _release(self, value):
+        if isinstance(value, dict):
+            if len(value) == 1 and "$payload" in value:
+                nested = self.payloads.get(value["$payload"])
+                self.payloads.release(value["$payload"])
+                self._release(nested)
+                return
+            for item in value.values():
+                self._release(item)
+        elif isinstance(value, list):
+            for item in value:
+                self._release(item)
+
+    # -- LRU eviction to disk ---------------------------------------------------
+
+    def _spill_path(self, conversation_id: str) -> str:
+        return os.path.join(self.spill_dir, f"conversation_{conversation_id}.json")
+
+    def _to_data(self, conversation: Conversation) -> dict:
+        return {
             "conversation_id": conversation.conversation_id,
             "messages": [
                 {
                     "content": msg.content,
                     "role": msg.role,
                     "timestamp": msg.timestamp.isoformat(),
-                    "metadata": msg.metadata
+                    "metadata": self._expand(msg.metadata)
                 }
                 for msg in conversation.messages
             ],
             "metadata": conversation.metadata
         }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2) 
\ No newline at end of file
+
+    def _get(self, conversation_id: str, create: bool) -> Optional[Conversation]:
+        conversation = self.conversations.get(conversation_id)
+        if conversation is None:
+            conversation = self._load_spilled(conversation_id)
+            if conversation is None:
+                if not create:
+                    return None
+                conversation = Conversation(conversation_id=conversation_id, messages=[], metadata={})
+            self.conversations[conversation_id] = conversation
+        self.conversations.move_to_end(conversation_id)
+        conversation.last_active = time.monotonic()
+        return conversation
+
+    def _load_spilled(self, conversation_id: str) -> Optional[Conversation]:
+        data = self._spilling.pop(conversation_id, None)
+        if data is None:
+            path = self._spill_path(conversation_id)
+            if not os.path.exists(path):
+                return None
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            os.remove(path)
+        messages = [
+            Message(
+                content=item["content"],
+                role=item["role"],
+                timestamp=datetime.fromisoformat(item["timestamp"]),
+                metadata=item.get("metadata")
+            )
+            for item in data.get("messages", [])
+        ]
+        for message in messages:
+            self._schedule_compaction(conversation_id, message)
+        return Conversation(conversation_id=conversation_id, messages=messages, metadata=data.get("metadata") or {})
+
+    def _evict(self, keep: str) -> list:
+        """
+        Takes least recently active conversations beyond max_conversations, or idle ones, out
+        of memory. Returns their (conversation_id, data) for _write_spills(), which the caller
+        runs after releasing the lock.
+        """
+        now = time.monotonic()
+        spills = []
+        while self.conversations:
+            conversation_id, conversation = next(iter(self.conversations.items()))
+            if conversation_id == keep:
+                break
+            over_capacity = self.max_conversations and len(self.conversations) > self.max_conversations
+            idle = self.idle_seconds and now - conversation.last_active > self.idle_seconds
+            if not (over_capacity or idle):
+                break
+            spills.append((conversation_id, self._spill(conversation)))
+        return spills
+
+    def _spill(self, conversation: Conversation) -> dict:
+        data = self._to_data(conversation)
+        for msg in conversation.messages:
+            self._release(msg.metadata)
+        del self.conversations[conversation.conversation_id]
+        # Served from here if the conversation is needed again before its file is written
+        self._spilling[conversation.conversation_id] = data
+        self._spilled += 1
+        return data
+
+    def _write_spills(self, spills: list):
+        for conversation_id, data in spills:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = self._spill_path(conversation_id)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"), default=json_default)
+            with self._lock:
+                if self._spilling.get(conversation_id) is data:
+                    os.replace(tmp_path, path)
+                    del self._spilling[conversation_id]
+                else:
+                    # Reloaded into memory while the file was being written
+                    os.remove(tmp_path)
@@ -3,6 +3,7 @@ import os
 class Config:
     # OpenAI configuration
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
 
     # Database configuration
     DB_HOST = os.getenv('DB_HOST', 'localhost')
@@ -11,6 +12,102 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'root')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 
+    # Database connection pool configuration
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))      # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))      # seconds before a connection is replaced
+    DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', 30))  # idle seconds before checkout ping
+
+    # Metadata prompt cache: seconds between data-version checks
+    METADATA_CACHE_TTL = float(os.getenv('METADATA_CACHE_TTL', 300))
+
+    # Question-aware entity pruning in the SQL prompt (limits are per entity type)
+    PROMPT_ENTITY_PRUNING = os.getenv('PROMPT_ENTITY_PRUNING', '1') == '1'
+    PROMPT_ENTITY_MAX_MATCHES = int(os.getenv('PROMPT_ENTITY_MAX_MATCHES', 20))
+    PROMPT_ENTITY_FALLBACK = int(os.getenv('PROMPT_ENTITY_FALLBACK', 10))
+
+    # Answer common question shapes with prewritten SQL and templates, without the LLM
+    FAST_PATH_ENABLED = os.getenv('FAST_PATH_ENABLED', '1') == '1'
+
+    # Question-to-SQL cache configuration
+    SQL_CACHE_ENABLED = os.getenv('SQL_CACHE_ENABLED', '1') == '1'
+    SQL_CACHE_PATH = os.getenv('SQL_CACHE_PATH', 'cache/sql_cache.sqlite3')
+    SQL_CACHE_MAX_ENTRIES = int(os.getenv('SQL_CACHE_MAX_ENTRIES', 1000))
+
+    # Concurrent execution of generated statements
+    SQL_EXEC_MAX_WORKERS = int(os.getenv('SQL_EXEC_MAX_WORKERS', 4))     # per question, 1 = sequential
+    SQL_EXEC_POOL_SIZE = int(os.getenv('SQL_EXEC_POOL_SIZE', 16))        # shared worker threads per process
+
+    # Result encoding for the summarization prompt
+    SUMMARY_FULL_ROWS_LIMIT = int(os.getenv('SUMMARY_FULL_ROWS_LIMIT', 100))  # above this, pre-aggregate
+    SUMMARY_SAMPLE_ROWS = int(os.getenv('SUMMARY_SAMPLE_ROWS', 20))
+    SUMMARY_TOP_VALUES = int(os.getenv('SUMMARY_TOP_VALUES', 10))
+    SUMMARY_GROUP_BY_MAX_DISTINCT = int(os.getenv('SUMMARY_GROUP_BY_MAX_DISTINCT', 20))
+
+    # Embedded read-only SQLite replica of the inventory (":memory:" or a file path)
+    SQLITE_REPLICA_ENABLED = os.getenv('SQLITE_REPLICA_ENABLED', '0') == '1'
+    SQLITE_REPLICA_PATH = os.getenv('SQLITE_REPLICA_PATH', ':memory:')
+    SQLITE_REPLICA_CHECK_INTERVAL = float(os.getenv('SQLITE_REPLICA_CHECK_INTERVAL', 300))
+
+    # Log of executed generated statements, input for index_advisor.py (opt-in: empty = disabled);
+    # each process writes <stem>-<pid>.jsonl next to the path, rotated by size, oldest rotated files deleted
+    SQL_WORKLOAD_LOG = os.getenv('SQL_WORKLOAD_LOG', '')
+    SQL_WORKLOAD_LOG_MAX_BYTES = int(os.getenv('SQL_WORKLOAD_LOG_MAX_BYTES', 16 * 1024 * 1024))
+    SQL_WORKLOAD_LOG_KEEP = int(os.getenv('SQL_WORKLOAD_LOG_KEEP', 4))
+
+    # Per-question span traces, appended to <dir>/traces-<pid>.jsonl (empty = disabled); metrics are served at /metrics
+    TRACE_LOG_DIR = os.getenv('TRACE_LOG_DIR', 'logs')
+
+    # Guard applied to generated SQL before execution (0 disables a limit)
+    SQL_GUARD_DEFAULT_LIMIT = int(os.getenv('SQL_GUARD_DEFAULT_LIMIT', 1000))
+    SQL_GUARD_DOWNGRADE_ROWS = int(os.getenv('SQL_GUARD_DOWNGRADE_ROWS', 200000))
+    SQL_GUARD_DOWNGRADE_LIMIT = int(os.getenv('SQL_GUARD_DOWNGRADE_LIMIT', 100))
+    SQL_GUARD_MAX_ROWS = int(os.getenv('SQL_GUARD_MAX_ROWS', 5000000))
+    SQL_STATEMENT_TIMEOUT = float(os.getenv('SQL_STATEMENT_TIMEOUT', 10))
+
+    # Rows kept per statement result (0 = unlimited); results are streamed from the server
+    SQL_RESULT_MAX_ROWS = int(os.getenv('SQL_RESULT_MAX_ROWS', 10000))
+
+    # Append-only JSONL chat log, written by a background thread
+    CHAT_LOG_DIR = os.getenv('CHAT_LOG_DIR', 'chat_logs')
+    CHAT_LOG_MAX_BYTES = int(os.getenv('CHAT_LOG_MAX_BYTES', 64 * 1024 * 1024))
+    CHAT_LOG_ROTATE_SECONDS = float(os.getenv('CHAT_LOG_ROTATE_SECONDS', 86400))
+    CHAT_LOG_COMPRESS = os.getenv('CHAT_LOG_COMPRESS', '1') == '1'
+    CHAT_LOG_FSYNC = os.getenv('CHAT_LOG_FSYNC', 'batch')  # batch | interval | never
+    CHAT_LOG_FSYNC_INTERVAL = float(os.getenv('CHAT_LOG_FSYNC_INTERVAL', 1.0))
+    CHAT_LOG_BATCH_SIZE = int(os.getenv('CHAT_LOG_BATCH_SIZE', 256))
+    CHAT_LOG_FLUSH_INTERVAL = float(os.getenv('CHAT_LOG_FLUSH_INTERVAL', 0.5))
+
+    # In-memory chat history: idle / least recently active conversations are spilled to disk
+    CHAT_LOGGER_MAX_CONVERSATIONS = int(os.getenv('CHAT_LOGGER_MAX_CONVERSATIONS', 200))
+    CHAT_LOGGER_IDLE_SECONDS = float(os.getenv('CHAT_LOGGER_IDLE_SECONDS', 1800))
+    CHAT_LOGGER_SPILL_DIR = os.getenv('CHAT_LOGGER_SPILL_DIR', 'chat_logs/conversations')
+
+    # Gradio chat concurrency: pipelines run at once, events in flight, queue length, session expiry
+    GRADIO_PIPELINE_WORKERS = int(os.getenv('GRADIO_PIPELINE_WORKERS', 4))
+    GRADIO_CONCURRENCY_LIMIT = int(os.getenv('GRADIO_CONCURRENCY_LIMIT', 32))
+    GRADIO_QUEUE_MAX_SIZE = int(os.getenv('GRADIO_QUEUE_MAX_SIZE', 100))
+    GRADIO_SESSION_TTL = float(os.getenv('GRADIO_SESSION_TTL', 3600))
+
+    # Production web serving (gunicorn.conf.py)
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5000')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', min(4, os.cpu_count() or 1) * 2))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 8))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 120))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 60))
+
+    # Batch question API: questions per request, pipelines run concurrently per batch
+    BATCH_MAX_QUESTIONS = int(os.getenv('BATCH_MAX_QUESTIONS', 100))
+    BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 8))
+
+    # LLM call scheduler; limits are per process (0 disables a limit)
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', 500))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', 150000))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 5))
+    LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', 0.5))
+    LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', 30))
+
     @classmethod
     def get_db_url(cls):
-        return f"mysql+pymysql://{cls.DB_USER}:{cls.DB_PASSWORD}@{cls.DB_HOST}:{cls.DB_PORT}/{cls.DB_NAME}"
\ No newline at end of file
+        return f"mysql+pymysql://{cls.DB_USER}:{cls.DB_PASSWORD}@{cls.DB_HOST}:{cls.DB_PORT}/{cls.DB_NAME}"
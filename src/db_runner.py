@@ -1,21 +1,66 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
+import re
+import threading
+import time
+from contextlib import contextmanager
+
 import pymysql
 from config_reader import Config
+from async_runner import loop_local
+from sqlite_replica import SQLiteReplica, ReplicaError, ReplicaTimeoutError
+from result_set import ResultSet
+from tracing import record_db_round_trip
+
+try:
+    import aiomysql
+except ImportError:  # optional: the async path falls back to the sync pool in a thread
+    aiomysql = None
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available within the checkout timeout."""
 
-def run_sql_from_config(sql_str: str):
+
+class SQLExecutionError(Exception):
+    """
+    Raised when a statement could not be executed, with a machine-readable `code`
+    ("timeout", "invalid_sql", "connection", "pool_timeout", "db_error", or a guard code).
     """
-    Connects to the MariaDB database, executes the SQL statement, and returns the result.
-    
-    Args:
-        sql_str (str): The SQL statement to be executed.
 
-    Returns:
-        list: The query result, where each row is a dictionary.
+    def __init__(self, code: str, message: str, statement: str = None, errno: int = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.statement = statement
+        self.errno = errno
+
+    def to_dict(self) -> dict:
+        return {"code": self.code, "message": self.message, "errno": self.errno}
+
+
+# Server errors raised when max_statement_time (MariaDB) / max_execution_time (MySQL) is exceeded
+STATEMENT_TIMEOUT_ERRNOS = (1969, 3024)
+
+
+class _PooledConnection:
+    """Book-keeping wrapper around a raw pymysql connection."""
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+
+
+def _connect():
+    """
+    Opens a new raw connection to the MariaDB database using the Config settings.
     """
-    # Establish the database connection
-    connection = pymysql.connect(
+    return pymysql.connect(
         host=Config.DB_HOST,
         port=Config.DB_PORT,
         user=Config.DB_USER,
@@ -24,19 +69,440 @@ def run_sql_from_config(sql_str: str):
         cursorclass=pymysql.cursors.DictCursor  # Return results as dict
     )
 
-    result = []
+
+class ConnectionPool:
+    """
+    A thread-safe pool of reusable MariaDB connections.
+
+    Connections are handed out LIFO so the warmest connection is reused first.
+    On checkout a connection is recycled when older than `recycle` seconds and
+    pinged when it has been idle for more than `ping_interval` seconds; dead
+    connections are replaced transparently.
+    """
+
+    def __init__(self, min_size: int = 1, max_size: int = 10, timeout: float = 10.0,
+                 recycle: int = 3600, ping_interval: float = 30.0, connect=_connect):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self._connect = connect
+
+        self._idle = []          # list of _PooledConnection, used as a stack
+        self._size = 0           # connections currently owned by the pool (idle + in use)
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "discarded": 0,
+        }
+
+    def prefill(self):
+        """
+        Opens connections until the pool holds at least `min_size` of them.
+        """
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append(pooled)
+                self._cond.notify()
+
+    def _new_connection(self) -> _PooledConnection:
+        pooled = _PooledConnection(self._connect())
+        with self._cond:
+            self._stats["created"] += 1
+        return pooled
+
+    def _close_raw(self, pooled: _PooledConnection):
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, pooled: _PooledConnection) -> bool:
+        """
+        Recycles stale connections and pings idle ones. Called outside the lock.
+        """
+        now = time.monotonic()
+        if self.recycle >= 0 and now - pooled.created_at > self.recycle:
+            with self._cond:
+                self._stats["recycled"] += 1
+            return False
+        if now - pooled.last_used > self.ping_interval:
+            try:
+                pooled.raw.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._stats["ping_failures"] += 1
+                return False
+        return True
+
+    def acquire(self) -> _PooledConnection:
+        """
+        Checks out a live connection, waiting up to `timeout` seconds if the pool is exhausted.
+
+        Raises:
+            PoolTimeoutError: If no connection becomes available in time.
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        while True:
+            pooled = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Connection pool is closed")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.timeout}s waiting for a database connection"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if create:
+                try:
+                    pooled = self._new_connection()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(pooled):
+                self._close_raw(pooled)
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                # Loop again: a replacement will be created (or another idle one reused)
+                continue
+
+            wait_time = time.monotonic() - start
+            with self._cond:
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["waits"] += 1
+                self._stats["wait_time_total"] += wait_time
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+            return pooled
+
+    def release(self, pooled: _PooledConnection, discard: bool = False):
+        """
+        Returns a connection to the pool, or closes it when `discard` is True
+        (e.g. after a connection-level error).
+        """
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            keep = not discard and not self._closed
+            if keep:
+                self._idle.append(pooled)
+            else:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            self._cond.notify()
+        if not keep:
+            self._close_raw(pooled)
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager yielding a raw pymysql connection from the pool.
+        The connection is discarded instead of returned if the block raises
+        a connection-level error.
+        """
+        pooled = self.acquire()
+        discard = False
+        try:
+            yield pooled.raw
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def stats(self) -> dict:
+        """
+        Returns a snapshot of pool size and checkout/wait metrics.
+        """
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        checkouts = snapshot["checkouts"]
+        snapshot["wait_time_avg"] = snapshot["wait_time_total"] / checkouts if checkouts else 0.0
+        return snapshot
+
+    def close(self):
+        """
+        Closes all idle connections; in-use connections are closed when released.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_raw(pooled)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it from Config on first use.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(
+                    min_size=Config.DB_POOL_MIN_SIZE,
+                    max_size=Config.DB_POOL_MAX_SIZE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    recycle=Config.DB_POOL_RECYCLE,
+                    ping_interval=Config.DB_POOL_PING_INTERVAL,
+                )
+                try:
+                    pool.prefill()
+                except Exception as e:
+                    print("An exception occurred while pre-filling the connection pool:", e)
+                _pool = pool
+    return _pool
+
+
+def get_pool_stats() -> dict:
+    """
+    Returns checkout/wait metrics of the process-wide connection pool.
+    """
+    return get_pool().stats()
+
+
+_replica = None
+_replica_lock = threading.Lock()
+_replica_fallbacks = 0
+
+
+def get_replica() -> SQLiteReplica:
+    """
+    Returns the process-wide SQLite replica, snapshotted from MariaDB on first query.
+    """
+    global _replica
+    if _replica is None:
+        with _replica_lock:
+            if _replica is None:
+                _replica = SQLiteReplica(
+                    connection_factory=lambda: get_pool().connection(),
+                    path=Config.SQLITE_REPLICA_PATH,
+                    check_interval=Config.SQLITE_REPLICA_CHECK_INTERVAL,
+                    database=Config.DB_NAME,
+                    timeout=Config.SQL_STATEMENT_TIMEOUT,
+                )
+    return _replica
+
+
+def get_replica_stats() -> dict:
+    """
+    Returns replica query/refresh counters plus the number of MariaDB fallbacks.
+    """
+    stats = get_replica().stats()
+    stats["fallbacks"] = _replica_fallbacks
+    return stats
+
+
+def with_statement_timeout(sql_str: str, timeout: float = None) -> str:
+    """
+    Prefixes a SELECT with MariaDB's per-statement time limit (SET STATEMENT max_statement_time=...).
+    Other statements, and a timeout of 0, are returned unchanged.
+    """
+    if timeout is None:
+        timeout = Config.SQL_STATEMENT_TIMEOUT
+    if not timeout or not re.match(r"\s*(SELECT|WITH)\b", sql_str, re.IGNORECASE):
+        return sql_str
+    return f"SET STATEMENT max_statement_time={timeout:g} FOR {sql_str}"
+
+
+def to_execution_error(e: Exception, sql_str: str) -> SQLExecutionError:
+    """
+    Maps a driver/pool exception to a structured SQLExecutionError.
+    """
+    if isinstance(e, SQLExecutionError):
+        return e
+    errno = e.args[0] if e.args and isinstance(e.args[0], int) else None
+    message = str(e.args[1]) if len(e.args) > 1 else str(e)
+    if errno in STATEMENT_TIMEOUT_ERRNOS:
+        code = "timeout"
+        message = f"Statement exceeded the {Config.SQL_STATEMENT_TIMEOUT:g}s execution time limit"
+    elif isinstance(e, PoolTimeoutError):
+        code = "pool_timeout"
+    elif isinstance(e, pymysql.err.ProgrammingError):
+        code = "invalid_sql"
+    elif isinstance(e, (pymysql.err.OperationalError, pymysql.err.InterfaceError)):
+        code = "connection"
+    else:
+        code = "db_error"
+    return SQLExecutionError(code, message, statement=sql_str, errno=errno)
+
+
+def run_sql_from_config(sql_str: str, max_rows: int = None) -> ResultSet:
+    """
+    Executes the SQL statement on a pooled MariaDB connection and returns the result.
+
+    With Config.SQLITE_REPLICA_ENABLED, read-only statements are first tried against the
+    local SQLite replica; anything it cannot translate or run goes to MariaDB.
+    SELECT statements are bounded by Config.SQL_STATEMENT_TIMEOUT on the replica and the server.
+    Rows are streamed from an unbuffered server-side cursor, so no more than `max_rows`
+    of them are ever held in memory.
+    
+    Args:
+        sql_str (str): The SQL statement to be executed.
+        max_rows (int): Row cap (defaults to Config.SQL_RESULT_MAX_ROWS, 0 = no cap).
+
+    Returns:
+        ResultSet: The query result; iterating it yields rows as read-only dict views.
+
+    Raises:
+        SQLExecutionError: If the statement failed, timed out or no connection was available.
+    """
+    global _replica_fallbacks
+    if max_rows is None:
+        max_rows = Config.SQL_RESULT_MAX_ROWS
+    if Config.SQLITE_REPLICA_ENABLED:
+        try:
+            result = get_replica().execute(sql_str, max_rows)
+            record_db_round_trip("replica", len(result))
+            return result
+        except ReplicaTimeoutError as e:
+            # MariaDB would run into the same limit
+            raise SQLExecutionError(
+                "timeout", f"Statement exceeded the {Config.SQL_STATEMENT_TIMEOUT:g}s execution time limit",
+                statement=sql_str) from e
+        except ReplicaError:
+            with _replica_lock:
+                _replica_fallbacks += 1
+
+    result = ResultSet(())
+    try:
+        with get_pool().connection() as connection:
+            try:
+                # Unbuffered cursor: rows are read from the socket batch by batch
+                with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+                    # Execute the SQL statement
+                    cursor.execute(with_statement_timeout(sql_str))
+                    # Fetch the result (assuming a SELECT query here)
+                    result = ResultSet.from_cursor(cursor, max_rows)
+                # Commit if it's an update/insert/delete operation
+                connection.commit()
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+                raise
+            except Exception:
+                # Leave the connection clean before it goes back to the pool
+                connection.rollback()
+                raise
+    except Exception as e:
+        raise to_execution_error(e, sql_str) from e
+    finally:
+        record_db_round_trip("mariadb", len(result))
+
+    return result
+
+
+async def get_async_pool():
+    """
+    Returns the aiomysql pool bound to the current event loop, creating it on first use.
+    Returns None when aiomysql is not installed.
+    """
+    if aiomysql is None:
+        return None
+    holder = loop_local("db_runner.async_pool", lambda: {"pool": None, "lock": asyncio.Lock()})
+    if holder["pool"] is None:
+        async with holder["lock"]:
+            if holder["pool"] is None:
+                holder["pool"] = await aiomysql.create_pool(
+                    host=Config.DB_HOST,
+                    port=Config.DB_PORT,
+                    user=Config.DB_USER,
+                    password=Config.DB_PASSWORD,
+                    db=Config.DB_NAME,
+                    minsize=Config.DB_POOL_MIN_SIZE,
+                    maxsize=Config.DB_POOL_MAX_SIZE,
+                    pool_recycle=Config.DB_POOL_RECYCLE,
+                    cursorclass=aiomysql.DictCursor,
+                )
+    return holder["pool"]
+
+
+async def run_sql_async(sql_str: str, max_rows: int = None) -> ResultSet:
+    """
+    Async counterpart of run_sql_from_config().
+
+    Uses an aiomysql pool when available; otherwise (or when the SQLite replica is
+    enabled) runs the sync implementation in a worker thread so the event loop is
+    never blocked.
+
+    Args:
+        sql_str (str): The SQL statement to be executed.
+        max_rows (int): Row cap (defaults to Config.SQL_RESULT_MAX_ROWS, 0 = no cap).
+
+    Returns:
+        ResultSet: The query result; iterating it yields rows as read-only dict views.
+
+    Raises:
+        SQLExecutionError: If the statement failed, timed out or no connection was available.
+    """
+    if max_rows is None:
+        max_rows = Config.SQL_RESULT_MAX_ROWS
+    if aiomysql is None or Config.SQLITE_REPLICA_ENABLED:
+        # The replica answers locally; it may need a snapshot, so keep it off the loop
+        return await asyncio.to_thread(run_sql_from_config, sql_str, max_rows)
+
+    result = ResultSet(())
     try:
-        with connection.cursor() as cursor:
-            # Execute the SQL statement
-            cursor.execute(sql_str)
-            # Fetch the result (assuming a SELECT query here)
-            result = cursor.fetchall()
-        # Commit if it's an update/insert/delete operation
-        connection.commit()
+        pool = await get_async_pool()
+        async with pool.acquire() as connection:
+            async with connection.cursor(aiomysql.SSCursor) as cursor:
+                await cursor.execute(with_statement_timeout(sql_str))
+                result = await ResultSet.from_async_cursor(cursor, max_rows)
+            await connection.commit()
     except Exception as e:
-        print("An exception occurred while executing SQL:", e)
+        raise to_execution_error(e, sql_str) from e
     finally:
-        # Close the connection
-        connection.close()
+        record_db_round_trip("mariadb", len(result))
 
     return result
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lexical index over inventory entity names and their aliases.
+
+Used to put only the domains, server groups and services a question plausibly refers to
+into the SQL-generation prompt instead of the whole inventory.
+
+Tokenization handles the way names are written in this inventory and in questions:
+  - ASCII runs are split on case and digit boundaries ("DevQAEurope" -> dev, qa, europe;
+    "fortideploy_api" -> fortideploy, api) and also kept in compact form ("devqaeurope"),
+    so "DQ EU", "dqeu" and "DQEU" all meet;
+  - CJK runs are indexed as single characters and character bigrams, so Chinese aliases
+    match without a word segmenter.
+"""
+
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_ASCII_RUN = re.compile(r"[A-Za-z0-9]+")
+_CJK_RUN = re.compile(r"[㐀-䶿一-鿿豈-﫿]+")
+_PARTS = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# A term counts as mentioned once more than this share of its (idf-weighted) tokens occur in the question
+MATCH_COVERAGE = 0.5
+
+
+def _cjk_tokens(run: str) -> List[str]:
+    return list(run) + [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def term_tokens(text: str) -> Tuple[frozenset, str]:
+    """
+    Tokenizes an entity name or alias.
+
+    Returns:
+        tuple: (set of tokens, compact form: lowercase ASCII letters/digits and CJK characters only)
+    """
+    tokens = set()
+    for run in _ASCII_RUN.findall(text):
+        tokens.update(part.lower() for part in _PARTS.findall(run))
+        tokens.add(run.lower())
+    for run in _CJK_RUN.findall(text):
+        tokens.update(_cjk_tokens(run))
+    compact = "".join(ch.lower() for ch in text if ch.isascii() and ch.isalnum() or _CJK_RUN.match(ch))
+    return frozenset(tokens), compact
+
+
+def question_tokens(question: str) -> Tuple[set, set]:
+    """
+    Tokenizes a question.
+
+    Returns:
+        tuple: (tokens, compact forms of every one to three adjacent ASCII runs,
+               plus each CJK run and its substrings up to 8 characters)
+    """
+    tokens = set()
+    runs = _ASCII_RUN.findall(question)
+    for run in runs:
+        tokens.update(part.lower() for part in _PARTS.findall(run))
+        tokens.add(run.lower())
+    compacts = set()
+    lowered = [run.lower() for run in runs]
+    for size in (1, 2, 3):
+        for i in range(len(lowered) - size + 1):
+            compacts.add("".join(lowered[i:i + size]))
+    for run in _CJK_RUN.findall(question):
+        tokens.update(_cjk_tokens(run))
+        for i in range(len(run)):
+            for j in range(i + 1, min(len(run), i + 8) + 1):
+                compacts.add(run[i:j])
+    return tokens, compacts
+
+
+class EntityIndex:
+    """
+    Inverted index from name/alias tokens to entities.
+
+    Args:
+        entities (dict): {entity type: [name, ...]} in display order; duplicates are kept once.
+        aliases (dict): {(entity type, name): [alias, ...]}.
+    """
+
+    def __init__(self, entities: Dict[str, Iterable[str]], aliases: Dict[Tuple[str, str], List[str]] = None):
+        self.names = {}          # type -> distinct names in display order
+        self.aliases = aliases or {}
+        self._terms = []         # (entity key, tokens, compact)
+        self._postings = {}      # token -> term ids
+        self._compacts = {}      # compact form -> term ids
+        self._position = {}      # entity key -> display position
+        self.full_prompt_tokens = 0  # size of the unpruned prompt blocks, set by the builder
+
+        for entity_type, names in entities.items():
+            self.names[entity_type] = list(dict.fromkeys(names))
+            for name in self.names[entity_type]:
+                key = (entity_type, name)
+                self._position[key] = len(self._position)
+                for text in [name] + list(self.aliases.get(key, ())):
+                    self._add_term(key, text)
+
+        entity_count = max(1, sum(len(names) for names in self.names.values()))
+        self._idf = {}
+        for token, term_ids in self._postings.items():
+            df = len({self._terms[i][0] for i in term_ids})
+            self._idf[token] = math.log(1 + entity_count / df)
+
+    def _add_term(self, key: Tuple[str, str], text: str):
+        tokens, compact = term_tokens(text)
+        if not tokens:
+            return
+        term_id = len(self._terms)
+        self._terms.append((key, tokens, compact))
+        for token in tokens:
+            self._postings.setdefault(token, []).append(term_id)
+        self._compacts.setdefault(compact, []).append(term_id)
+
+    def __len__(self):
+        return sum(len(names) for names in self.names.values())
+
+    def lookup(self, entity_type: str, text: str) -> Optional[str]:
+        """
+        Resolves a phrase to the single entity of `entity_type` whose name or alias it spells
+        out (ignoring case, spaces and punctuation); None if there is no such entity or several.
+        """
+        _, compact = term_tokens(text)
+        names = {self._terms[term_id][0][1] for term_id in self._compacts.get(compact, ())
+                 if self._terms[term_id][0][0] == entity_type}
+        return names.pop() if len(names) == 1 else None
+
+    def match(self, question: str, limit: int = 0) -> Dict[str, List[str]]:
+        """
+        Returns the entities the question plausibly refers to.
+
+        A name or alias written out in the question (ignoring case, spaces and punctuation)
+        ranks first; otherwise entities are ranked by the idf-weighted share of a term's
+        tokens found in the question and kept above MATCH_COVERAGE.
+
+        Args:
+            limit (int): Maximum entities per type (0 = no limit).
+
+        Returns:
+            dict: {entity type: [name, ...]} best match first; types without matches are absent.
+        """
+        tokens, compacts = question_tokens(question)
+        scores = {}
+        for compact in compacts:
+            for term_id in self._compacts.get(compact, ()):
+                key = self._terms[term_id][0]
+                scores[key] = max(scores.get(key, 0.0), 1.0 + len(compact) / 100.0)
+
+        candidates = {term_id for token in tokens for term_id in self._postings.get(token, ())}
+        for term_id in candidates:
+            key, term, _ = self._terms[term_id]
+            total = sum(self._idf[token] for token in term)
+            found = sum(self._idf[token] for token in term if token in tokens)
+            coverage = found / total if total else 0.0
+            if coverage > MATCH_COVERAGE and coverage > scores.get(key, 0.0):
+                scores[key] = coverage
+
+        matches = {}
+        # Ties keep display order so the same question always yields the same prompt
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self._position[item[0]]))
+        for (entity_type, name), _ in ranked:
+            names = matches.setdefault(entity_type, [])
+            if not limit or len(names) < limit:
+                names.append(name)
+        return matches
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Local OpenAI-compatible server for exercising the LLM scheduler and the pipeline without
+the real API.
+
+    python fake_openai_server.py --port 8099 --latency 0.3 --rate-limit-every 5
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=test python web_server.py
+
+Chat completions answer with a ```sql block when the system prompt asks for SQL and with a
+short summary otherwise; both streaming and non-streaming calls are supported and report
+`usage`. Every n-th request can be refused with 429 and a Retry-After header.
+"""
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_SQL = "SELECT Name FROM Domain ORDER BY Name LIMIT 20;"
+DEFAULT_SUMMARY = "There are 20 domains in the configuration."
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Args:
+        address (tuple): (host, port) to listen on; port 0 picks a free one.
+        latency (float): Seconds each completion takes (spread over the chunks when streaming).
+        rate_limit_every (int): Refuse every n-th completion with 429 (0 = never).
+        retry_after (float): Retry-After seconds sent with a 429.
+        sql (str): Statement returned for SQL-generation prompts.
+        summary (str): Text returned for every other prompt.
+    """
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency: float = 0.0, rate_limit_every: int = 0,
+                 retry_after: float = 1.0, sql: str = DEFAULT_SQL, summary: str = DEFAULT_SUMMARY):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.sql = sql
+        self.summary = summary
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self.stats = {"completions": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> threading.Thread:
+        """Serves from a daemon thread; call shutdown() to stop."""
+        thread = threading.Thread(target=self.serve_forever, name="fake-openai", daemon=True)
+        thread.start()
+        return thread
+
+    def _count(self, key: str, delta: int = 1):
+        with self._lock:
+            self.stats[key] += delta
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.startswith("/v1/models/"):
+            model = self.path[len("/v1/models/"):]
+            self._send_json(200, {"id": model, "object": "model", "created": 0, "owned_by": "fake"})
+        else:
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        server = self.server
+        if server.rate_limit_every and next(server._counter) % server.rate_limit_every == 0:
+            server._count("rate_limited")
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                            "code": "rate_limit_exceeded"}},
+                            {"Retry-After": str(server.retry_after)})
+            return
+
+        messages = request.get("messages", [])
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        text = f"```sql\n{server.sql}\n```" if "generates SQL queries" in system else server.summary
+        prompt_tokens = sum(_tokens(str(m.get("content", ""))) for m in messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": _tokens(text),
+                 "total_tokens": prompt_tokens + _tokens(text)}
+        model = request.get("model", "fake")
+
+        server._count("completions")
+        server._count("in_flight")
+        try:
+            if request.get("stream"):
+                self._stream(model, text, usage, server.latency)
+            else:
+                time.sleep(server.latency)
+                self._send_json(200, {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": text}}],
+                    "usage": usage,
+                })
+        finally:
+            server._count("in_flight", -1)
+
+    def _stream(self, model: str, text: str, usage: dict, latency: float):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        words = text.split(" ")
+        pieces = [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+        for i, piece in enumerate(pieces):
+            time.sleep(latency / len(pieces))
+            finish = "stop" if i == len(pieces) - 1 else None
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model,
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        final = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": model, "choices": [], "usage": usage}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per completion.")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every n-th completion with 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with a 429.")
+    parser.add_argument("--sql", default=DEFAULT_SQL, help="Statement returned for SQL-generation prompts.")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer((args.host, args.port), latency=args.latency,
+                              rate_limit_every=args.rate_limit_every, retry_after=args.retry_after,
+                              sql=args.sql)
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
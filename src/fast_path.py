@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Deterministic fast path for common question shapes.
+
+Questions such as "How many domains do we have?", "172.16.97.128是什么server" or
+"list IPs of servers running X in domain Y" are recognized by pattern, their entity
+phrases are resolved against the known names and aliases (see entity_index), and a
+pre-written statement with the resolved values bound is executed. The answer is
+rendered from a template, so neither SQL generation nor summarization calls the LLM.
+
+Anything that does not match a shape exactly, or whose entities do not resolve to a
+single known name, returns None and goes through the regular LLM pipeline.
+"""
+
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+from pymysql.converters import escape_item
+from prompt_helper import get_cached_entity_index
+
+_IP = r"(?P<ip>(?:25[0-5]|2[0-4]\d|1?\d?\d)(?:\.(?:25[0-5]|2[0-4]\d|1?\d?\d)){3})"
+_HOSTS_EN = r"(?:servers?|hosts?|machines?)"
+_HOSTS_ZH = r"(?:服务器|主机|机器|server|host)"
+_DOMAIN_EN = r"(?:the\s+)?(?:domain\s+)?(?P<domain>.+?)(?:\s+domain)?"
+_DOMAIN_ZH = r"(?P<domain>.+?)\s*(?:域|domain)?\s*(?:中|里|内|上)?"
+
+
+class Intent:
+    """
+    One recognizable question shape.
+
+    Args:
+        name (str): Intent name reported in metadata and stats.
+        patterns (list): Regexes matched against the whole normalized question; named groups
+                         are entity phrases ("domain", "service") or literal values ("ip").
+        sql (str): Statement with %(name)s placeholders, or a callable(params) returning one.
+        render (callable): render(rows, params, language) -> answer text.
+    """
+
+    def __init__(self, name: str, patterns: List[str], sql, render: Callable):
+        self.name = name
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        self.sql = sql
+        self.render = render
+
+
+class FastPathMatch:
+    __slots__ = ("intent", "params", "sql")
+
+    def __init__(self, intent: Intent, params: dict, sql: str):
+        self.intent = intent
+        self.params = params
+        self.sql = sql
+
+
+def bind_params(sql: str, params: dict) -> str:
+    """
+    Substitutes %(name)s placeholders with escaped literals, as pymysql does for cursor.execute(sql, params).
+    The bound statement is what gets executed, guarded, logged and shown as the generated SQL.
+    """
+    return sql % {key: escape_item(value, "utf8mb4") for key, value in params.items()}
+
+
+# -- answer templates --------------------------------------------------------
+
+def _servers(count: int) -> str:
+    return f"{count} server" if count == 1 else f"{count} servers"
+
+
+def _render_count_domains(rows, params: dict, language: str) -> str:
+    count = rows[0]["domain_count"] if rows else 0
+    if language == "zh":
+        return f"共有 {count} 个域。"
+    return "There is 1 domain." if count == 1 else f"There are {count} domains."
+
+
+def _render_list_domains(rows, params: dict, language: str) -> str:
+    names = [row["name"] for row in rows]
+    if language == "zh":
+        return f"共有 {len(names)} 个域：" + "、".join(names) + "。"
+    return f"There are {len(names)} domains: " + ", ".join(names) + "."
+
+
+def _render_ip_lookup(rows, params: dict, language: str) -> str:
+    ip = params["ip"]
+    if not rows:
+        return f"未找到 IP 为 {ip} 的服务器。" if language == "zh" else f"No server with IP {ip} was found."
+    hosts = {}
+    for row in rows:
+        hosts.setdefault((row["domain"], row["hostname"]), []).append(row["host_group"])
+    lines = []
+    for (domain, hostname), groups in hosts.items():
+        if language == "zh":
+            lines.append(f"{ip} 是 {domain} 域中的主机 {hostname}，所属主机组：" + "、".join(groups) + "。")
+        else:
+            lines.append(f"{ip} is host {hostname} in domain {domain}, host groups: " + ", ".join(groups) + ".")
+    return "\n".join(lines)
+
+
+def _render_service_hosts(rows, params: dict, language: str) -> str:
+    service = params["service"]
+    domain = params.get("domain")
+    if language == "zh":
+        scope = f"{domain} 域中" if domain else ""
+        if not rows:
+            return f"{scope}未找到运行 {service} 的服务器。"
+        head = f"{scope}运行 {service} 的服务器共 {len(rows)} 台："
+    else:
+        scope = f" in domain {domain}" if domain else ""
+        if not rows:
+            return f"No servers running {service} were found{scope}."
+        head = f"{_servers(len(rows))} {'runs' if len(rows) == 1 else 'run'} {service}{scope}:"
+    lines = [head]
+    for row in rows:
+        where = "" if domain else f" [{row['domain']}]"
+        lines.append(f"- {row['hostname']} ({row['ip_address']}){where}")
+    return "\n".join(lines)
+
+
+def _render_count_domain_hosts(rows, params: dict, language: str) -> str:
+    count = rows[0]["host_count"] if rows else 0
+    domain = params["domain"]
+    return f"{domain} 域共有 {count} 台服务器。" if language == "zh" else f"Domain {domain} has {_servers(count)}."
+
+
+def _service_hosts_sql(params: dict) -> str:
+    sql = ("SELECT DISTINCT d.name AS domain, h.hostname, h.ip_address FROM ServerHost h "
+           "JOIN Domain d ON d.id = h.domain_id "
+           "JOIN ServerGroupMapping m ON m.server_host_group_id = h.server_host_group_id "
+           "JOIN Service s ON s.id = m.service_id "
+           "WHERE s.name = %(service)s")
+    if params.get("domain"):
+        sql += " AND d.name = %(domain)s"
+    return sql + " ORDER BY d.name, h.hostname"
+
+
+INTENTS = [
+    Intent(
+        "count_domains",
+        [r"(?:how many|number of|count(?: of)?)\s+(?:the\s+)?domains(?:\s+(?:do|does)\s+(?:we|you|i)\s+have"
+         r"|\s+are\s+there|\s+exist|\s+in\s+total|\s+total)?",
+         r"(?:我们|系统|数据库)?(?:里|中)?(?:一共|总共|共)?有(?:多少|几)个?\s*(?:域|domains?)",
+         r"(?:域|domains?)\s*(?:的)?(?:数量|个数|有多少个?|有几个)(?:是多少)?"],
+        "SELECT COUNT(*) AS domain_count FROM Domain",
+        _render_count_domains),
+    Intent(
+        "list_domains",
+        [r"(?:list|show(?: me)?|what are|which are)(?:\s+all)?(?:\s+the)?\s+domains",
+         r"(?:what|which)\s+domains\s+(?:do\s+we\s+have|are\s+there|exist)",
+         r"(?:列出|显示|列举)?(?:所有|全部)的?\s*(?:域|domains?)(?:有哪些)?",
+         r"有哪些\s*(?:域|domains?)"],
+        "SELECT name FROM Domain ORDER BY name",
+        _render_list_domains),
+    Intent(
+        "ip_lookup",
+        [rf"(?:what|which)\s+(?:server|host|machine)\s+(?:is|has|uses|owns)\s+(?:the\s+)?(?:ip\s+)?(?:address\s+)?{_IP}",
+         rf"(?:what|who)\s+is\s+{_IP}",
+         rf"{_IP}\s+is\s+(?:what|which)\s+(?:server|host|machine)",
+         rf"(?:look\s*up|find)\s+(?:ip\s+)?{_IP}",
+         rf"(?:ip\s*)?{_IP}\s*(?:是|是什么|是哪个|是哪台|对应)(?:什么|哪个|哪台)?的?\s*{_HOSTS_ZH}",
+         rf"(?:ip\s*)?(?:为|是)?\s*{_IP}\s*的?\s*{_HOSTS_ZH}\s*(?:是)?(?:哪台|哪个|什么)",
+         rf"(?:哪台|哪个|什么)\s*{_HOSTS_ZH}\s*的?\s*ip\s*(?:地址)?\s*是\s*{_IP}"],
+        "SELECT d.name AS domain, h.hostname, h.ip_address, g.name AS host_group FROM ServerHost h "
+        "JOIN Domain d ON d.id = h.domain_id "
+        "JOIN ServerHostGroup g ON g.id = h.server_host_group_id "
+        "WHERE h.ip_address = %(ip)s ORDER BY d.name, h.hostname, g.name",
+        _render_ip_lookup),
+    Intent(
+        "service_hosts",
+        [rf"(?:list|show|get|what are)(?:\s+me)?(?:\s+all)?(?:\s+the)?\s+(?:ips|ip addresses|ip)\s+of\s+(?:the\s+)?"
+         rf"(?:all\s+)?{_HOSTS_EN}\s+(?:running|that run|hosting|with)\s+(?:the\s+)?(?P<service>.+?)(?:\s+service)?"
+         rf"(?:\s+in\s+{_DOMAIN_EN})?",
+         rf"(?:which|what)\s+{_HOSTS_EN}\s+(?:run|are running|host|have)\s+(?:the\s+)?(?P<service>.+?)(?:\s+service)?"
+         rf"(?:\s+in\s+{_DOMAIN_EN})?",
+         rf"(?:列出|显示|查询)?\s*(?:{_DOMAIN_ZH})?\s*(?:运行|跑|部署)了?\s*(?P<service>.+?)\s*(?:服务)?\s*的\s*"
+         rf"{_HOSTS_ZH}\s*的?\s*(?:ip|IP)?\s*(?:地址)?(?:是什么|有哪些|列表)?",
+         rf"(?:{_DOMAIN_ZH})?\s*哪些\s*{_HOSTS_ZH}\s*(?:运行|跑|部署)了?\s*(?P<service>.+?)\s*(?:服务)?"],
+        _service_hosts_sql,
+        _render_service_hosts),
+    Intent(
+        "count_domain_hosts",
+        [rf"how many\s+{_HOSTS_EN}\s+(?:are\s+|do\s+we\s+have\s+)?(?:there\s+)?(?:are\s+)?in\s+{_DOMAIN_EN}",
+         rf"how many\s+{_HOSTS_EN}\s+(?:does|do)\s+{_DOMAIN_EN}\s+have",
+         rf"{_DOMAIN_ZH}\s*(?:一共|总共|共)?有(?:多少|几)(?:台|个)?\s*{_HOSTS_ZH}"],
+        # A host has one ServerHost row per host group it belongs to
+        "SELECT COUNT(DISTINCT h.hostname) AS host_count FROM ServerHost h JOIN Domain d ON d.id = h.domain_id "
+        "WHERE d.name = %(domain)s",
+        _render_count_domain_hosts),
+]
+
+# Entity phrase groups and the entity type they are resolved against
+_ENTITY_GROUPS = {"domain": "domain", "service": "service"}
+
+
+def normalize(question: str) -> str:
+    """
+    Trims politeness and trailing punctuation and collapses whitespace before matching.
+    """
+    text = re.sub(r"\s+", " ", question).strip()
+    text = re.sub(r"^(?:please\s+|请|帮我|请帮我)", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"[\s?？.。!！]+$", "", text)
+    text = re.sub(r"(?:呢|吗|啊)$", "", text)
+    return text.strip()
+
+
+class FastPathStats:
+    """
+    Counts how often the fast path answers a question instead of the LLM pipeline.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.questions = 0
+        self.hits = {}
+        self.unresolved = 0   # shape matched but an entity did not resolve to one known name
+
+    def record(self, intent: Optional[str], unresolved: bool = False):
+        with self._lock:
+            self.questions += 1
+            if intent is not None:
+                self.hits[intent] = self.hits.get(intent, 0) + 1
+            elif unresolved:
+                self.unresolved += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {
+                "questions": self.questions,
+                "hits": hits,
+                "hit_rate": hits / self.questions if self.questions else 0.0,
+                "by_intent": dict(self.hits),
+                "unresolved": self.unresolved,
+            }
+
+
+_stats = FastPathStats()
+
+
+def _resolve(groups: Dict[str, str]) -> Optional[dict]:
+    """
+    Resolves the entity phrases of a match; None if any of them is not exactly one known entity.
+    """
+    params = {}
+    index = None
+    for group, value in groups.items():
+        if value is None:
+            continue
+        value = value.strip()
+        if group in _ENTITY_GROUPS:
+            index = index or get_cached_entity_index()
+            name = index.lookup(_ENTITY_GROUPS[group], value)
+            if name is None:
+                return None
+            params[group] = name
+        else:
+            params[group] = value
+    return params
+
+
+def match_question(question: str) -> Optional[FastPathMatch]:
+    """
+    Returns the fast-path match for a question, or None if it must go through the LLM pipeline.
+    May load the entity index (DB round trips on a cold cache), so call it off the event loop.
+    """
+    text = normalize(question)
+    unresolved = False
+    for intent in INTENTS:
+        for pattern in intent.patterns:
+            found = pattern.fullmatch(text)
+            if found is None:
+                continue
+            params = _resolve(found.groupdict())
+            if params is None:
+                # Try the remaining patterns; a different split of the phrase may resolve
+                unresolved = True
+                continue
+            sql = intent.sql(params) if callable(intent.sql) else intent.sql
+            _stats.record(intent.name)
+            return FastPathMatch(intent, params, bind_params(sql, params) if params else sql)
+    _stats.record(None, unresolved)
+    return None
+
+
+def render_answer(match: FastPathMatch, entry: dict, language: str = "en") -> str:
+    """
+    Renders the templated answer from the execution entry of the matched statement.
+    """
+    error = entry.get("error")
+    if error:
+        return f"查询执行失败：{error['message']}" if language == "zh" else f"The query could not be run: {error['message']}"
+    return match.intent.render(entry["result"], match.params, language)
+
+
+def get_fast_path_stats() -> dict:
+    """
+    Returns how many questions were seen and answered by each fast-path intent since process start.
+    """
+    return _stats.snapshot()
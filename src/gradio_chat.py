@@ -1,11 +1,15 @@
 import gradio as gr
 import json
+import threading
+import time
+from collections import deque
 from typing import Dict, Any
-from web_server import process_question
+from main import process_question_stream
 from chat_logger import ChatLogger
+from chat_log_writer import get_chat_log_writer
 import uuid
-import os
 from datetime import datetime
+from config_reader import Config
 
 TRANSLATIONS = {
     "zh": {
@@ -15,6 +19,7 @@ TRANSLATIONS = {
         "clear_btn": "清空对话",
         "retry_btn": "重试",
         "loading": "正在查询中...",
+        "queued": "排队中：第 {position} 位，已等待 {waited:.0f} 秒...",
         "error": "抱歉，处理您的请求时出现错误: {}",
         "examples": [
             "How many domains do we have?",
@@ -36,6 +41,7 @@ TRANSLATIONS = {
         "clear_btn": "Clear Chat",
         "retry_btn": "Retry",
         "loading": "Querying...",
+        "queued": "Waiting in queue: position {position}, waited {waited:.0f}s...",
         "error": "Sorry, an error occurred: {}",
         "examples": [
             "How many domains do we have?",
@@ -52,10 +58,76 @@ TRANSLATIONS = {
     }
 }
 
+class PipelineSlots:
+    """
+    FIFO admission to a fixed number of concurrently running question pipelines.
+
+    Requests beyond `workers` wait in arrival order; wait_turn() reports their queue
+    position and waiting time so the UI can show them.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = deque()
+        self._stats = {"admitted": 0, "waited": 0, "wait_time_total": 0.0, "wait_time_max": 0.0}
+
+    def wait_turn(self, poll_interval: float = 1.0):
+        """
+        Generator yielding (position, waited_seconds) while queued; it finishes once a slot
+        is held, which must then be given back with release(). Closing it early leaves the queue.
+        """
+        ticket = object()
+        start = time.monotonic()
+        admitted = False
+        with self._cond:
+            self._waiting.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    if self._waiting[0] is ticket and self._running < self.workers:
+                        self._waiting.popleft()
+                        self._running += 1
+                        admitted = True
+                        waited = time.monotonic() - start
+                        self._stats["admitted"] += 1
+                        if waited > 0.01:
+                            self._stats["waited"] += 1
+                        self._stats["wait_time_total"] += waited
+                        self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+                        return
+                    position = self._waiting.index(ticket) + 1
+                    self._cond.wait(poll_interval)
+                yield position, time.monotonic() - start
+        finally:
+            if not admitted:
+                with self._cond:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update(running=self._running, queued=len(self._waiting), workers=self.workers)
+        return snapshot
+
+_pipeline_slots = PipelineSlots(Config.GRADIO_PIPELINE_WORKERS)
+
 class SQLChatBot:
-    def __init__(self):
+    def __init__(self, logger: ChatLogger = None, slots: PipelineSlots = None):
         self.current_lang = "en"
-        self.logger = ChatLogger()
+        self.logger = logger or ChatLogger(writer=get_chat_log_writer())
+        self.slots = slots or _pipeline_slots
+        self.conversation_id = str(uuid.uuid4())
+
+    def new_conversation(self):
+        """Start a fresh conversation id, e.g. after the chat was cleared"""
         self.conversation_id = str(uuid.uuid4())
     
     def switch_language(self, lang: str) -> Dict[str, str]:
@@ -63,8 +135,8 @@ class SQLChatBot:
         self.current_lang = "zh" if lang == "中文" else "en"
         return TRANSLATIONS[self.current_lang]
     
-    def process_query(self, message: str, history: list) -> tuple:
-        """Process user query and return formatted response"""
+    def process_query(self, message: str, history: list):
+        """Process user query and stream the formatted response into the chatbot"""
         try:
             # 记录用户问题
             self.logger.add_message(
@@ -75,36 +147,60 @@ class SQLChatBot:
             
             # 处理查询
             start_time = datetime.now().isoformat()
-            response = process_question(message, self.current_lang)
-            end_time = datetime.now().isoformat()
-            
-            # 记录系统响应
-            self.logger.add_message(
-                conversation_id=self.conversation_id,
-                content=response,
-                role="assistant",
-                metadata={
-                    "language": self.current_lang,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    # 从 process_question 获取中间过程数据
-                    "generated_sql": getattr(response, 'generated_sql', None),
-                    "query_results": getattr(response, 'query_results', None),
-                    "summary_process": getattr(response, 'metadata', {}).get('summary_process', {}),
-                    "status": "success"
-                }
-            )
+            history.append((message, TRANSLATIONS[self.current_lang]["loading"]))
+            yield history, "", history
+
+            # 等待空闲的查询 worker，期间显示排队位置和等待时间
+            waiter = self.slots.wait_turn()
+            queued = False
+            try:
+                for position, waited in waiter:
+                    queued = True
+                    history[-1] = (message, TRANSLATIONS[self.current_lang]["queued"].format(
+                        position=position, waited=waited))
+                    yield history, "", history
+            finally:
+                waiter.close()
+
+            try:
+                if queued:
+                    history[-1] = (message, TRANSLATIONS[self.current_lang]["loading"])
+                    yield history, "", history
+
+                response = None
+                partial = ""
+                for event in process_question_stream(message, self.current_lang):
+                    if event["event"] == "summary_token":
+                        partial += event["text"]
+                        history[-1] = (message, partial)
+                        yield history, "", history
+                    elif event["event"] == "done":
+                        response = event["response"]
+                    elif event["event"] == "error":
+                        raise RuntimeError(event["error"]["message"])
+                end_time = datetime.now().isoformat()
             
-            # 每次对话后保存日志
-            log_dir = "chat_logs"
-            os.makedirs(log_dir, exist_ok=True)
-            self.logger.save_to_file(
-                self.conversation_id,
-                f"{log_dir}/conversation_{self.conversation_id}.json"
-            )
+                # 记录系统响应
+                self.logger.add_message(
+                    conversation_id=self.conversation_id,
+                    content=response,
+                    role="assistant",
+                    metadata={
+                        "language": self.current_lang,
+                        "start_time": start_time,
+                        "end_time": end_time,
+                        # 从 process_question 获取中间过程数据
+                        "generated_sql": getattr(response, 'generated_sql', None),
+                        "query_results": getattr(response, 'query_results', None),
+                        "summary_process": getattr(response, 'metadata', {}).get('summary_process', {}),
+                        "status": "success"
+                    }
+                )
             
-            history.append((message, response))
-            return history, "", history
+                history[-1] = (message, response)
+                yield history, "", history
+            finally:
+                self.slots.release()
             
         except Exception as e:
             error_msg = TRANSLATIONS[self.current_lang]["error"].format(str(e))
@@ -123,12 +219,42 @@ class SQLChatBot:
                 }
             )
             
-            history.append((message, error_msg))
-            return history, "", history
+            if history and history[-1][0] == message:
+                history[-1] = (message, error_msg)
+            else:
+                history.append((message, error_msg))
+            yield history, "", history
+
+class SessionRegistry:
+    """
+    One SQLChatBot per browser session (keyed by Gradio's session hash), so language and
+    conversation id are never shared between users. Sessions idle for `ttl` seconds are dropped.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.logger = ChatLogger(writer=get_chat_log_writer())
+        self._sessions = {}  # session hash -> (bot, last seen)
+        self._lock = threading.Lock()
+
+    def get(self, request: gr.Request) -> SQLChatBot:
+        session_hash = getattr(request, "session_hash", None) or str(uuid.uuid4())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_hash)
+            bot = entry[0] if entry else SQLChatBot(logger=self.logger)
+            self._sessions[session_hash] = (bot, now)
+            if self.ttl:
+                for key in [k for k, (_, seen) in self._sessions.items() if now - seen > self.ttl]:
+                    del self._sessions[key]
+        return bot
+
+    def __len__(self):
+        return len(self._sessions)
 
 def create_interface():
     """Create and configure the Gradio interface"""
-    bot = SQLChatBot()
+    sessions = SessionRegistry(Config.GRADIO_SESSION_TTL)
     
     # Add custom CSS for dark mode and layout
     custom_css = """
@@ -230,26 +356,34 @@ def create_interface():
         # Setup chat functionality
         state = gr.State([])
 
+        def respond(message: str, history: list, request: gr.Request):
+            """Route the query to the bot of the calling browser session"""
+            yield from sessions.get(request).process_query(message, history)
+
         submit_click = submit.click(
-            bot.process_query,
+            respond,
             inputs=[msg, state],
             outputs=[chatbot, msg, state],
             show_progress=True
         )
 
         msg.submit(
-            bot.process_query,
+            respond,
             inputs=[msg, state],
             outputs=[chatbot, msg, state],
             show_progress=True
         )
 
-        clear.click(lambda: ([], "", []), outputs=[chatbot, msg, state])
+        def on_clear(request: gr.Request):
+            sessions.get(request).new_conversation()
+            return [], "", []
+
+        clear.click(on_clear, outputs=[chatbot, msg, state])
         
         # Language change handler
-        def on_language_change(lang):
+        def on_language_change(lang, request: gr.Request):
             """Handle language change events"""
-            trans = bot.switch_language(lang)
+            trans = sessions.get(request).switch_language(lang)
             return (
                 f"# {trans['title']}",
                 trans['description'],
@@ -269,6 +403,12 @@ def create_interface():
             ]
         )
     
+    # Gradio shows queue position and ETA for events beyond the concurrency limit; inside it,
+    # PipelineSlots caps running pipelines at Config.GRADIO_PIPELINE_WORKERS
+    demo.queue(
+        default_concurrency_limit=Config.GRADIO_CONCURRENCY_LIMIT,
+        max_size=Config.GRADIO_QUEUE_MAX_SIZE
+    )
     return demo
 
 if __name__ == "__main__":
@@ -276,5 +416,6 @@ if __name__ == "__main__":
     demo.launch(
         server_name="0.0.0.0",
         server_port=5000,
-        share=False
+        share=False,
+        max_threads=max(40, Config.GRADIO_CONCURRENCY_LIMIT + 8)
     ) 
\ No newline at end of file
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+Production serving for web_server:
+
+    cd src && gunicorn -c gunicorn.conf.py web_server:app
+
+Pre-forked workers with a thread pool each (streaming answers hold a thread while the
+model is generating). The app is imported in every worker rather than in the master, so
+each worker owns its connections and LLM clients, warms them up after forking and only
+reports ready on /readyz afterwards. On SIGTERM a worker reports "draining", refuses new
+questions and lets in-flight ones finish within graceful_timeout; the waiting is done by the
+gthread worker itself, once.
+"""
+
+import signal
+
+from config_reader import Config
+
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+worker_class = "gthread"
+threads = Config.WEB_THREADS
+timeout = Config.WEB_TIMEOUT
+graceful_timeout = Config.WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+preload_app = False
+
+
+def post_worker_init(worker):
+    import web_server
+
+    web_server.start_warm_up()
+
+    # Flip /readyz to 503 before gunicorn stops this worker, so load balancers move away first
+    stop_worker = worker.handle_exit
+
+    def handle_exit(sig, frame):
+        web_server.begin_drain()
+        stop_worker(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_exit)
+
+
+def worker_exit(server, worker):
+    import web_server
+
+    # The worker has already waited up to graceful_timeout for its requests; only report
+    if not web_server.wait_for_drain(0):
+        server.log.warning("Worker %s exited with questions still in flight", worker.pid)
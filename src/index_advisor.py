@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Index advisor driven by the real LLM-generated query workload.
+
+Reads the statements recorded by execute_multiple_queries (opt-in via Config.SQL_WORKLOAD_LOG),
+runs EXPLAIN on each distinct one, and for tables that are fully scanned proposes a
+minimal set of secondary indexes built from the columns the workload actually filters
+and joins on. With --apply the indexes are created and every statement is timed before
+and after, so schema changes follow the real question mix.
+
+Usage:
+    python index_advisor.py [--log logs/sql_workload.jsonl] [--top 50] [--repeat 5] [--apply]
+"""
+
+import argparse
+import re
+import statistics
+import time
+from collections import defaultdict
+
+from config_reader import Config
+from db_runner import get_pool
+from sql_workload import load_workload
+
+# EXPLAIN access types that mean "no usable index"
+FULL_SCAN_TYPES = ("ALL", "index")
+
+_KEYWORDS = {"ON", "WHERE", "JOIN", "LEFT", "RIGHT", "INNER", "OUTER", "CROSS", "GROUP", "ORDER",
+             "LIMIT", "USING", "AS", "HAVING", "UNION", "NATURAL", "STRAIGHT_JOIN", "SET"}
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?`?(\w+)`?)?", re.IGNORECASE)
+_QUALIFIED_PREDICATE = re.compile(
+    r"`?(\w+)`?\.`?(\w+)`?\s*(?:=|<=|>=|<|>|\bIN\b|\bLIKE\b|\bBETWEEN\b)", re.IGNORECASE)
+_QUALIFIED_RHS = re.compile(r"(?:=|<=|>=|<|>)\s*`?(\w+)`?\.`?(\w+)`?", re.IGNORECASE)
+_BARE_PREDICATE = re.compile(
+    r"(?<![\w.`])`?(\w+)`?\s*(?:=|\bIN\b|\bLIKE\b)\s*(?:'|\"|\(|\d)", re.IGNORECASE)
+
+
+def table_aliases(sql: str, known_tables: set) -> dict:
+    """
+    Maps every alias (and table name) used in the statement to its table.
+    """
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        if table not in known_tables:
+            continue
+        aliases[table] = table
+        if alias and alias.upper() not in _KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def predicate_columns(sql: str, columns_by_table: dict) -> dict:
+    """
+    Returns {table: [column, ...]} for columns used in WHERE / JOIN predicates, in order of appearance.
+    """
+    aliases = table_aliases(sql, set(columns_by_table))
+    used = defaultdict(list)
+
+    def add(table, column):
+        if table and column in columns_by_table.get(table, ()) and column not in used[table]:
+            used[table].append(column)
+
+    for alias, column in _QUALIFIED_PREDICATE.findall(sql) + _QUALIFIED_RHS.findall(sql):
+        add(aliases.get(alias), column)
+    # Unqualified columns are attributed when a single table owns that column name
+    referenced = set(aliases.values())
+    for column in _BARE_PREDICATE.findall(sql):
+        owners = [table for table in referenced if column in columns_by_table.get(table, ())]
+        if len(owners) == 1:
+            add(owners[0], column)
+    return used
+
+
+def fetch_schema(cursor) -> tuple:
+    """
+    Returns ({table: set(columns)}, {table: [index column tuple, ...]}) for the current schema.
+    """
+    cursor.execute("SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()")
+    columns_by_table = defaultdict(set)
+    for row in cursor.fetchall():
+        columns_by_table[row["TABLE_NAME"]].add(row["COLUMN_NAME"])
+
+    cursor.execute(
+        "SELECT TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX")
+    index_columns = defaultdict(list)
+    for row in cursor.fetchall():
+        index_columns[(row["TABLE_NAME"], row["INDEX_NAME"])].append(row["COLUMN_NAME"])
+    indexes = defaultdict(list)
+    for (table, _), cols in index_columns.items():
+        indexes[table].append(tuple(cols))
+    return dict(columns_by_table), dict(indexes)
+
+
+def explain(cursor, sql: str) -> list:
+    cursor.execute("EXPLAIN " + sql)
+    return cursor.fetchall()
+
+
+def is_covered(candidate: tuple, existing: list) -> bool:
+    """
+    An index is redundant if its columns are a leading prefix of another index.
+    """
+    return any(index[:len(candidate)] == candidate for index in existing)
+
+
+def propose_indexes(workload: list, cursor, columns_by_table: dict, indexes: dict) -> list:
+    """
+    Proposes a minimal index set: for each fully scanned table, the predicate columns
+    the workload uses on it, weighted by statement frequency.
+
+    Returns:
+        list: [{"table", "columns", "weight", "statements"}], highest weight first.
+    """
+    # (table, columns) -> {statement: executions}
+    candidates = defaultdict(dict)
+    for entry in workload:
+        try:
+            plan = explain(cursor, entry["query"])
+        except Exception as e:
+            print(f"[WARNING] EXPLAIN failed, skipped: {e}\n  {entry['query'][:120]}")
+            continue
+        scanned = {row.get("table") for row in plan if row.get("type") in FULL_SCAN_TYPES}
+        if not scanned:
+            continue
+        aliases = table_aliases(entry["query"], set(columns_by_table))
+        scanned_tables = {aliases.get(name, name) for name in scanned}
+        for table, cols in predicate_columns(entry["query"], columns_by_table).items():
+            if table not in scanned_tables:
+                continue
+            # One composite index for the statement's predicates on this table (max 3 columns),
+            # plus each join/filter column on its own so other statements can share it
+            proposals = {tuple(cols[:3])} | {(col,) for col in cols}
+            for candidate in proposals:
+                candidates[(table, candidate)][entry["query"]] = entry["count"]
+
+    # Minimal set: drop anything already covered by an existing index or by a longer candidate
+    chosen = []
+    for (table, cols), served in sorted(candidates.items(),
+                                        key=lambda kv: (-len(kv[0][1]), -sum(kv[1].values()), kv[0])):
+        if is_covered(cols, indexes.get(table, [])):
+            continue
+        covering = [c for c in chosen if c["table"] == table and c["columns"][:len(cols)] == cols]
+        if covering:
+            # Statements filtering on the prefix alone are served by the wider index
+            covering[0]["served"].update(served)
+            continue
+        chosen.append({"table": table, "columns": cols, "served": dict(served)})
+    for candidate in chosen:
+        served = candidate.pop("served")
+        candidate["weight"] = sum(served.values())
+        candidate["statements"] = len(served)
+    chosen.sort(key=lambda c: (-c["weight"], c["table"], c["columns"]))
+    return chosen
+
+
+def index_name(table: str, columns: tuple) -> str:
+    return ("idx_" + table + "_" + "_".join(columns))[:64]
+
+
+def create_index_sql(candidate: dict) -> str:
+    cols = ", ".join(f"`{col}`" for col in candidate["columns"])
+    return f"CREATE INDEX `{index_name(candidate['table'], candidate['columns'])}` ON `{candidate['table']}` ({cols})"
+
+
+def time_workload(cursor, workload: list, repeat: int) -> dict:
+    """
+    Runs each statement `repeat` times and returns {query: median ms}.
+    """
+    timings = {}
+    for entry in workload:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                cursor.execute(entry["query"])
+                cursor.fetchall()
+            except Exception:
+                break
+            samples.append((time.perf_counter() - start) * 1000)
+        if samples:
+            timings[entry["query"]] = statistics.median(samples)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose (and optionally apply) indexes for the recorded SQL workload.")
+    parser.add_argument("--log", default=Config.SQL_WORKLOAD_LOG or "logs/sql_workload.jsonl",
+                        help="workload log path (Config.SQL_WORKLOAD_LOG) written by execute_multiple_queries")
+    parser.add_argument("--top", type=int, default=100, help="analyse the N most frequent distinct statements")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per statement")
+    parser.add_argument("--apply", action="store_true", help="create the proposed indexes and report before/after latency")
+    args = parser.parse_args()
+
+    workload = load_workload(args.log)[:args.top]
+    print(f"Loaded {len(workload)} distinct statements from {args.log}")
+    if not workload:
+        return
+
+    with get_pool().connection() as connection:
+        with connection.cursor() as cursor:
+            columns_by_table, indexes = fetch_schema(cursor)
+            proposals = propose_indexes(workload, cursor, columns_by_table, indexes)
+
+            if not proposals:
+                print("No full table scans with indexable predicates found; nothing to propose.")
+                return
+            print("\nProposed indexes (weight = executions that would use them):")
+            for candidate in proposals:
+                print(f"  {create_index_sql(candidate)};  -- weight={candidate['weight']}, "
+                      f"statements={candidate['statements']}")
+
+            if not args.apply:
+                print("\nRe-run with --apply to create them and measure before/after latency.")
+                return
+
+            before = time_workload(cursor, workload, args.repeat)
+            for candidate in proposals:
+                cursor.execute(create_index_sql(candidate))
+            connection.commit()
+            after = time_workload(cursor, workload, args.repeat)
+
+    print(f"\n{'before ms':>10} {'after ms':>10} {'speedup':>8}  statement")
+    weighted_before = weighted_after = 0.0
+    for entry in workload:
+        query = entry["query"]
+        if query not in before or query not in after:
+            continue
+        weighted_before += before[query] * entry["count"]
+        weighted_after += after[query] * entry["count"]
+        speedup = before[query] / after[query] if after[query] else float("inf")
+        print(f"{before[query]:>10.2f} {after[query]:>10.2f} {speedup:>7.1f}x  {query[:100]}")
+    if weighted_after:
+        print(f"\nFrequency-weighted workload latency: {weighted_before:.1f} ms -> {weighted_after:.1f} ms "
+              f"({weighted_before / weighted_after:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
-from langchain_openai import OpenAI
-from langchain_community.utilities import SQLDatabase
-from langchain.chains.sql_database.query import create_sql_query_chain
-from langchain.prompts.prompt import PromptTemplate
 import os
 from config_reader import Config
 
 def setup_database_chain():
     """Setup database connection and LangChain"""
+    # The langchain stack takes seconds to import; load it only when a chain is built
+    from langchain_openai import OpenAI
+    from langchain_community.utilities import SQLDatabase
+    from langchain.chains.sql_database.query import create_sql_query_chain
+    from langchain.prompts.prompt import PromptTemplate
+
     # Initialize OpenAI LLM
     llm = OpenAI(
         temperature=0,
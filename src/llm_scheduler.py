@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Central scheduler for every chat-completion call (SQL generation and summarization).
+
+- Token buckets cap requests/min and tokens/min (estimated up front, corrected with the
+  `usage` the API reports), so bursts queue locally instead of turning into 429s.
+- Calls that still fail with 429, 5xx, timeouts or connection errors are retried with
+  jittered exponential backoff; a Retry-After header wins over the computed delay and
+  pauses the whole scheduler, not just the failing call.
+- Waiting calls are served by lane priority: "interactive" (web / Gradio questions)
+  before "batch" (/ask_batch). The lane is taken from the LLM_LANE context variable.
+- stats() exposes queue depth and wait times per lane plus retry counters.
+
+Limits apply per process: with several gunicorn workers, divide the account limits.
+Point OPENAI_BASE_URL at fake_openai_server.py to exercise all of this locally.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import time
+from typing import TYPE_CHECKING, Optional
+
+from config_reader import Config
+from async_runner import loop_local, run_coroutine
+from tracing import record_llm_request, record_llm_usage
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Lane names and their priority (lower is served first)
+LANES = {"interactive": 0, "batch": 1}
+
+# Lane used by chat-completion calls made in the current context
+LLM_LANE = contextvars.ContextVar("llm_lane", default="interactive")
+
+
+def _openai():
+    # Importing openai costs more than the rest of the pipeline together; load it on first use
+    import openai
+    return openai
+
+
+def get_async_client() -> "AsyncOpenAI":
+    """
+    Returns the AsyncOpenAI client bound to the current event loop.
+    Retries are left to the scheduler, so the client's own retry loop is disabled.
+    """
+    return loop_local("openai.async_client", lambda: _openai().AsyncOpenAI(
+        api_key=Config.OPENAI_API_KEY, base_url=Config.OPENAI_BASE_URL, max_retries=0))
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute` / 60 per second.
+    A capacity of 0 disables the limit.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        # A single call larger than the bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.capacity:
+            self._refill()
+            self.tokens -= amount
+
+    def refund(self, amount: float):
+        if self.capacity:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def estimate_tokens(messages: list, max_tokens: int) -> int:
+    """
+    Rough token estimate for the budget: ~4 characters per token plus the completion allowance.
+    """
+    chars = sum(len(str(message.get("content", ""))) for message in messages)
+    return chars // 4 + len(messages) * 4 + (max_tokens or 0)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, _openai().RateLimitError)
+
+
+def _is_retryable(error: Exception) -> bool:
+    openai = _openai()
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 408 or error.status_code >= 500)
+
+
+class LLMScheduler:
+    """
+    Admission control, retries and priorities for chat-completion calls on one event loop.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, max_retries: int = 5,
+                 base_delay: float = 0.5, max_delay: float = 30.0, client_factory=get_async_client):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._client_factory = client_factory
+
+        self._waiting = []               # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = asyncio.Condition()
+        self._paused_until = 0.0         # set by Retry-After on 429
+        self._stats = {lane: {"requests": 0, "waited": 0, "wait_time_total": 0.0, "wait_time_max": 0.0,
+                              "queued": 0} for lane in LANES}
+        self._counters = {"retries": 0, "rate_limited": 0, "failures": 0,
+                          "tokens_estimated": 0, "tokens_used": 0}
+
+    async def _acquire(self, lane: str, tokens: int) -> float:
+        """
+        Waits for this call's turn and budget; returns the time waited in seconds.
+        """
+        entry = (LANES.get(lane, LANES["batch"]), next(self._seq))
+        start = time.monotonic()
+        async with self._cond:
+            heapq.heappush(self._waiting, entry)
+            self._stats[lane]["queued"] += 1
+            try:
+                while True:
+                    delay = 0.0
+                    if self._waiting[0] == entry:
+                        delay = max(self._paused_until - time.monotonic(),
+                                    self.requests.delay_for(1), self.tokens.delay_for(tokens))
+                        if delay <= 0:
+                            self.requests.consume(1)
+                            self.tokens.consume(tokens)
+                            break
+                    try:
+                        # Head of the queue sleeps until its budget refills; others until woken
+                        await asyncio.wait_for(self._cond.wait(), timeout=delay or None)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._stats[lane]["queued"] -= 1
+                self._cond.notify_all()
+
+        waited = time.monotonic() - start
+        stats = self._stats[lane]
+        stats["requests"] += 1
+        stats["wait_time_total"] += waited
+        stats["wait_time_max"] = max(stats["wait_time_max"], waited)
+        if waited > 0.001:
+            stats["waited"] += 1
+        return waited
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        # Exponential backoff with "equal jitter": half fixed, half random
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def chat_completion(self, lane: str = None, **kwargs):
+        """
+        Scheduled equivalent of client.chat.completions.create(**kwargs).
+        With stream=True the stream is returned once the request was accepted.
+
+        Args:
+            lane (str): "interactive" or "batch"; defaults to the LLM_LANE context variable.
+        """
+        lane = lane or LLM_LANE.get()
+        if lane not in LANES:
+            lane = "batch"
+        estimate = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        self._counters["tokens_estimated"] += estimate
+
+        attempt = 0
+        waited = 0.0
+        while True:
+            waited += await self._acquire(lane, estimate)
+            try:
+                response = await self._client_factory().chat.completions.create(**kwargs)
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    self._counters["failures"] += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                if _is_rate_limit(e):
+                    self._counters["rate_limited"] += 1
+                    # The limit is account-wide: hold back every queued call, not only this one
+                    async with self._cond:
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                        self._cond.notify_all()
+                self._counters["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            record_llm_request(kwargs.get("model"), waited, attempt)
+            usage = getattr(response, "usage", None)
+            # Streams report usage in their last chunk, which the caller records
+            record_llm_usage(kwargs.get("model"), usage)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                # Settle the estimate against what the API actually counted
+                self._counters["tokens_used"] += usage.total_tokens
+                correction = estimate - usage.total_tokens
+                if correction > 0:
+                    self.tokens.refund(correction)
+                else:
+                    self.tokens.consume(-correction)
+            return response
+
+    def stats(self) -> dict:
+        lanes = {}
+        for lane, stats in self._stats.items():
+            lanes[lane] = dict(stats)
+            lanes[lane]["wait_time_avg"] = stats["wait_time_total"] / stats["requests"] if stats["requests"] else 0.0
+        snapshot = dict(self._counters)
+        snapshot["lanes"] = lanes
+        snapshot["queue_depth"] = len(self._waiting)
+        snapshot["paused_for"] = max(0.0, self._paused_until - time.monotonic())
+        return snapshot
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """
+    Returns the scheduler bound to the current event loop, configured from Config.
+    """
+    return loop_local("llm_scheduler", lambda: LLMScheduler(
+        requests_per_minute=Config.LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=Config.LLM_TOKENS_PER_MINUTE,
+        max_retries=Config.LLM_MAX_RETRIES,
+        base_delay=Config.LLM_RETRY_BASE_DELAY,
+        max_delay=Config.LLM_RETRY_MAX_DELAY,
+    ))
+
+
+async def chat_completion(lane: str = None, **kwargs):
+    """
+    Sends one chat-completion request through the scheduler of the current event loop.
+    """
+    return await get_llm_scheduler().chat_completion(lane, **kwargs)
+
+
+def chat_completion_sync(lane: str = None, **kwargs):
+    """
+    Blocking chat_completion() for synchronous callers; runs on the shared background loop.
+    """
+    return run_coroutine(chat_completion(lane or LLM_LANE.get(), **kwargs))
+
+
+def get_llm_scheduler_stats() -> dict:
+    """
+    Returns queue-depth, wait-time and retry metrics of the scheduler on the shared background loop.
+    """
+    async def snapshot():
+        return get_llm_scheduler().stats()
+    return run_coroutine(snapshot())
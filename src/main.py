@@ -1,74 +1,324 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from openai_sql import generate_statements_from_question, execute_multiple_queries
-from result_summarizer import summarize_sql_result
+import asyncio
+import time
+from openai_sql import generate_statements_from_question_async, execute_multiple_queries_async, build_system_prompt
+from result_summarizer import summarize_sql_result_async, summarize_sql_result_stream_async
+from async_runner import run_coroutine, iterate_async_generator
+from result_set import ResultSet
+from sql_cache import normalize_question
+from llm_scheduler import LLM_LANE
+from fast_path import match_question, render_answer
+from tracing import Trace, span, current_trace, trace_async_generator
+from config_reader import Config
 from datetime import datetime
 
 def process_question(user_question, language: str = "en"):
+    """
+    Process a question and return the summary and metadata.
+
+    Synchronous wrapper around process_question_async(); the pipeline runs on the
+    shared background event loop so blocking callers do not each hold I/O-bound work.
+    """
+    return run_coroutine(process_question_async(user_question, language))
+
+# add more object into response which will be returned
+class Response(str):
+    pass
+
+def _raw_results_section(all_results: list) -> str:
+    """
+    Builds the raw results text appended when the summary has omissions.
+    """
+    raw_results_section = "\n\n----Summary has omissions, show raw results----"
+    for i, result in enumerate(all_results):
+        raw_results_section += f"\n[Query {i+1}]:\n"
+        if isinstance(result, (list, ResultSet)):
+            for row in result:
+                raw_results_section += f"{row}\n"
+        else:
+            if isinstance(result['result'], (list, ResultSet)):
+                for item in result['result']:
+                    raw_results_section += f"{item}\n"
+            else:
+                raw_results_section += f"{result['result']}\n"
+    return raw_results_section
+
+def _finish_response(summary, metadata: dict, sqls: str, all_results: list) -> Response:
+    """
+    Appends raw results if needed and wraps the summary with the process metadata.
+    """
+    summary_metadata = getattr(summary, 'metadata', {})
+    if summary_metadata.get("has_omissions"):
+        # append query results to summary
+        summary = summary + _raw_results_section(all_results)
+
+    # update metadata 
+    metadata.update({
+        "end_time": datetime.now().isoformat(),
+        "status": "success"
+    })
+    metadata["summary_process"] = summary_metadata
+
+    response = Response(summary)
+    response.metadata = metadata
+    response.generated_sql = sqls
+    response.query_results = all_results
+    return response
+
+def _record_error(metadata: dict, e: Exception):
+    metadata["end_time"] = datetime.now().isoformat()
+    metadata["status"] = "error"
+    metadata["error"] = {
+        "type": type(e).__name__,
+        "message": str(e)
+    }
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+async def _match_fast_path(user_question, metadata: dict):
+    """
+    Returns the fast-path match for the question (None when disabled or not matched).
+    """
+    if not Config.FAST_PATH_ENABLED:
+        return None
+    with span("fast_path_match") as stage:
+        match = await asyncio.to_thread(match_question, user_question)
+    metadata.setdefault("timings", {})["fast_path_match_ms"] = stage.duration_ms
+    if match is not None:
+        metadata["fast_path"] = {"intent": match.intent.name, "params": match.params}
+        metadata["generated_sql"] = match.sql
+        trace = current_trace()
+        if trace is not None:
+            trace.attributes.update(path="fast_path", intent=match.intent.name)
+    return match
+
+def _start_trace(kind: str, user_question, language: str, metadata: dict) -> Trace:
+    trace = Trace(kind, user_question, language)
+    trace.attributes["lane"] = LLM_LANE.get()
+    # Totals keep filling in while the question runs
+    metadata["trace_id"] = trace.trace_id
+    metadata["trace_totals"] = trace.totals
+    return trace
+
+async def process_question_async(user_question, language: str = "en", system_prompt: str = None):
     """
     Process a question and return the summary and metadata
+
+    Args:
+        system_prompt (str): Prebuilt SQL-generation prompt to reuse (see process_questions_batch_async).
     """
     # metadata in process
     metadata = {
         "start_time": datetime.now().isoformat(),
-        "language": language
+        "language": language,
+        "timings": {}
     }
+    timings = metadata["timings"]
     
+    with _start_trace("question", user_question, language, metadata):
+        try:
+            # Common question shapes are answered from prewritten SQL without calling the LLM
+            match = await _match_fast_path(user_question, metadata)
+            if match is not None:
+                with span("execution") as stage:
+                    all_results = await execute_multiple_queries_async(match.sql)
+                timings["execution_ms"] = stage.duration_ms
+                metadata["query_results"] = all_results
+                return _finish_response(render_answer(match, all_results[0], language), metadata, match.sql, all_results)
+
+            # generate SQL
+            with span("sql_generation") as stage:
+                sqls = await generate_statements_from_question_async(user_question, language, system_prompt)
+            timings["sql_generation_ms"] = stage.duration_ms
+            metadata["generated_sql"] = sqls
+            
+            # execute sql
+            with span("execution") as stage:
+                all_results = await execute_multiple_queries_async(sqls)
+            timings["execution_ms"] = stage.duration_ms
+            metadata["query_results"] = all_results
+            
+            # generate summary
+            with span("summary") as stage:
+                summary = await summarize_sql_result_async(user_question, sqls, all_results, language)
+            timings["summary_ms"] = stage.duration_ms
+            
+            return _finish_response(summary, metadata, sqls, all_results)
+            
+        except Exception as e:
+            _record_error(metadata, e)
+            raise
+
+def process_question_stream_async(user_question, language: str = "en"):
+    """
+    Streaming variant of process_question_async(). Returns an async generator yielding
+    pipeline events as they happen:
+
+      {"event": "sql_generated", "sql": str}
+      {"event": "rows_fetched", "results": [{"query", "row_count", "elapsed_ms", "error"}, ...]}
+      {"event": "summary_token", "text": str}            (repeated)
+      {"event": "done", "response": Response}            (same object process_question returns)
+      {"event": "error", "error": {"type", "message"}, "metadata": dict}
+    """
+    metadata = {
+        "start_time": datetime.now().isoformat(),
+        "language": language
+    }
+    trace = _start_trace("stream", user_question, language, metadata)
+    return trace_async_generator(trace, _question_stream_events(trace, user_question, language, metadata))
+
+async def _question_stream_events(trace: Trace, user_question, language: str, metadata: dict):
+    # Resumed in a new context after every yield: spans must not enclose a yield
     try:
-        # generate SQL
-        sqls = generate_statements_from_question(user_question)
-        metadata["generated_sql"] = sqls
-        
-        # execute sql
-        all_results = execute_multiple_queries(sqls)
+        match = await _match_fast_path(user_question, metadata)
+        if match is not None:
+            sqls = match.sql
+        else:
+            with span("sql_generation"):
+                sqls = await generate_statements_from_question_async(user_question, language)
+            metadata["generated_sql"] = sqls
+        yield {"event": "sql_generated", "sql": sqls}
+
+        with span("execution"):
+            all_results = await execute_multiple_queries_async(sqls)
         metadata["query_results"] = all_results
-        
-        # generate summary
-        summary = summarize_sql_result(user_question, sqls, all_results, language)
-        
-        if summary.metadata["has_omissions"]:
-            # append query results to summary
-            raw_results_section = "\n\n----Summary has omissions, show raw results----"
-            for i, result in enumerate(all_results):
-                raw_results_section += f"\n[Query {i+1}]:\n"
-                if isinstance(result, list):
-                    for row in result:
-                        raw_results_section += f"{row}\n"
+        yield {
+            "event": "rows_fetched",
+            "results": [
+                {"query": item["query"], "row_count": len(item["result"]), "elapsed_ms": item.get("elapsed_ms"),
+                 "error": item.get("error")}
+                for item in all_results
+            ]
+        }
+
+        if match is not None:
+            answer = render_answer(match, all_results[0], language)
+            yield {"event": "summary_token", "text": answer}
+            yield {"event": "done", "response": _finish_response(answer, metadata, sqls, all_results)}
+            return
+
+        summary = None
+        stage = trace.start_span("summary")
+        try:
+            async for event in summarize_sql_result_stream_async(user_question, sqls, all_results, language):
+                if event["event"] == "summary":
+                    summary = event["summary"]
                 else:
-                    if isinstance(result['result'], list):
-                        for item in result['result']:
-                            raw_results_section += f"{item}\n"
-                    else:
-                        raw_results_section += f"{result['result']}\n"
-            summary = summary + raw_results_section
-        
-        # update metadata 
-        metadata.update({
-            "end_time": datetime.now().isoformat(),
-            "status": "success"
-        })
-        metadata["summary_process"] = getattr(summary, 'metadata', {})
-        
-        # add more object into response which will be returned
-        class Response(str):
-            pass
-            
-        response = Response(summary)
-        response.metadata = metadata
-        response.generated_sql = sqls
-        response.query_results = all_results
-        
-        return response
-        
+                    yield event
+        except Exception as e:
+            stage.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            # Also reached when the client goes away mid-summary and the generator is closed
+            stage.end()
+
+        response = _finish_response(summary, metadata, sqls, all_results)
+        if summary.metadata.get("has_omissions"):
+            yield {"event": "summary_token", "text": response[len(summary):]}
+        yield {"event": "done", "response": response}
+
     except Exception as e:
-        metadata["end_time"] = datetime.now().isoformat()
-        metadata["status"] = "error"
-        metadata["error"] = {
-            "type": type(e).__name__,
-            "message": str(e)
-        }
-        raise
+        _record_error(metadata, e)
+        trace.set_error(e)
+        yield {"event": "error", "error": metadata["error"], "metadata": metadata}
+
+async def process_questions_batch_async(questions: list, language: str = "en", max_concurrency: int = None) -> dict:
+    """
+    Answers many questions at once.
+
+    Identical questions (after normalization, per language) are answered once, the metadata
+    prompt is built once for the whole batch (with entity pruning every question builds its own
+    prompt instead), and the per-question pipelines run concurrently with at most `max_concurrency` in flight (defaults to Config.BATCH_MAX_CONCURRENCY).
+    Their LLM calls go through the "batch" lane of the LLM scheduler.
+
+    Args:
+        questions (list): Question strings, or {"question", "language"} dicts.
+        language (str): Language for items that do not set their own.
+
+    Returns:
+        dict: {"results": [...], "unique_questions", "metadata_prompt_ms", "elapsed_ms"}; one result per
+              input item (no "metadata_prompt_ms" with entity pruning), in order, with "summary", "generated_sql", "timings" and "error"
+              (None on success), plus "duplicate_of" (index of the answered item) for repeats.
+    """
+    batch_start = time.perf_counter()
+    items = []
+    for item in questions:
+        if isinstance(item, dict):
+            items.append((str(item.get("question", "")).strip(), item.get("language") or language))
+        else:
+            items.append((str(item).strip(), language))
+
+    # Index of the first occurrence of each distinct (question, language)
+    first_index = {}
+    for index, (question, lang) in enumerate(items):
+        first_index.setdefault((normalize_question(question), lang), index)
+
+    system_prompt = None
+    prompt_ms = None
+    # Pruned prompts depend on the question, so there is no shared prompt to build
+    if not Config.PROMPT_ENTITY_PRUNING:
+        prompt_start = time.perf_counter()
+        system_prompt = await asyncio.to_thread(build_system_prompt)
+        prompt_ms = _elapsed_ms(prompt_start)
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or Config.BATCH_MAX_CONCURRENCY))
+
+    async def answer(index: int) -> dict:
+        question, lang = items[index]
+        result = {"question": question, "language": lang, "summary": None, "generated_sql": None,
+                  "timings": {}, "error": None}
+        if not question:
+            result["error"] = {"type": "ValueError", "message": "Question is required"}
+            return result
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await process_question_async(question, lang, system_prompt)
+                result["summary"] = str(response)
+                result["generated_sql"] = response.generated_sql
+                result["timings"] = dict(response.metadata.get("timings", {}))
+            except Exception as e:
+                result["error"] = {"type": type(e).__name__, "message": str(e)}
+            result["timings"]["total_ms"] = _elapsed_ms(start)
+        return result
+
+    unique = sorted(set(first_index.values()))
+    # Batch LLM calls yield to interactive questions in the LLM scheduler
+    lane_token = LLM_LANE.set("batch")
+    try:
+        answered = dict(zip(unique, await asyncio.gather(*(answer(index) for index in unique))))
+    finally:
+        LLM_LANE.reset(lane_token)
+
+    results = []
+    for index, (question, lang) in enumerate(items):
+        source = first_index[(normalize_question(question), lang)]
+        if source == index:
+            results.append(answered[index])
+        else:
+            duplicate = dict(answered[source], question=question, duplicate_of=source)
+            results.append(duplicate)
+
+    summary = {"results": results, "unique_questions": len(unique)}
+    if prompt_ms is not None:
+        summary["metadata_prompt_ms"] = prompt_ms
+    summary["elapsed_ms"] = _elapsed_ms(batch_start)
+    return summary
+
+def process_questions_batch(questions: list, language: str = "en", max_concurrency: int = None) -> dict:
+    """
+    Synchronous wrapper around process_questions_batch_async().
+    """
+    return run_coroutine(process_questions_batch_async(questions, language, max_concurrency))
+
+def process_question_stream(user_question, language: str = "en"):
+    """
+    Synchronous generator over process_question_stream_async() events.
+    """
+    return iterate_async_generator(process_question_stream_async(user_question, language))
 
 def main():
     """
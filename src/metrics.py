@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+In-process counters and histograms rendered in the Prometheus text exposition format.
+
+Metrics are per process: under gunicorn every worker keeps and serves its own values,
+so scrape each worker (or sum them) rather than relying on one of them.
+"""
+
+import bisect
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+# Seconds; covers cache hits and metadata queries up to slow LLM completions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._sample_lines(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value per label combination.
+    """
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _sample_lines(self, key, value) -> List[str]:
+        return [f"{self.name}{_label_text(self.labels, key)} {_number(value)}"]
+
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket histogram per label combination, plus _sum and _count.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state["counts"][index] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def _sample_lines(self, key, state) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            le = _label_text(self.labels, key, f'le="{_number(float(bound))}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        inf = _label_text(self.labels, key, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{inf} {state['count']}")
+        lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {_number(state['sum'])}")
+        lines.append(f"{self.name}_count{_label_text(self.labels, key)} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Named collection of metrics; registering an existing name returns the existing metric.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, help_text: str, labels: Iterable[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labels, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text format (version 0.0.4).
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Content type of render() output, for HTTP responses
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -5,13 +5,20 @@
 
 import os
 import re
-from openai import OpenAI
-from prompt_helper import get_metadata, build_domain_alias_prompt
-from db_runner import run_sql_from_config
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from prompt_helper import get_cached_metadata, get_cached_domain_alias_prompt, get_metadata_version, get_pruned_entity_prompt
+from sql_cache import get_sql_cache, prompt_fingerprint
+from db_runner import run_sql_from_config, run_sql_async, SQLExecutionError
+from sql_guard import SQLGuardError, check_read_only, guard_statement, mask_literals
+from llm_scheduler import chat_completion, chat_completion_sync
+from sql_workload import record_statement
+from tracing import span, annotate
 from config_reader import Config
 
-# Initialize the OpenAI client
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
 
 
 # Prepare the database schema prompt you want the AI to know:
@@ -94,40 +101,120 @@ Normally the hostname in the user's question means serverGroup name or service n
 If the result array is not empty, shows it as answer.
 """
 
-def generate_statements_from_question(user_question: str) -> list:
+# Model settings for SQL generation (part of the SQL cache fingerprint)
+SQL_MODEL = "gpt-4o"
+SQL_TEMPERATURE = 0.2
+SQL_MAX_TOKENS = 300
+
+def build_system_prompt(user_question: str = None) -> str:
+    """
+    Builds the SQL-generation system prompt from the schema and the cached inventory metadata.
+
+    Args:
+        user_question (str): When given (and Config.PROMPT_ENTITY_PRUNING is on), only the
+                             entities the question plausibly refers to are listed.
+    """
+    if user_question is not None and Config.PROMPT_ENTITY_PRUNING:
+        entity_prompt = get_pruned_entity_prompt(user_question)
+        return SYSTEM_PROMPT_BASE + "\n\n" + DB_SCHEMA_PROMPT + "\n\n" + entity_prompt
+
+    # Get actual domain/servergroup/service names from the DB:
+    domain_alias_prompt = get_cached_domain_alias_prompt()
+    helper_info = get_cached_metadata()
+    # Combine the schema and the dynamic helper info in the system prompt
+    return SYSTEM_PROMPT_BASE + "\n\n" + DB_SCHEMA_PROMPT + "\n\n" + helper_info + "\n\n" + domain_alias_prompt
+
+def _sql_cache_fingerprint(system_prompt: str) -> str:
+    return prompt_fingerprint(system_prompt, get_metadata_version(),
+                              SQL_MODEL, str(SQL_TEMPERATURE), str(SQL_MAX_TOKENS))
+
+class GeneratedSQL(str):
+    """
+    SQL returned by the generation step. Remembers its SQL cache entry, so that execution
+    only stores it once every statement ran cleanly, or drops a cached answer that fails.
+    """
+    cache_entry = None  # (user_question, language, fingerprint)
+    from_cache = False
+
+def _generated_sql(sql_answer: str, cache_entry: tuple, from_cache: bool) -> GeneratedSQL:
+    generated = GeneratedSQL(sql_answer)
+    generated.cache_entry = cache_entry
+    generated.from_cache = from_cache
+    return generated
+
+# Failures that say nothing about the statement itself
+_TRANSIENT_ERROR_CODES = ("connection", "pool_timeout")
+
+def _settle_sql_cache(sqls: str, results: list):
+    """
+    Stores freshly generated SQL once all of its statements ran without error, and drops a
+    cached answer whose statements were refused or failed.
+    """
+    cache_entry = getattr(sqls, "cache_entry", None)
+    sql_cache = get_sql_cache()
+    if cache_entry is None or sql_cache is None:
+        return
+    errors = [item["error"]["code"] for item in results if item.get("error")]
+    if any(code in _TRANSIENT_ERROR_CODES for code in errors):
+        return
+    if results and not errors:
+        if not sqls.from_cache:
+            sql_cache.put(*cache_entry, str(sqls))
+    elif sqls.from_cache:
+        sql_cache.discard(*cache_entry)
+
+def _sql_cache_lookup(sql_cache, user_question: str, language: str, system_prompt: str) -> tuple:
+    """
+    Returns (fingerprint, cached SQL or None). May query the metadata version and read the cache file.
+    """
+    fingerprint = _sql_cache_fingerprint(system_prompt)
+    return fingerprint, sql_cache.get(user_question, language, fingerprint)
+
+def generate_statements_from_question(user_question: str, language: str = "en") -> list:
     """
-    1) Calls get_metadata to fetch domain/server group/service names from DB.
-    2) Calls build_domain_alias_prompt to fetch domain alias to generate prompt from DB.
+    1) Calls get_cached_metadata to fetch domain/server group/service names (cached per data version).
+    2) Calls get_cached_domain_alias_prompt to fetch the domain alias prompt (cached per data version).
     2) Builds a system prompt that includes both the DB schema and the actual metadata.
-    3) Calls OpenAI to generate SQL from the user question.
+    3) Looks the question up in the SQL cache; on a hit the OpenAI call is skipped.
+    4) Otherwise calls OpenAI to generate SQL from the user question; execute_multiple_queries()
+       caches it once it ran cleanly.
 
     Args:
         user_question (str): Natural language question from the user.
+        language (str): Interface language of the question, part of the cache key.
 
     Returns:
-        str: The SQL query (as a string).
+        GeneratedSQL: The SQL query (a str).
     """
-    # Get actual domain/servergroup/service names from the DB:
-    domain_alias_prompt = build_domain_alias_prompt()
-    helper_info = get_metadata()
-    # Combine the schema and the dynamic helper info in the system prompt
-    system_prompt = SYSTEM_PROMPT_BASE + "\n\n" + DB_SCHEMA_PROMPT + "\n\n" + helper_info + "\n\n" + domain_alias_prompt
+    with span("metadata_prompt"):
+        system_prompt = build_system_prompt(user_question)
+
+    # Same question + same prompt/metadata version => same SQL, no need to ask the model again
+    sql_cache = get_sql_cache()
+    if sql_cache is not None:
+        fingerprint, cached_sql = _sql_cache_lookup(sql_cache, user_question, language, system_prompt)
+        annotate(sql_cache="miss" if cached_sql is None else "hit")
+        if cached_sql is not None:
+            return _generated_sql(cached_sql, (user_question, language, fingerprint), True)
 
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_question}
     ]
 
-    # Make the request to OpenAI
-    response = client.chat.completions.create(model="gpt-4o",
-    messages=messages,
-    temperature=0.2,
-    max_tokens=300)
+    # Make the request to OpenAI (rate-limited and retried by the LLM scheduler)
+    with span("llm_sql"):
+        response = chat_completion_sync(model=SQL_MODEL,
+        messages=messages,
+        temperature=SQL_TEMPERATURE,
+        max_tokens=SQL_MAX_TOKENS)
 
     # Extract and print the assistant's answer (SQL statement)
     sql_answer = response.choices[0].message.content
     sql_answer = parse_sql_code_block(sql_answer)
 
+    if sql_cache is not None:
+        return _generated_sql(sql_answer, (user_question, language, fingerprint), False)
     return sql_answer
 
 def parse_sql_code_block(text: str) -> str:
@@ -152,36 +239,208 @@ def parse_multiple_queries(sql_answer: str) -> list:
     
     Returns a list of SQL statements (strings).
     """
-    # 1) Split on semicolons. This is simplistic—works for basic SQL.
-    # 2) Trim whitespace. 
+    # 1) Split on semicolons outside quotes and comments (mask_literals keeps offsets).
+    # 2) Trim whitespace and drop fragments holding nothing but comments.
     statements = []
-    for part in sql_answer.split(";"):
-        stmt = part.strip()
+    masked = mask_literals(sql_answer)
+    start = 0
+    for end in [i for i, ch in enumerate(masked) if ch == ";"] + [len(sql_answer)]:
+        stmt = sql_answer[start:end].strip()
         # If it still contains newlines, we can remove them or keep them, doesn't matter for simple queries
         # but let's keep them just in case.
-        if stmt:
+        if masked[start:end].strip():
             statements.append(stmt)
+        start = end + 1
     return statements
 
-def execute_multiple_queries(sqls: str) -> list:
+def is_read_only_statement(stmt: str) -> bool:
     """
-    Parses the SQL answer into individual statements,
-    executes each, and collects results.
-    
-    Returns a list of dictionaries, each containing the query and the result.
+    Returns True if the statement passes the SQL guard's read-only check.
     """
-    statements = parse_multiple_queries(sqls)
-    results_list = []
-    
+    try:
+        check_read_only(stmt)
+    except SQLGuardError:
+        return False
+    return True
+
+def _effective_workers(statements: list, max_workers) -> int:
+    """
+    Statements are only run concurrently when every one of them is read-only,
+    so write statements keep their original sequential semantics.
+    """
+    if max_workers is None:
+        max_workers = Config.SQL_EXEC_MAX_WORKERS
+    if len(statements) < 2 or not all(is_read_only_statement(stmt) for stmt in statements):
+        return 1
+    return max(1, min(max_workers, len(statements)))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide worker pool used for concurrent statement execution.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, Config.SQL_EXEC_POOL_SIZE),
+                                               thread_name_prefix="sql-exec")
+    return _executor
+
+def _max_rows(guarded: dict):
+    """
+    Row cap for a guarded statement. The guard's LIMIT asks for one row more than its limit,
+    so capping at the limit marks the ResultSet truncated only when rows were really cut off.
+    """
+    limit = guarded["limit"]
+    if not limit:
+        return None
+    return min(limit, Config.SQL_RESULT_MAX_ROWS) if Config.SQL_RESULT_MAX_ROWS else limit
+
+def _result_entry(guarded: dict, query_result: list, start: float) -> dict:
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+    annotate(rows=len(query_result))
+    record_statement(guarded["sql"], elapsed_ms, len(query_result))
+    guard_info = {key: guarded[key] for key in ("estimated_rows", "limit_injected", "downgraded")}
+    return {"query": guarded["sql"], "result": query_result, "elapsed_ms": elapsed_ms, "guard": guard_info}
+
+def _error_entry(stmt: str, error: SQLExecutionError, start: float) -> dict:
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+    annotate(error_code=error.code)
+    print(f"[SQL {error.code}] {error.message}")
+    return {"query": stmt, "result": [], "elapsed_ms": elapsed_ms, "error": error.to_dict()}
+
+def _timed_run(stmt: str) -> dict:
+    start = time.perf_counter()
+    with span("sql_statement"):
+        try:
+            guarded = guard_statement(stmt)
+            query_result = run_sql_from_config(guarded["sql"], _max_rows(guarded))
+        except SQLExecutionError as e:
+            return _error_entry(stmt, e, start)
+        return _result_entry(guarded, query_result, start)
+
+def _print_statements(statements: list):
     #Print the generated SQL
     print("\nGenerated SQL Query:\n")
     for stmt in statements:
         print(stmt)
 
-    #Execute statements and collect the results
-    for stmt in statements:
-        # run_sql_from_config returns a list of dicts
-        query_result = run_sql_from_config(stmt)
-        results_list.append({"query": stmt, "result": query_result})
+def execute_multiple_queries(sqls: str, max_workers: int = None) -> list:
+    """
+    Parses the SQL answer into individual statements,
+    executes each, and collects results.
+
+    Independent read-only statements run concurrently on a bounded worker pool;
+    the returned list always follows the statement order.
+
+    Args:
+        sqls (str): The generated SQL, possibly holding several statements.
+        max_workers (int): Maximum statements of this call run at once
+                           (defaults to Config.SQL_EXEC_MAX_WORKERS, 1 = sequential).
     
+    Every statement passes the guard stage (sql_guard.guard_statement) first: only
+    read-only SELECTs run, with an injected LIMIT and EXPLAIN-based cost checks.
+
+    Returns a list of dictionaries, each containing the executed query, the result and its
+    elapsed_ms, plus "guard" details, or an "error" dict ({"code", "message", "errno"})
+    with an empty result when the statement was refused or failed.
+
+    Generated SQL (see GeneratedSQL) is stored in the SQL cache only when it ran cleanly.
+    """
+    statements = parse_multiple_queries(sqls)
+    _print_statements(statements)
+
+    workers = _effective_workers(statements, max_workers)
+    if workers == 1:
+        results_list = [_timed_run(stmt) for stmt in statements]
+        _settle_sql_cache(sqls, results_list)
+        return results_list
+
+    #Execute statements concurrently, at most `workers` of them in flight
+    executor = _get_executor()
+    results_list = [None] * len(statements)
+    pending = {}
+    next_index = 0
+    while next_index < len(statements) or pending:
+        while next_index < len(statements) and len(pending) < workers:
+            # Worker threads do not inherit context variables; copy them so spans join this trace
+            context = contextvars.copy_context()
+            pending[executor.submit(context.run, _timed_run, statements[next_index])] = next_index
+            next_index += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results_list[pending.pop(future)] = future.result()
+
+    _settle_sql_cache(sqls, results_list)
+    return results_list
+
+async def generate_statements_from_question_async(user_question: str, language: str = "en",
+                                                  system_prompt: str = None) -> str:
+    """
+    Async variant of generate_statements_from_question() using the AsyncOpenAI client.
+
+    Args:
+        system_prompt (str): Prebuilt system prompt, e.g. shared by all questions of a batch;
+                             built from the cached metadata when omitted.
+    """
+    if system_prompt is None:
+        # Metadata is served from the in-process cache; a refresh may hit the DB, so keep it off the loop
+        with span("metadata_prompt"):
+            system_prompt = await asyncio.to_thread(build_system_prompt, user_question)
+
+    sql_cache = get_sql_cache()
+    if sql_cache is not None:
+        # The metadata version check and the cache file may block, so keep them off the loop
+        fingerprint, cached_sql = await asyncio.to_thread(_sql_cache_lookup, sql_cache, user_question, language,
+                                                          system_prompt)
+        annotate(sql_cache="miss" if cached_sql is None else "hit")
+        if cached_sql is not None:
+            return _generated_sql(cached_sql, (user_question, language, fingerprint), True)
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_question}
+    ]
+
+    with span("llm_sql"):
+        response = await chat_completion(model=SQL_MODEL,
+        messages=messages,
+        temperature=SQL_TEMPERATURE,
+        max_tokens=SQL_MAX_TOKENS)
+
+    sql_answer = parse_sql_code_block(response.choices[0].message.content)
+
+    if sql_cache is not None:
+        return _generated_sql(sql_answer, (user_question, language, fingerprint), False)
+    return sql_answer
+
+async def execute_multiple_queries_async(sqls: str, max_workers: int = None) -> list:
+    """
+    Async variant of execute_multiple_queries(); read-only statements are awaited
+    concurrently, bounded by `max_workers`, and results keep the statement order.
+    """
+    statements = parse_multiple_queries(sqls)
+    _print_statements(statements)
+
+    semaphore = asyncio.Semaphore(_effective_workers(statements, max_workers))
+
+    async def timed_run(stmt: str) -> dict:
+        async with semaphore:
+            start = time.perf_counter()
+            with span("sql_statement"):
+                try:
+                    # EXPLAIN goes through the sync pool, so keep it off the loop
+                    guarded = await asyncio.to_thread(guard_statement, stmt)
+                    query_result = await run_sql_async(guarded["sql"], _max_rows(guarded))
+                except SQLExecutionError as e:
+                    return _error_entry(stmt, e, start)
+                return _result_entry(guarded, query_result, start)
+
+    # gather() returns results in argument order
+    results_list = list(await asyncio.gather(*(timed_run(stmt) for stmt in statements)))
+    # Writing the cache file may wait on another worker
+    await asyncio.to_thread(_settle_sql_cache, sqls, results_list)
     return results_list
\ No newline at end of file
@@ -1,7 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from db_runner import run_sql_from_config
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from db_runner import get_replica, run_sql_from_config, SQLExecutionError
+from sqlite_replica import DATA_VERSION_SQL, ReplicaError, format_data_version
+from entity_index import EntityIndex
+from config_reader import Config
+
+# Tables whose content feeds the metadata and alias prompt blocks
+METADATA_TABLES = ("Domain", "ServerGroup", "Service", "ResourceAlias")
 
 def get_metadata() -> str:
     """
@@ -12,25 +23,36 @@ def get_metadata() -> str:
         str: A text listing available domains, server groups, and services.
     """
     # Fetch domain names
-    domain_rows = run_sql_from_config("SELECT name FROM Domain;")
+    domain_rows = run_sql_from_config("SELECT name FROM Domain;", max_rows=0)
     domain_names = [row["name"] for row in domain_rows]
 
     # Fetch server group names
-    sg_rows = run_sql_from_config("SELECT name FROM ServerGroup;")
+    sg_rows = run_sql_from_config("SELECT name FROM ServerGroup;", max_rows=0)
     server_group_names = [row["name"] for row in sg_rows]
 
     # Fetch service names
-    service_rows = run_sql_from_config("SELECT name FROM Service;")
+    service_rows = run_sql_from_config("SELECT name FROM Service;", max_rows=0)
     service_names = [row["name"] for row in service_rows]
 
-    # Build the helper info string
-    helper_info = (
-        "Available domain names: " + ", ".join(domain_names) + "\n"
-        "Available server group names: " + ", ".join(server_group_names) + "\n"
-        "Available service names: " + ", ".join(service_names)
-    )
+    return format_metadata(domain_names, server_group_names, service_names)
 
-    return helper_info
+def _name_list(names: list, omitted: int = 0) -> str:
+    text = ", ".join(names)
+    if omitted:
+        text += f" (and {omitted} more not related to the question)"
+    return text
+
+def format_metadata(domain_names: list, server_group_names: list, service_names: list,
+                    omitted: dict = None) -> str:
+    """
+    Builds the helper info string; `omitted` holds per-type counts of names left out.
+    """
+    omitted = omitted or {}
+    return (
+        "Available domain names: " + _name_list(domain_names, omitted.get("domain", 0)) + "\n"
+        "Available server group names: " + _name_list(server_group_names, omitted.get("servergroup", 0)) + "\n"
+        "Available service names: " + _name_list(service_names, omitted.get("service", 0))
+    )
 
 def build_domain_alias_prompt() -> str:
     """
@@ -53,7 +75,7 @@ def build_domain_alias_prompt() -> str:
       JOIN Domain d ON ra.resource_id = d.id
      WHERE ra.resource_type = 'domain';
     """
-    rows = run_sql_from_config(sql)
+    rows = run_sql_from_config(sql, max_rows=0)
     # rows is typically a list of dicts, e.g.:
     # [ {"domain_name": "dev1", "alias_name": "DE"},
     #   {"domain_name": "dev1", "alias_name": "Dev QA Europe"},
@@ -71,10 +93,261 @@ def build_domain_alias_prompt() -> str:
     # 3) Build a prompt string enumerating them
     if not domain_alias_map:
         return "No domain aliases found in the database."
+    return format_domain_alias_prompt(domain_alias_map)
 
+def format_domain_alias_prompt(domain_alias_map: dict) -> str:
+    """
+    Builds the alias block from {domain name: [alias, ...]}.
+    """
     lines = ["Additionally, here are known domain aliases:","The following domains and their aliases exist:"]
     for domain_name, aliases in domain_alias_map.items():
         alias_str = ", ".join(aliases)
         lines.append(f"- Domain '{domain_name}' can also be called: {alias_str}")
 
-    return "\n".join(lines)
\ No newline at end of file
+    return "\n".join(lines)
+
+def build_entity_index() -> EntityIndex:
+    """
+    Loads domain, server group and service names plus all ResourceAlias rows into an EntityIndex.
+    Alias rows are resolved by resource_type; types without a table here are ignored.
+    """
+    tables = {"domain": "Domain", "servergroup": "ServerGroup", "service": "Service"}
+    entities = {}
+    names_by_id = {}
+    for entity_type, table in tables.items():
+        rows = run_sql_from_config(f"SELECT id, name FROM {table};", max_rows=0)
+        entities[entity_type] = [row["name"] for row in rows]
+        names_by_id[entity_type] = {row["id"]: row["name"] for row in rows}
+
+    aliases = {}
+    rows = run_sql_from_config("SELECT resource_type, resource_id, alias FROM ResourceAlias;", max_rows=0)
+    for row in rows:
+        entity_type = str(row["resource_type"]).lower()
+        name = names_by_id.get(entity_type, {}).get(row["resource_id"])
+        if name is not None:
+            aliases.setdefault((entity_type, name), []).append(row["alias"])
+
+    index = EntityIndex(entities, aliases)
+    # Size of the unpruned blocks, the baseline for the savings metrics
+    domain_aliases = {name: aliases[("domain", name)] for name in entities["domain"]
+                      if ("domain", name) in aliases}
+    full_prompt = format_metadata(entities["domain"], entities["servergroup"], entities["service"])
+    full_prompt += "\n\n" + (format_domain_alias_prompt(domain_aliases) if domain_aliases
+                              else "No domain aliases found in the database.")
+    index.full_prompt_tokens = estimate_prompt_tokens(full_prompt)
+    return index
+
+def estimate_prompt_tokens(text: str) -> int:
+    # Same ~4 characters per token heuristic as the LLM scheduler's budget
+    return len(text) // 4
+
+class PromptPruningStats:
+    """
+    Running totals of the prompt tokens saved by entity pruning.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.full_tokens = 0
+        self.pruned_tokens = 0
+        self.matched_entities = 0
+        self.fallback_only = 0
+
+    def record(self, full_tokens: int, pruned_tokens: int, matched_entities: int):
+        with self._lock:
+            self.prompts += 1
+            self.full_tokens += full_tokens
+            self.pruned_tokens += pruned_tokens
+            self.matched_entities += matched_entities
+            if not matched_entities:
+                self.fallback_only += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            saved = self.full_tokens - self.pruned_tokens
+            return {
+                "prompts": self.prompts,
+                "full_tokens": self.full_tokens,
+                "pruned_tokens": self.pruned_tokens,
+                "saved_tokens": saved,
+                "saved_ratio": saved / self.full_tokens if self.full_tokens else 0.0,
+                "avg_matched_entities": self.matched_entities / self.prompts if self.prompts else 0.0,
+                "fallback_only": self.fallback_only,
+            }
+
+_pruning_stats = PromptPruningStats()
+
+def build_pruned_entity_prompt(index: EntityIndex, question: str) -> str:
+    """
+    Builds the helper info and domain alias blocks restricted to the entities the question
+    plausibly refers to.
+
+    Per type, up to Config.PROMPT_ENTITY_MAX_MATCHES matching names are listed, followed by
+    the first Config.PROMPT_ENTITY_FALLBACK other names so the model still sees the naming
+    style; types with no more names than that are listed in full. Aliases are listed for the
+    domains included.
+    """
+    matches = index.match(question, limit=Config.PROMPT_ENTITY_MAX_MATCHES)
+    selected = {}
+    omitted = {}
+    for entity_type, names in index.names.items():
+        matched = matches.get(entity_type, [])
+        matched_set = set(matched)
+        fallback = [name for name in names if name not in matched_set][:Config.PROMPT_ENTITY_FALLBACK]
+        selected[entity_type] = matched + fallback
+        omitted[entity_type] = len(names) - len(selected[entity_type])
+
+    helper_info = format_metadata(selected.get("domain", []), selected.get("servergroup", []),
+                                  selected.get("service", []), omitted)
+    domain_aliases = {name: index.aliases[("domain", name)] for name in selected.get("domain", [])
+                      if ("domain", name) in index.aliases}
+    prompt = helper_info
+    if domain_aliases:
+        prompt += "\n\n" + format_domain_alias_prompt(domain_aliases)
+
+    if question.strip():
+        _pruning_stats.record(index.full_prompt_tokens, estimate_prompt_tokens(prompt),
+                              sum(len(names) for names in matches.values()))
+    return prompt
+
+def get_data_version() -> Optional[str]:
+    """
+    Computes a cheap fingerprint of the inventory tables: the DataVersion counters bumped by
+    the importers, or a CHECKSUM TABLE round trip when no importer has recorded any.
+    With the SQLite replica enabled, the version of its snapshot is used instead, since the
+    prompt content is read from it.
+
+    Returns:
+        str: A short hex digest that changes whenever any metadata table changes,
+             or None if the version could not be read.
+    """
+    if Config.SQLITE_REPLICA_ENABLED:
+        try:
+            version = get_replica().current_version()
+        except ReplicaError:
+            version = None
+        if version is not None:
+            return hashlib.sha256(version.encode("utf-8")).hexdigest()[:16]
+    try:
+        version = format_data_version(run_sql_from_config(DATA_VERSION_SQL))
+    except SQLExecutionError:
+        version = None
+    if version is not None:
+        return hashlib.sha256(version.encode("utf-8")).hexdigest()[:16]
+    try:
+        rows = run_sql_from_config("CHECKSUM TABLE " + ", ".join(METADATA_TABLES) + ";")
+    except SQLExecutionError:
+        return None
+    if not rows:
+        return None
+    parts = [f"{row.get('Table')}={row.get('Checksum')}" for row in rows]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+class MetadataCache:
+    """
+    In-process cache for prompt fragments derived from the inventory tables.
+
+    Values are served from memory until `ttl` seconds have passed since the last
+    data-version check. The check itself costs one query; the cached values are
+    only rebuilt when the version actually changed or `invalidate()` was called.
+    """
+
+    def __init__(self, ttl: float, version_fn: Callable[[], Optional[str]] = get_data_version):
+        self.ttl = ttl
+        self._version_fn = version_fn
+        self._lock = threading.Lock()
+        self._values = {}
+        self._version = None
+        self._checked_at = None
+
+    def _revalidate(self):
+        with self._lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.ttl:
+                return
+        version = self._version_fn()
+        with self._lock:
+            # An unknown version (DB error) never matches, so values get rebuilt
+            if version is None or version != self._version:
+                self._values.clear()
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def get(self, key: str, builder: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value for `key`, building it with `builder` on a miss.
+        """
+        self._revalidate()
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            version = self._version
+        value = builder()
+        with self._lock:
+            # Do not store a value built against a version that was invalidated meanwhile
+            if self._version == version and self._checked_at is not None:
+                self._values[key] = value
+        return value
+
+    def version(self) -> Optional[str]:
+        """
+        Returns the data version the cached values were built against.
+        """
+        self._revalidate()
+        with self._lock:
+            return self._version
+
+    def invalidate(self):
+        """
+        Drops all cached values and forces a version check on the next access.
+        """
+        with self._lock:
+            self._values.clear()
+            self._version = None
+            self._checked_at = None
+
+_metadata_cache = MetadataCache(ttl=Config.METADATA_CACHE_TTL)
+
+def get_cached_metadata() -> str:
+    """
+    Cached variant of get_metadata(), refreshed when the inventory data version changes.
+    """
+    return _metadata_cache.get("metadata", get_metadata)
+
+def get_cached_domain_alias_prompt() -> str:
+    """
+    Cached variant of build_domain_alias_prompt(), refreshed when the inventory data version changes.
+    """
+    return _metadata_cache.get("domain_alias", build_domain_alias_prompt)
+
+def get_cached_entity_index() -> EntityIndex:
+    """
+    Cached entity index, rebuilt when the inventory data version changes.
+    """
+    return _metadata_cache.get("entity_index", build_entity_index)
+
+def get_pruned_entity_prompt(question: str) -> str:
+    """
+    Question-specific replacement for the metadata and domain alias prompt blocks
+    (see build_pruned_entity_prompt), served from the cached entity index.
+    """
+    return build_pruned_entity_prompt(get_cached_entity_index(), question)
+
+def get_prompt_pruning_stats() -> dict:
+    """
+    Returns prompt-token savings of entity pruning since process start.
+    """
+    return _pruning_stats.snapshot()
+
+def get_metadata_version() -> Optional[str]:
+    """
+    Returns the inventory data version the cached prompt blocks correspond to.
+    """
+    return _metadata_cache.version()
+
+def invalidate_metadata_cache():
+    """
+    Explicit invalidation hook: call after re-importing the inventory
+    (e.g. after running db/generate_sql.py output against the database).
+    """
+    _metadata_cache.invalidate()
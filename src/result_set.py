@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compact columnar representation of a query result.
+
+A ResultSet keeps the column names once and each row as a plain tuple, instead of one
+dict per row. Code that expects the old list-of-dicts shape keeps working: iterating or
+indexing yields Row objects, read-only mapping views over the tuple that are created on
+demand and never copied.
+"""
+
+from collections.abc import Mapping
+from typing import List, Sequence
+
+# Rows pulled from an unbuffered cursor per round trip
+FETCH_BATCH_SIZE = 500
+
+
+def _cursor_columns(cursor) -> list:
+    return [d[0] for d in cursor.description] if cursor.description else []
+
+
+class Row(Mapping):
+    """Read-only dict view over one tuple row of a ResultSet."""
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: dict, values: tuple):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, column):
+        return self._values[self._index[column]]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ResultSet:
+    """
+    Query result as column names plus tuple rows.
+
+    Attributes:
+        columns (tuple): Column names in select order.
+        rows (list): One tuple per row.
+        truncated (bool): True when the row cap stopped the fetch before the end of the result.
+    """
+    __slots__ = ("columns", "rows", "truncated", "_index")
+
+    def __init__(self, columns: Sequence[str], rows: List[tuple] = None, truncated: bool = False):
+        self.columns = tuple(columns)
+        self.rows = rows if rows is not None else []
+        self.truncated = truncated
+        self._index = {name: i for i, name in enumerate(self.columns)}
+
+    @classmethod
+    def from_cursor(cls, cursor, max_rows: int = 0) -> "ResultSet":
+        """
+        Drains a cursor returning tuple rows in batches, keeping at most `max_rows` (0 = no cap).
+        """
+        result = cls(_cursor_columns(cursor))
+        while cursor.description and result._extend(cursor.fetchmany(FETCH_BATCH_SIZE), max_rows):
+            pass
+        return result
+
+    @classmethod
+    async def from_async_cursor(cls, cursor, max_rows: int = 0) -> "ResultSet":
+        """
+        Async variant of from_cursor() for aiomysql cursors.
+        """
+        result = cls(_cursor_columns(cursor))
+        while cursor.description and result._extend(await cursor.fetchmany(FETCH_BATCH_SIZE), max_rows):
+            pass
+        return result
+
+    def _extend(self, batch, max_rows: int) -> bool:
+        """
+        Appends one fetched batch; returns False once the cursor is exhausted or the cap is hit.
+        """
+        if not batch:
+            return False
+        if max_rows and len(self.rows) + len(batch) > max_rows:
+            self.rows.extend(tuple(row) for row in batch[:max_rows - len(self.rows)])
+            self.truncated = True
+            return False
+        self.rows.extend(tuple(row) for row in batch)
+        return True
+
+    def column(self, name: str) -> list:
+        """Returns all values of one column."""
+        i = self._index[name]
+        return [row[i] for row in self.rows]
+
+    def to_json(self) -> dict:
+        return {"columns": list(self.columns), "rows": [list(row) for row in self.rows],
+                "truncated": self.truncated}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        index = self._index
+        return (Row(index, row) for row in self.rows)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return ResultSet(self.columns, self.rows[item])
+        return Row(self._index, self.rows[item])
+
+    def __repr__(self):
+        return f"ResultSet(columns={list(self.columns)}, rows={len(self.rows)}, truncated={self.truncated})"
+
+
+def json_default(obj):
+    """
+    `default=` hook for json.dump(s): ResultSets are written in columnar form,
+    other non-JSON values (Decimal, datetime, ...) as text.
+    """
+    if isinstance(obj, ResultSet):
+        return obj.to_json()
+    if isinstance(obj, Row):
+        return dict(obj)
+    return str(obj)
@@ -2,55 +2,186 @@
 # -*- coding: utf-8 -*-
 
 import os
-from openai import OpenAI
+import re
+from collections import Counter
+from types import SimpleNamespace
 import hashlib
 import base64
 from typing import Any, Dict, List
 from config_reader import Config
+from llm_scheduler import chat_completion, chat_completion_sync
+from result_set import ResultSet
+from tracing import span, record_llm_usage
 
-# Initialize the OpenAI client
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
 
 class ValueEncryptor:
+    """
+    Replaces result values with VAL_xxxxxx placeholders before they are sent to OpenAI.
+
+    Encryption is memoized per distinct value, so repeated values (domain names etc.)
+    are hashed once. If two distinct values share the 6-hex-char prefix, the later one
+    deterministically gets a longer prefix of its own SHA-256 digest. decrypt_text()
+    restores all placeholders in a single regex pass.
+    """
+    HASH_LENGTH = 6
+    # Longest run of hex chars that may follow VAL_ (collision fallbacks use longer hashes)
+    _PLACEHOLDER_PATTERN = re.compile(r"VAL_[0-9a-f]{6,64}")
+
     def __init__(self):
         self.value_map: Dict[str, Any] = {}
+        self._placeholders: Dict[str, str] = {}  # value text -> placeholder
+        self.collisions = 0
+        self.max_hash_length = self.HASH_LENGTH
     
     def encrypt_value(self, value: Any) -> str:
-        # Convert value to string and create a hash
+        # Convert value to string; identical texts always share one placeholder
         value_str = str(value)
+        placeholder = self._placeholders.get(value_str)
+        if placeholder is not None:
+            return placeholder
+
         # Create a hash of the value
-        hash_obj = hashlib.sha256(value_str.encode('utf-8'))
-        # Take first 6 characters of hex digest
-        hash_str = hash_obj.hexdigest()[:6]
-        # Create a placeholder with a clear format and double quotes
-        placeholder = f'VAL_{hash_str}'
-        # Store the mapping if it's a new value
-        if placeholder not in self.value_map:
-            self.value_map[placeholder] = value
+        digest = hashlib.sha256(value_str.encode('utf-8')).hexdigest()
+        length = self.HASH_LENGTH
+        placeholder = f'VAL_{digest[:length]}'
+        # Another value already owns this prefix: take more digest characters
+        while placeholder in self.value_map:
+            self.collisions += 1
+            length += 2
+            placeholder = f'VAL_{digest[:length]}'
+        self.max_hash_length = max(self.max_hash_length, length)
+
+        self.value_map[placeholder] = value
+        self._placeholders[value_str] = placeholder
         return placeholder
+
+    def _restore(self, match) -> str:
+        token = match.group(0)
+        # Longest known placeholder that prefixes the match wins; the rest is plain text
+        for end in range(len(token), len("VAL_") + self.HASH_LENGTH - 1, -1):
+            value = self.value_map.get(token[:end], self)
+            if value is not self:
+                return str(value) + token[end:]
+        return token
     
     def decrypt_text(self, text: str) -> str:
-        # No need to sort as placeholders have fixed format and won't conflict
-        result = text
-        for placeholder, value in self.value_map.items():
-            result = result.replace(placeholder, str(value))
-        return result
+        if not self.value_map:
+            return text
+        return self._PLACEHOLDER_PATTERN.sub(self._restore, text)
+
+class StreamingDecryptor:
+    """
+    Incremental decrypt step for streamed summaries.
+
+    A placeholder like VAL_1a2b3c may be split across chunks ("...VAL_1a" + "2b3c ...").
+    feed() therefore holds back any tail that could still grow into a placeholder and
+    only releases text that can be decrypted safely; flush() releases the rest.
+    """
+
+    def __init__(self, encryptor: ValueEncryptor):
+        self.encryptor = encryptor
+        self._pending = ""
+        # A trailing fragment that may still grow into the longest placeholder in use
+        self._partial_tail = re.compile(
+            r"(?:V|VA|VAL|VAL_[0-9a-f]{0,%d})$" % (encryptor.max_hash_length - 1)
+        )
+
+    def feed(self, chunk: str) -> str:
+        text = self._pending + chunk
+        match = self._partial_tail.search(text)
+        cut = match.start() if match else len(text)
+        self._pending = text[cut:]
+        return self.encryptor.decrypt_text(text[:cut])
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ""
+        return self.encryptor.decrypt_text(text)
+
+def _table_lines(columns: tuple, rows: list, encryptor: ValueEncryptor) -> List[str]:
+    # Header once, then one line per tuple row; values are placeholders so "|" cannot clash
+    lines = [" | ".join(columns)]
+    for row in rows:
+        lines.append(" | ".join(encryptor.encrypt_value(value) for value in row))
+    return lines
+
+def _value_counts(values: list) -> list:
+    """
+    Returns [(value, count), ...] sorted by count desc, then by value text, so output is deterministic.
+    """
+    counts = Counter(values)
+    return sorted(counts.items(), key=lambda kv: (-kv[1], str(kv[0])))
+
+def encode_result_table(result: ResultSet, encryptor: ValueEncryptor) -> str:
+    """
+    Encodes a query result compactly for the summarization prompt.
+
+    Small results are sent as a table (header once, then rows). Results with more than
+    Config.SUMMARY_FULL_ROWS_LIMIT rows are pre-aggregated locally: exact row count,
+    distinct values per column with the most common ones, per-group counts for
+    low-cardinality columns and a few sample rows. Prompt size then grows with the number
+    of distinct values rather than with the number of rows.
+    """
+    rows = result.rows
+    if not rows:
+        return "(0 rows)"
+    columns = result.columns
+    capped = f", capped at {len(rows)} rows: more rows exist" if result.truncated else ""
+
+    if len(rows) <= Config.SUMMARY_FULL_ROWS_LIMIT:
+        return "\n".join([f"({len(rows)} rows{capped})"] + _table_lines(columns, rows, encryptor))
+
+    top_n = Config.SUMMARY_TOP_VALUES
+    exact = "counts cover the fetched rows only" if result.truncated else "all counts are exact"
+    lines = [f"({len(rows)} rows{capped}, too many to list: pre-aggregated locally, {exact})"]
+    group_columns = []
+    lines.append("Columns:")
+    for i, col in enumerate(columns):
+        value_counts = _value_counts(result.column(col))
+        distinct = len(value_counts)
+        if distinct == len(rows):
+            lines.append(f"- {col}: {distinct} distinct values (unique per row)")
+            continue
+        shown = ", ".join(f"{encryptor.encrypt_value(value)} x{count}" for value, count in value_counts[:top_n])
+        more = f", ... {distinct - top_n} more values" if distinct > top_n else ""
+        lines.append(f"- {col}: {distinct} distinct values: {shown}{more}")
+        if 1 < distinct <= Config.SUMMARY_GROUP_BY_MAX_DISTINCT:
+            group_columns.append(i)
+
+    # Group-by summaries on the first low-cardinality columns
+    for i in group_columns[:2]:
+        others = [j for j in range(len(columns)) if j != i]
+        groups = {}
+        for row in rows:
+            groups.setdefault(row[i], []).append(row)
+        lines.append(f"Grouped by {columns[i]}:")
+        for value, group_rows in sorted(groups.items(), key=lambda kv: (-len(kv[1]), str(kv[0]))):
+            distinct_info = ", ".join(
+                f"{columns[j]}: {len({r[j] for r in group_rows})} distinct" for j in others
+            )
+            lines.append(f"- {encryptor.encrypt_value(value)}: {len(group_rows)} rows ({distinct_info})")
+
+    sample = rows[:Config.SUMMARY_SAMPLE_ROWS]
+    lines.append(f"First {len(sample)} rows:")
+    lines.extend(_table_lines(columns, sample, encryptor))
+    return "\n".join(lines)
 
 def encrypt_results(results: List[dict], encryptor: ValueEncryptor) -> List[dict]:
+    """
+    Encodes every statement result for the prompt, with values replaced by placeholders.
+
+    Returns a list of {"query", "row_count", "encoded"} dicts.
+    """
     encrypted_results = []
     for item in results:
-        encrypted_item = {
+        if item.get("error"):
+            encoded = f"(not executed: {item['error']['message']})"
+        else:
+            encoded = encode_result_table(item["result"], encryptor)
+        encrypted_results.append({
             "query": item["query"],  # Keep SQL query as plain text
-            "result": []
-        }
-        # Encrypt each row in the result
-        for row in item["result"]:
-            encrypted_row = {}
-            for key, value in row.items():
-                # Keep the keys as plain text, encrypt only the values
-                encrypted_row[key] = encryptor.encrypt_value(value)
-            encrypted_item["result"].append(encrypted_row)
-        encrypted_results.append(encrypted_item)
+            "row_count": len(item["result"]),
+            "encoded": encoded
+        })
     return encrypted_results
 
 def detect_omission(text: str, language: str = "en") -> bool:
@@ -73,9 +204,21 @@ def detect_omission(text: str, language: str = "en") -> bool:
     markers = omission_markers.get(language, omission_markers["en"])
     return any(marker in text.lower() for marker in markers)
 
-def summarize_sql_result(user_question: str, sqls: str, all_results: list, language: str = "en") -> str:
+# Model settings for summarization
+SUMMARY_MODEL = "gpt-4o"
+SUMMARY_TEMPERATURE = 0.7
+SUMMARY_MAX_TOKENS = 400
+
+# Summary string returned to callers, carrying the summarization metadata
+class Response(str):
+    pass
+
+def build_summary_messages(user_question: str, sqls: str, all_results: list, language: str = "en"):
     """
-    Calls OpenAI to produce a user-friendly summary of multiple SQL statements and their results.
+    Encrypts the results and builds the chat messages for the summarization call.
+
+    Returns:
+        tuple: (encryptor, encrypted_results, messages)
     """
     # Create an encryptor instance
     encryptor = ValueEncryptor()
@@ -88,7 +231,7 @@ def summarize_sql_result(user_question: str, sqls: str, all_results: list, langu
     content_str += f"SQL queries generated by the assistant:\n{sqls}\n\n"
     
     for idx, item in enumerate(encrypted_results, start=1):
-        content_str += f"Statement #{idx}:\nSQL Query:\n{item['query']}\nResult:\n{repr(item['result'])}\n\n"
+        content_str += f"Statement #{idx}:\nSQL Query:\n{item['query']}\nResult:\n{item['encoded']}\n\n"
 
     # Prepare the system message based on language
     if language == "zh":
@@ -107,26 +250,19 @@ def summarize_sql_result(user_question: str, sqls: str, all_results: list, langu
             "content": content_str
         }
     ]
-    
-    # Make the request to OpenAI
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=400)
+    return encryptor, encrypted_results, messages
 
-    # Extract the assistant's answer and check for truncation
-    completion = response.choices[0]
+def build_summary_response(completion, encryptor: ValueEncryptor, encrypted_results: list,
+                           messages: list, language: str = "en") -> Response:
+    """
+    Decrypts the model's summary and wraps it in a Response carrying the process metadata.
+    """
     summary_text = completion.message.content.strip()
     was_truncated = completion.finish_reason == "length"
     
     decrypted_summary = encryptor.decrypt_text(summary_text)
     has_omissions = detect_omission(decrypted_summary, language)
     
-    # Create a Response object with metadata
-    class Response(str):
-        pass
-        
     response = Response(decrypted_summary)
     response.metadata = {
         "messages": messages,  # 记录发送给 OpenAI 的消息
@@ -134,11 +270,87 @@ def summarize_sql_result(user_question: str, sqls: str, all_results: list, langu
         "decrypted_summary": decrypted_summary,  # 解密后的摘要
         "encrypted_results": encrypted_results,  # 加密后的结果
         "value_map": encryptor.value_map,  # 添加 encryptor 的映射关系
-        "model": "gpt-3.5-turbo",
-        "temperature": 0.7,
-        "max_tokens": 400,
+        "model": SUMMARY_MODEL,
+        "temperature": SUMMARY_TEMPERATURE,
+        "max_tokens": SUMMARY_MAX_TOKENS,
         "was_truncated": was_truncated,
         "has_omissions": has_omissions  # Add omission detection status
     }
     
     return response
+
+def summarize_sql_result(user_question: str, sqls: str, all_results: list, language: str = "en") -> str:
+    """
+    Calls OpenAI to produce a user-friendly summary of multiple SQL statements and their results.
+    """
+    encryptor, encrypted_results, messages = build_summary_messages(user_question, sqls, all_results, language)
+    
+    # Make the request to OpenAI (rate-limited and retried by the LLM scheduler)
+    with span("llm_summary"):
+        response = chat_completion_sync(
+            model=SUMMARY_MODEL,
+            messages=messages,
+            temperature=SUMMARY_TEMPERATURE,
+            max_tokens=SUMMARY_MAX_TOKENS)
+
+    # Extract the assistant's answer and check for truncation
+    return build_summary_response(response.choices[0], encryptor, encrypted_results, messages, language)
+
+async def summarize_sql_result_async(user_question: str, sqls: str, all_results: list, language: str = "en") -> str:
+    """
+    Async variant of summarize_sql_result() using the AsyncOpenAI client.
+    """
+    encryptor, encrypted_results, messages = build_summary_messages(user_question, sqls, all_results, language)
+
+    with span("llm_summary"):
+        response = await chat_completion(
+            model=SUMMARY_MODEL,
+            messages=messages,
+            temperature=SUMMARY_TEMPERATURE,
+            max_tokens=SUMMARY_MAX_TOKENS)
+
+    return build_summary_response(response.choices[0], encryptor, encrypted_results, messages, language)
+
+async def summarize_sql_result_stream_async(user_question: str, sqls: str, all_results: list, language: str = "en"):
+    """
+    Streaming variant of summarize_sql_result_async().
+
+    Yields {"event": "summary_token", "text": ...} events with already decrypted text
+    as the model produces it, then a final {"event": "summary", "summary": Response}
+    carrying the same metadata as the non-streaming call.
+    """
+    encryptor, encrypted_results, messages = build_summary_messages(user_question, sqls, all_results, language)
+
+    stream = await chat_completion(
+        model=SUMMARY_MODEL,
+        messages=messages,
+        temperature=SUMMARY_TEMPERATURE,
+        max_tokens=SUMMARY_MAX_TOKENS,
+        stream=True,
+        # The last chunk then carries the token usage
+        stream_options={"include_usage": True})
+
+    decryptor = StreamingDecryptor(encryptor)
+    raw_parts = []
+    finish_reason = None
+    async for chunk in stream:
+        record_llm_usage(SUMMARY_MODEL, getattr(chunk, "usage", None))
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+        delta = choice.delta.content or ""
+        if not delta:
+            continue
+        raw_parts.append(delta)
+        text = decryptor.feed(delta)
+        if text:
+            yield {"event": "summary_token", "text": text}
+
+    tail = decryptor.flush()
+    if tail:
+        yield {"event": "summary_token", "text": tail}
+
+    completion = SimpleNamespace(message=SimpleNamespace(content="".join(raw_parts)), finish_reason=finish_reason)
+    yield {"event": "summary", "summary": build_summary_response(completion, encryptor, encrypted_results, messages, language)}
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import atexit
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from config_reader import Config
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question for cache lookups: case-folded, whitespace collapsed,
+    trailing punctuation (English and Chinese) removed.
+    """
+    text = re.sub(r"\s+", " ", question.strip().casefold())
+    return text.rstrip(" ?？.。!！")
+
+
+def prompt_fingerprint(*parts: Optional[str]) -> str:
+    """
+    Builds a short fingerprint of everything that influences SQL generation
+    (system prompt, model settings, metadata version).
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()[:16]
+
+
+class SQLCache:
+    """
+    LRU cache mapping (normalized question, language, prompt fingerprint) to generated SQL.
+
+    Entries live in memory in LRU order and are persisted to a SQLite file, so the
+    cache survives restarts. When `max_entries` is exceeded the least recently used
+    entry is evicted from both memory and disk.
+
+    Hits only update the in-memory order; their access times are written to disk in one
+    batch with the next put, or at most every `touch_flush_seconds`, and by flush().
+
+    The file is shared by all gunicorn workers, so it is opened in WAL mode; if it fails
+    (locked for too long, disk full, corrupt) the cache carries on in memory only. Disk
+    writes may wait on another worker's lock, so async callers use asyncio.to_thread().
+    """
+
+    def __init__(self, path: Optional[str], max_entries: int = 1000, touch_flush_seconds: float = 60.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_flush_seconds = touch_flush_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # cache_key -> last access time not yet written to disk
+        self._touched = {}
+        self._last_flush = time.monotonic()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._db = None
+        if path:
+            self._open(path)
+
+    def _open(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # Readers never wait on a writer; concurrent writers from other workers wait (5 s) for each other
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sql_cache ("
+            " cache_key TEXT PRIMARY KEY,"
+            " sql_text TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT cache_key, sql_text FROM sql_cache ORDER BY last_access DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        # Oldest first so the most recently used entry ends up at the end
+        for cache_key, sql_text in reversed(rows):
+            self._entries[cache_key] = sql_text
+        self._db.execute(
+            "DELETE FROM sql_cache WHERE cache_key NOT IN "
+            "(SELECT cache_key FROM sql_cache ORDER BY last_access DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_key(question: str, language: str, fingerprint: str) -> str:
+        raw = f"{normalize_question(question)}\x00{language}\x00{fingerprint}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, question: str, language: str, fingerprint: str) -> Optional[str]:
+        """
+        Returns the cached SQL for the question, or None on a miss.
+        """
+        cache_key = self.make_key(question, language, fingerprint)
+        with self._lock:
+            sql_text = self._entries.get(cache_key)
+            if sql_text is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(cache_key)
+            self._stats["hits"] += 1
+            if self._db is not None:
+                self._touched[cache_key] = time.time()
+                if time.monotonic() - self._last_flush >= self.touch_flush_seconds:
+                    self._write(self._write_touched)
+            return sql_text
+
+    def _write(self, write):
+        """
+        Runs `write()` and commits; on failure the cache drops to memory only. Caller holds the lock.
+        """
+        try:
+            write()
+            self._db.commit()
+        except sqlite3.Error as e:
+            print("An exception occurred while writing the SQL cache, using memory only:", e)
+            try:
+                self._db.close()
+            except sqlite3.Error:
+                pass
+            self._db = None
+            self._touched.clear()
+
+    def _write_touched(self):
+        # Caller holds the lock and commits
+        if self._touched:
+            self._db.executemany(
+                "UPDATE sql_cache SET last_access = ? WHERE cache_key = ?",
+                [(last_access, cache_key) for cache_key, last_access in self._touched.items()],
+            )
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """
+        Writes pending access times to disk.
+        """
+        with self._lock:
+            if self._db is not None and self._touched:
+                self._write(self._write_touched)
+
+    def put(self, question: str, language: str, fingerprint: str, sql_text: str):
+        """
+        Stores generated SQL, evicting the least recently used entries if needed.
+        """
+        if not sql_text:
+            return
+        cache_key = self.make_key(question, language, fingerprint)
+        now = time.time()
+        with self._lock:
+            self._entries[cache_key] = sql_text
+            self._entries.move_to_end(cache_key)
+            self._stats["stores"] += 1
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._touched.pop(old_key, None)
+                evicted.append((old_key,))
+            self._stats["evictions"] += len(evicted)
+            if self._db is not None:
+                self._touched.pop(cache_key, None)
+
+                def write():
+                    self._write_touched()
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO sql_cache (cache_key, sql_text, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?)",
+                        (cache_key, sql_text, now, now),
+                    )
+                    if evicted:
+                        self._db.executemany("DELETE FROM sql_cache WHERE cache_key = ?", evicted)
+
+                self._write(write)
+
+    def discard(self, question: str, language: str, fingerprint: str):
+        """
+        Removes one entry, e.g. cached SQL that no longer runs.
+        """
+        cache_key = self.make_key(question, language, fingerprint)
+        with self._lock:
+            if self._entries.pop(cache_key, None) is None:
+                return
+            self._touched.pop(cache_key, None)
+            if self._db is not None:
+                self._write(lambda: self._db.execute("DELETE FROM sql_cache WHERE cache_key = ?", (cache_key,)))
+
+    def clear(self):
+        """
+        Removes all entries from memory and disk.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._touched.clear()
+            if self._db is not None:
+                self._write(lambda: self._db.execute("DELETE FROM sql_cache"))
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters and the current size.
+        """
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+            snapshot["max_entries"] = self.max_entries
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+
+_sql_cache = None
+_sql_cache_lock = threading.Lock()
+
+
+def get_sql_cache() -> Optional[SQLCache]:
+    """
+    Returns the process-wide SQL cache, or None when disabled in Config.
+    """
+    global _sql_cache
+    if not Config.SQL_CACHE_ENABLED:
+        return None
+    if _sql_cache is None:
+        with _sql_cache_lock:
+            if _sql_cache is None:
+                try:
+                    _sql_cache = SQLCache(Config.SQL_CACHE_PATH, Config.SQL_CACHE_MAX_ENTRIES)
+                    atexit.register(_sql_cache.flush)
+                except sqlite3.Error as e:
+                    print("An exception occurred while opening the SQL cache, using memory only:", e)
+                    _sql_cache = SQLCache(None, Config.SQL_CACHE_MAX_ENTRIES)
+    return _sql_cache
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Guard stage between SQL generation and execution.
+
+Every statement the model returns is checked before it reaches MariaDB:
+  1. only a single read-only SELECT (or WITH ... SELECT) is accepted;
+  2. a LIMIT is injected when the statement has none at the top level;
+  3. EXPLAIN row estimates are used to refuse runaway plans (e.g. a cartesian join of
+     ServerHost x ServerGroupMapping) or to downgrade them to a smaller LIMIT; statements
+     the SQLite replica will answer skip this step, so they never wait on MariaDB;
+  4. execution itself is bounded by Config.SQL_STATEMENT_TIMEOUT, on MariaDB and on the
+     replica (see db_runner).
+
+Rejections raise SQLGuardError, a SQLExecutionError, so callers handle guard and
+database failures the same way.
+"""
+
+import re
+from typing import Callable, List, Optional
+
+from config_reader import Config
+from db_runner import SQLExecutionError, get_pool, get_replica, to_execution_error
+
+
+class SQLGuardError(SQLExecutionError):
+    """Raised when a generated statement is refused before execution."""
+
+
+# Statement-level keywords and functions that have no place in a read-only query
+_FORBIDDEN = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|DROP|ALTER|CREATE|TRUNCATE|RENAME|GRANT|REVOKE|CALL|HANDLER|INTO"
+    r"|LOCK\s+IN\s+SHARE\s+MODE|SLEEP|BENCHMARK|GET_LOCK|RELEASE_LOCK|LOAD_FILE)\b",
+    re.IGNORECASE)
+# MariaDB runs the body of /*! ... */ and /*M! ... */ comments as part of the statement
+_EXECUTABLE_COMMENT = re.compile(r"/\*M?!", re.IGNORECASE)
+_LIMIT = re.compile(r"\bLIMIT\s+(\d+)(?:\s*,\s*(\d+))?(?:\s+OFFSET\s+\d+)?", re.IGNORECASE)
+
+
+def mask_literals(sql: str) -> str:
+    """
+    Returns the statement with quoted strings, backtick identifiers and comments blanked
+    out (same length), so keyword checks never match inside them. Executable comments
+    (/*! ... */, /*M! ... */) are code to MariaDB and are left as they are.
+    """
+    out = list(sql)
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"', "`"):
+            j = i + 1
+            while j < n and sql[j] != ch:
+                j += 2 if sql[j] == "\\" and ch != "`" else 1
+            end = min(j, n - 1)
+            for k in range(i + 1, end):
+                out[k] = " "
+            i = j + 1
+        elif sql.startswith("--", i) or ch == "#":
+            j = sql.find("\n", i)
+            j = n if j == -1 else j
+            out[i:j] = " " * (j - i)
+            i = j
+        elif sql.startswith("/*", i) and not _EXECUTABLE_COMMENT.match(sql, i):
+            j = sql.find("*/", i + 2)
+            j = n if j == -1 else j + 2
+            out[i:j] = " " * (j - i)
+            i = j
+        else:
+            i += 1
+    return "".join(out)
+
+
+def check_read_only(sql: str):
+    """
+    Raises SQLGuardError unless the statement is a single read-only SELECT.
+    """
+    masked = mask_literals(sql).strip()
+    if _EXECUTABLE_COMMENT.search(masked):
+        raise SQLGuardError("not_read_only", "Executable comments (/*! ... */) are not allowed", sql)
+    if ";" in masked.rstrip(";"):
+        raise SQLGuardError("multiple_statements", "Only one statement may be executed at a time", sql)
+    if not re.match(r"\(*\s*(SELECT|WITH)\b", masked, re.IGNORECASE):
+        raise SQLGuardError("not_read_only", "Only SELECT queries are allowed", sql)
+    forbidden = _FORBIDDEN.search(masked)
+    if forbidden:
+        raise SQLGuardError("not_read_only", f"'{forbidden.group(0).upper()}' is not allowed in a query", sql)
+
+
+def _top_level_limit(sql: str):
+    """
+    Returns the match of the LIMIT clause outside any parentheses, or None.
+    """
+    masked = mask_literals(sql)
+    depth = 0
+    depths = []
+    for ch in masked:
+        if ch == "(":
+            depth += 1
+        depths.append(depth)
+        if ch == ")":
+            depth -= 1
+    for match in _LIMIT.finditer(masked):
+        if depths[match.start()] == 0:
+            return match
+    return None
+
+
+def strip_trailing(sql: str) -> str:
+    """
+    Removes trailing semicolons, whitespace and comments, so text appended to the statement
+    cannot end up inside a `--` or `#` comment.
+    """
+    code = re.sub(r"[\s;]+$", "", mask_literals(sql))
+    return sql[:len(code)]
+
+
+def inject_limit(sql: str, limit: int) -> tuple:
+    """
+    Appends LIMIT `limit` when the statement has no top-level LIMIT.
+
+    Returns:
+        tuple: (sql, True if a LIMIT was added)
+    """
+    sql = strip_trailing(sql)
+    if limit <= 0 or _top_level_limit(sql) is not None:
+        return sql, False
+    return f"{sql} LIMIT {limit}", True
+
+
+def cap_limit(sql: str, cap: int) -> str:
+    """
+    Lowers the top-level LIMIT row count to `cap` (adding one if missing).
+    """
+    match = _top_level_limit(sql)
+    if match is None:
+        return inject_limit(sql, cap)[0]
+    group = 2 if match.group(2) is not None else 1  # LIMIT offset, count
+    if int(match.group(group)) <= cap:
+        return sql
+    return sql[:match.start(group)] + str(cap) + sql[match.end(group):]
+
+
+def estimate_rows(plan: List[dict]) -> int:
+    """
+    Estimates rows examined from EXPLAIN output: row estimates are multiplied within
+    one SELECT (nested-loop joins) and summed across SELECTs (subqueries, UNION parts).
+    """
+    per_select = {}
+    for row in plan:
+        rows = row.get("rows")
+        rows = int(rows) if rows not in (None, "") else 1
+        key = row.get("id")
+        per_select[key] = per_select.get(key, 1) * max(rows, 1)
+    return sum(per_select.values())
+
+
+def explain(sql: str) -> Optional[List[dict]]:
+    """
+    Runs EXPLAIN for the statement on MariaDB. Returns None, without a round trip, when the
+    SQLite replica will serve the statement.
+    """
+    if Config.SQLITE_REPLICA_ENABLED and get_replica().can_serve(sql):
+        return None
+    try:
+        with get_pool().connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN " + sql)
+                return list(cursor.fetchall())
+    except Exception as e:
+        raise to_execution_error(e, sql) from e
+
+
+def _probe_limit(limit: int) -> int:
+    # One extra row shows whether the limit cut the result short (0 still means no limit)
+    return limit + 1 if limit > 0 else limit
+
+
+def guard_statement(sql: str, explain_fn: Callable[[str], List[dict]] = explain) -> dict:
+    """
+    Validates and rewrites one generated statement before execution.
+
+    Args:
+        sql (str): The statement as generated by the model.
+        explain_fn (callable): Returns the EXPLAIN rows for a statement, or None to skip the cost checks.
+
+    Returns:
+        dict: {"sql", "estimated_rows", "limit_injected", "downgraded", "limit"}; "sql" is the
+              statement to run, "estimated_rows" None when no plan was checked, and "limit" the
+              row limit the guard imposed (None if it kept the original).
+              The statement's LIMIT is one higher than "limit", so fetching at most "limit" rows
+              tells whether the result was cut off.
+
+    Raises:
+        SQLGuardError: If the statement is not read-only or is estimated to be too expensive.
+        SQLExecutionError: If EXPLAIN itself fails (e.g. invalid SQL).
+    """
+    check_read_only(sql)
+    guarded, limit_injected = inject_limit(sql, _probe_limit(Config.SQL_GUARD_DEFAULT_LIMIT))
+    limit = Config.SQL_GUARD_DEFAULT_LIMIT if limit_injected else None
+
+    estimated_rows = None
+    downgraded = False
+    plan = explain_fn(guarded) if Config.SQL_GUARD_MAX_ROWS or Config.SQL_GUARD_DOWNGRADE_ROWS else None
+    if plan is not None:
+        estimated_rows = estimate_rows(plan)
+        if Config.SQL_GUARD_MAX_ROWS and estimated_rows > Config.SQL_GUARD_MAX_ROWS:
+            raise SQLGuardError(
+                "too_expensive",
+                f"Query refused: about {estimated_rows} rows would be examined "
+                f"(limit {Config.SQL_GUARD_MAX_ROWS}); add filters or join conditions",
+                sql)
+        if Config.SQL_GUARD_DOWNGRADE_ROWS and estimated_rows > Config.SQL_GUARD_DOWNGRADE_ROWS:
+            capped = cap_limit(guarded, _probe_limit(Config.SQL_GUARD_DOWNGRADE_LIMIT))
+            downgraded = capped != guarded
+            guarded = capped
+            if downgraded:
+                limit = Config.SQL_GUARD_DOWNGRADE_LIMIT
+
+    return {"sql": guarded, "estimated_rows": estimated_rows,
+            "limit_injected": limit_injected, "downgraded": downgraded, "limit": limit}
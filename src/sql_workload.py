@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import atexit
+import glob
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import List
+
+from chat_log_writer import JsonlLogWriter
+from config_reader import Config
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _log_files(path: str) -> List[str]:
+    """
+    The workload log itself plus the per-process and rotated files written next to it
+    (<stem>-<pid>.jsonl, <stem>-<pid>-<timestamp>.jsonl.gz), oldest first.
+    """
+    stem = path[:-len(".jsonl")] if path.endswith(".jsonl") else path
+    files = glob.glob(glob.escape(stem) + "-*.jsonl*")
+    if os.path.exists(path):
+        files.append(path)
+    return sorted(files, key=os.path.getmtime)
+
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                path = Config.SQL_WORKLOAD_LOG
+                stem = os.path.basename(path)
+                stem = stem[:-len(".jsonl")] if stem.endswith(".jsonl") else stem
+                # One file per process, so gunicorn workers never append to or rotate each other's file
+                _writer = JsonlLogWriter(
+                    directory=os.path.dirname(path) or ".",
+                    basename=f"{stem}-{os.getpid()}",
+                    max_bytes=Config.SQL_WORKLOAD_LOG_MAX_BYTES,
+                    rotate_seconds=0,
+                    fsync="never",
+                    keep_rotated=Config.SQL_WORKLOAD_LOG_KEEP,
+                )
+                atexit.register(_writer.close)
+    return _writer
+
+
+def record_statement(stmt: str, elapsed_ms: float, row_count: int):
+    """
+    Records one executed statement in the workload log (Config.SQL_WORKLOAD_LOG) so the
+    index advisor can analyse the real question mix. Disabled when the path is empty.
+
+    The record is only queued here; a background writer appends it and rotates the file,
+    so the async pipeline never waits on file I/O.
+    """
+    if not Config.SQL_WORKLOAD_LOG:
+        return
+    _get_writer().write({"ts": round(time.time(), 3), "query": stmt, "elapsed_ms": elapsed_ms,
+                         "rows": row_count})
+
+
+def normalize_statement(stmt: str) -> str:
+    """
+    Collapses whitespace so the same statement from different questions counts once.
+    """
+    return re.sub(r"\s+", " ", stmt.strip().rstrip(";")).strip()
+
+
+def load_workload(path: str) -> List[dict]:
+    """
+    Reads the workload log (with its per-process and rotated files) and returns distinct
+    statements with their frequency and mean recorded latency, most frequent first.
+    """
+    counts = Counter()
+    latency = {}
+    for name in _log_files(path):
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(name, "rt", encoding="utf-8") as f:
+            _count_statements(f, counts, latency)
+    return [
+        {"query": stmt, "count": count, "mean_ms": sum(latency[stmt]) / len(latency[stmt])}
+        for stmt, count in counts.most_common()
+    ]
+
+
+def _count_statements(lines, counts: Counter, latency: dict):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        stmt = normalize_statement(entry.get("query", ""))
+        if not stmt:
+            continue
+        counts[stmt] += 1
+        latency.setdefault(stmt, []).append(entry.get("elapsed_ms") or 0.0)
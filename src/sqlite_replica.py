@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Embedded read-only SQLite replica of the serverconf inventory.
+
+The inventory tables are small enough to live in memory, so generated SELECTs can be
+answered locally in well under a millisecond instead of going over the network to
+MariaDB. The replica is snapshotted on first use and rebuilt when the inventory data
+version (see read_data_version()) changes. Statements are translated from the MySQL dialect the
+model emits; anything that cannot be translated or executed raises ReplicaError so the
+caller can fall back to MariaDB.
+"""
+
+import decimal
+import ipaddress
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+from typing import Callable, Optional
+
+from result_set import ResultSet
+
+# Every table of the inventory schema (db/init/01-schema.sql)
+INVENTORY_TABLES = ("Domain", "ServerHostGroup", "ServerHost", "Service",
+                    "ServerGroup", "ServerGroupMapping", "ResourceAlias")
+
+# Per-domain change counter maintained by db/import_domains.py and db/sync_domains.py
+DATA_VERSION_SQL = ("SELECT COUNT(*) AS domains, COALESCE(SUM(version), 0) AS bumps, "
+                    "MAX(updated_at) AS updated_at FROM DataVersion")
+
+
+def format_data_version(rows) -> Optional[str]:
+    """
+    Version string from the DATA_VERSION_SQL result, or None when no importer has recorded
+    a version (e.g. the inventory was loaded from the generated .sql file).
+    """
+    if not rows or not rows[0].get("domains"):
+        return None
+    row = rows[0]
+    return f"dv:{row['domains']}:{row['bumps']}:{row['updated_at']}"
+
+
+def read_data_version(connection, tables) -> Optional[str]:
+    """
+    Data version of the inventory: the DataVersion counters when the importers maintain
+    them (one small read), otherwise CHECKSUM TABLE over `tables`, which scans them.
+    """
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(DATA_VERSION_SQL)
+            version = format_data_version(cursor.fetchall())
+        except Exception:
+            # Schema without DataVersion
+            version = None
+        if version is not None:
+            return version
+        cursor.execute("CHECKSUM TABLE " + ", ".join(tables))
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+    return "|".join(f"{row.get('Table')}={row.get('Checksum')}" for row in rows)
+
+
+# Columns worth indexing locally: join keys and names the model filters on
+_INDEXED_COLUMN = re.compile(r"^(.*_id|name|hostname|ip_address|alias|resource_type)$", re.IGNORECASE)
+
+
+class ReplicaError(Exception):
+    """Raised when a statement cannot be served from the replica; callers fall back to MariaDB."""
+
+
+class DialectError(ReplicaError):
+    """Raised when a MySQL statement has no faithful SQLite translation."""
+
+
+class ReplicaTimeoutError(ReplicaError):
+    """Raised when a statement ran past the replica's time limit; MariaDB would not do better."""
+
+
+# ---------------------------------------------------------------------------
+# MySQL -> SQLite dialect translation
+# ---------------------------------------------------------------------------
+
+# Constructs with no SQLite equivalent (or different semantics)
+_UNSUPPORTED = [
+    (re.compile(r"\bSTRAIGHT_JOIN\b|\bSQL_CALC_FOUND_ROWS\b|\bSQL_NO_CACHE\b", re.I), "query hints"),
+    (re.compile(r"\bFOR\s+UPDATE\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bINTO\s+(OUTFILE|DUMPFILE)\b", re.I), "locking/outfile"),
+    (re.compile(r"\bMATCH\s*\(.*?\)\s*AGAINST\b", re.I | re.S), "full-text search"),
+    (re.compile(r"\bCONVERT\s*\(.*?\bUSING\b", re.I | re.S), "CONVERT ... USING"),
+    (re.compile(r"\bINTERVAL\b", re.I), "date intervals"),
+    (re.compile(r"@"), "user variables"),
+    (re.compile(r"\|\|"), "|| (logical OR in MySQL)"),
+    (re.compile(r"\bCOUNT\s*\(\s*DISTINCT\s+[^()]*?,", re.I), "COUNT(DISTINCT a, b)"),
+    (re.compile(r"\bWITH\s+ROLLUP\b", re.I), "WITH ROLLUP"),
+]
+
+
+def _split_literals(sql: str) -> list:
+    """
+    Splits SQL into [(kind, text)] where kind is "code", "str" (a single-quoted literal,
+    re-quoted for SQLite) or "ident" (a backtick-quoted identifier).
+    MySQL double-quoted strings become single-quoted literals and backslash escapes are resolved.
+    """
+    parts = []
+    i, n = 0, len(sql)
+    code_start = 0
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"', "`"):
+            if code_start < i:
+                parts.append(("code", sql[code_start:i]))
+            quote = ch
+            i += 1
+            buf = []
+            while True:
+                if i >= n:
+                    raise DialectError("unterminated quoted literal")
+                c = sql[i]
+                if c == "\\" and quote != "`" and i + 1 < n:
+                    nxt = sql[i + 1]
+                    buf.append({"n": "\n", "t": "\t", "r": "\r", "0": "\0"}.get(nxt, nxt))
+                    i += 2
+                    continue
+                if c == quote:
+                    if i + 1 < n and sql[i + 1] == quote:
+                        buf.append(quote)
+                        i += 2
+                        continue
+                    i += 1
+                    break
+                buf.append(c)
+                i += 1
+            value = "".join(buf)
+            if quote == "`":
+                parts.append(("ident", '"' + value.replace('"', '""') + '"'))
+            else:
+                parts.append(("str", "'" + value.replace("'", "''") + "'"))
+            code_start = i
+        else:
+            i += 1
+    if code_start < n:
+        parts.append(("code", sql[code_start:]))
+    return parts
+
+
+def _translate_code(code: str, database: Optional[str]) -> str:
+    if database:
+        # serverconf.Domain -> Domain
+        code = re.sub(r"\b" + re.escape(database) + r"\s*\.\s*(?=[A-Za-z_\"])", "", code, flags=re.I)
+    code = re.sub(r"\bIF\s*\(", "IIF(", code, flags=re.I)
+    code = re.sub(r"\bSEPARATOR\b", ",", code, flags=re.I)
+    code = re.sub(r"\bAS\s+(UNSIGNED|SIGNED)(\s+INTEGER)?\b", "AS INTEGER", code, flags=re.I)
+    code = re.sub(r"\bAS\s+(CHAR|VARCHAR)\s*(\(\s*\d+\s*\))?", "AS TEXT", code, flags=re.I)
+    code = re.sub(r"\bRLIKE\b", "REGEXP", code, flags=re.I)
+    return code
+
+
+def translate_mysql_to_sqlite(sql: str, database: Optional[str] = None) -> str:
+    """
+    Translates a read-only MySQL/MariaDB statement into SQLite.
+
+    Raises:
+        DialectError: If the statement uses constructs without a faithful translation.
+    """
+    parts = _split_literals(sql.strip().rstrip(";").strip())
+    code_only = " ".join(text for kind, text in parts if kind == "code")
+    for pattern, label in _UNSUPPORTED:
+        if pattern.search(code_only):
+            raise DialectError(f"unsupported construct: {label}")
+    if re.search(r"\bGROUP_CONCAT\s*\(\s*DISTINCT\b", code_only, re.I) and re.search(r"\bSEPARATOR\b", code_only, re.I):
+        raise DialectError("unsupported construct: GROUP_CONCAT(DISTINCT ... SEPARATOR ...)")
+    if database:
+        # `serverconf`.`Domain` -> "Domain"
+        quoted_db = '"' + database + '"'
+        for idx in range(len(parts) - 1):
+            kind, text = parts[idx]
+            next_kind, next_text = parts[idx + 1]
+            if kind == "ident" and text.lower() == quoted_db.lower() and next_kind == "code" \
+                    and next_text.lstrip().startswith("."):
+                parts[idx] = ("code", "")
+                parts[idx + 1] = ("code", next_text.lstrip()[1:])
+    return "".join(_translate_code(text, database) if kind == "code" else text for kind, text in parts)
+
+
+# MySQL functions missing from SQLite, registered on each replica connection
+def _concat(*args):
+    if any(arg is None for arg in args):
+        return None
+    return "".join(str(arg) for arg in args)
+
+
+def _concat_ws(sep, *args):
+    if sep is None:
+        return None
+    return str(sep).join(str(arg) for arg in args if arg is not None)
+
+
+def _locate(substr, text, pos=1):
+    if substr is None or text is None:
+        return None
+    return str(text).lower().find(str(substr).lower(), max(int(pos), 1) - 1) + 1
+
+
+def _substring_index(text, delim, count):
+    if text is None or delim is None or count is None:
+        return None
+    text, delim, count = str(text), str(delim), int(count)
+    if count == 0 or not delim:
+        return ""
+    parts = text.split(delim)
+    return delim.join(parts[:count]) if count > 0 else delim.join(parts[count:])
+
+
+def _find_in_set(needle, haystack):
+    if needle is None or haystack is None:
+        return None
+    items = [item.lower() for item in str(haystack).split(",")]
+    needle = str(needle).lower()
+    return items.index(needle) + 1 if needle in items else 0
+
+
+def _regexp(pattern, text):
+    if pattern is None or text is None:
+        return None
+    # MySQL's default collation is case-insensitive
+    return 1 if re.search(str(pattern), str(text), re.IGNORECASE) else 0
+
+
+def _inet_aton(text):
+    try:
+        return int(ipaddress.IPv4Address(str(text)))
+    except (ipaddress.AddressValueError, ValueError):
+        return None
+
+
+def _inet_ntoa(number):
+    try:
+        return str(ipaddress.IPv4Address(int(number)))
+    except (ipaddress.AddressValueError, ValueError, TypeError):
+        return None
+
+
+def _register_functions(conn: sqlite3.Connection, database: Optional[str]):
+    conn.create_function("CONCAT", -1, _concat, deterministic=True)
+    conn.create_function("CONCAT_WS", -1, _concat_ws, deterministic=True)
+    conn.create_function("LOCATE", 2, _locate, deterministic=True)
+    conn.create_function("LOCATE", 3, _locate, deterministic=True)
+    conn.create_function("SUBSTRING_INDEX", 3, _substring_index, deterministic=True)
+    conn.create_function("FIND_IN_SET", 2, _find_in_set, deterministic=True)
+    conn.create_function("REGEXP", 2, _regexp, deterministic=True)
+    conn.create_function("INET_ATON", 1, _inet_aton, deterministic=True)
+    conn.create_function("INET_NTOA", 1, _inet_ntoa, deterministic=True)
+    conn.create_function("LCASE", 1, lambda v: None if v is None else str(v).lower(), deterministic=True)
+    conn.create_function("UCASE", 1, lambda v: None if v is None else str(v).upper(), deterministic=True)
+    conn.create_function("CHAR_LENGTH", 1, lambda v: None if v is None else len(str(v)), deterministic=True)
+    conn.create_function("DATABASE", 0, lambda: database)
+
+
+# ---------------------------------------------------------------------------
+# Replica
+# ---------------------------------------------------------------------------
+
+def _sqlite_value(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)) or value is None or isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def _column_type(values) -> str:
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool) or isinstance(value, int):
+            return "INTEGER"
+        if isinstance(value, (float, decimal.Decimal)):
+            return "REAL"
+        break
+    # MariaDB compares strings case-insensitively (utf8mb4_uca1400_ai_ci)
+    return "TEXT COLLATE NOCASE"
+
+
+class SQLiteReplica:
+    """
+    Thread-safe, read-only SQLite copy of the inventory tables.
+
+    Every thread queries the current snapshot through its own read-only connection, so
+    statements run in parallel; a rebuilt snapshot is picked up by each thread on its
+    next query, and queries keep using the old one while the rebuild runs.
+
+    Args:
+        connection_factory: Returns a context manager yielding a pymysql connection
+                            (e.g. ConnectionPool.connection) used for snapshots.
+        path: SQLite file path, or ":memory:".
+        check_interval: Seconds between data-version checks against MariaDB.
+        database: MariaDB schema name, stripped from qualified table names.
+        timeout: Seconds a statement may run before it is interrupted (0 = no limit).
+    """
+
+    def __init__(self, connection_factory: Callable, path: str = ":memory:",
+                 check_interval: float = 300, database: Optional[str] = None,
+                 tables=INVENTORY_TABLES, timeout: float = 0):
+        self._connection_factory = connection_factory
+        self.path = path
+        self.check_interval = check_interval
+        self.database = database
+        self.tables = tuple(tables)
+        self.timeout = timeout
+
+        self._conn = None                      # keeps the current snapshot open
+        self._uri = None                       # what reader connections open for it
+        self._generation = 0                   # bumped with every new snapshot
+        self._local = threading.local()        # this thread's reader connection
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()          # guards the snapshot fields and stats
+        self._refresh_lock = threading.Lock()  # one snapshot at a time
+        self._stats = {"queries": 0, "errors": 0, "translation_failures": 0,
+                       "refreshes": 0, "refresh_errors": 0, "last_refresh_s": None}
+
+    def _read_version(self, connection) -> Optional[str]:
+        return read_data_version(connection, self.tables)
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, uri=path.startswith("file:"))
+        _register_functions(conn, self.database)
+        return conn
+
+    def _reader_uri(self, generation: int) -> str:
+        if self.path == ":memory:":
+            # Named in-memory database (memdb VFS, SQLite >= 3.36) that every connection of the
+            # process can open; unlike a shared cache it lets readers run in parallel
+            return f"file:/aidb-replica-{id(self)}-{generation}?vfs=memdb"
+        return "file:" + urllib.parse.quote(os.path.abspath(self.path)) + "?mode=ro"
+
+    def _reader(self) -> sqlite3.Connection:
+        """
+        This thread's read-only connection to the current snapshot.
+        """
+        local = self._local
+        with self._lock:
+            uri, generation = self._uri, self._generation
+        if getattr(local, "generation", None) != generation:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            conn = self._open(uri)
+            conn.execute("PRAGMA query_only = ON")
+            # Checked every 1000 VM steps; returning True interrupts the statement
+            conn.set_progress_handler(lambda: time.monotonic() > local.deadline, 1000)
+            local.conn, local.generation = conn, generation
+        return local.conn
+
+    def _stored_version(self) -> Optional[str]:
+        """
+        Version recorded in an existing replica file, so restarts can skip the snapshot.
+        """
+        if self.path == ":memory:" or not os.path.isfile(self.path):
+            return None
+        try:
+            conn = sqlite3.connect(self.path)
+            try:
+                row = conn.execute("SELECT version FROM _replica_meta").fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else None
+
+    def _build(self, connection, version: Optional[str], generation: int) -> sqlite3.Connection:
+        """
+        Copies every inventory table into a fresh SQLite database.
+        File replicas are built next to the target and swapped in atomically.
+        """
+        build_path = self._reader_uri(generation) if self.path == ":memory:" else self.path + ".building"
+        if build_path != ":memory:" and os.path.exists(build_path):
+            os.remove(build_path)
+        target = self._open(build_path)
+        for table in self.tables:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT * FROM `{table}`")
+                rows = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+            column_defs = ", ".join(
+                f'"{col}" {_column_type(row.get(col) for row in rows)}' for col in columns
+            )
+            target.execute(f'CREATE TABLE "{table}" ({column_defs})')
+            placeholders = ", ".join("?" for _ in columns)
+            target.executemany(
+                f'INSERT INTO "{table}" VALUES ({placeholders})',
+                ([_sqlite_value(row.get(col)) for col in columns] for row in rows),
+            )
+            for col in columns:
+                if _INDEXED_COLUMN.match(col):
+                    target.execute(f'CREATE INDEX "idx_{table}_{col}" ON "{table}" ("{col}")')
+        target.execute("CREATE TABLE _replica_meta (version TEXT)")
+        target.execute("INSERT INTO _replica_meta VALUES (?)", (version,))
+        target.commit()
+        target.execute("ANALYZE")
+
+        if self.path != ":memory:":
+            target.close()
+            os.replace(build_path, self.path)
+            target = self._open(self.path)
+        target.execute("PRAGMA query_only = ON")
+        return target
+
+    def refresh(self, force: bool = False):
+        """
+        Re-snapshots the inventory if the data version changed (or `force` is set).
+        """
+        if not force and self._conn is not None and self._checked_at is not None \
+                and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        # With a snapshot in place, queries go on using it while another thread checks or rebuilds
+        if not self._refresh_lock.acquire(blocking=force or self._conn is None):
+            return
+        try:
+            self._refresh(force)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, force: bool):
+        # Another thread may have refreshed while this one waited for the lock
+        if not force and self._conn is not None and self._checked_at is not None \
+                and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        start = time.perf_counter()
+        generation = self._generation + 1
+        try:
+            with self._connection_factory() as connection:
+                version = self._read_version(connection)
+                if not force and self._conn is not None and version is not None and version == self._version:
+                    self._checked_at = time.monotonic()
+                    return
+                if not force and self._conn is None and version is not None \
+                        and version == self._stored_version():
+                    # Replica file from a previous run is still current
+                    new_conn = self._open(self.path)
+                    new_conn.execute("PRAGMA query_only = ON")
+                else:
+                    new_conn = self._build(connection, version, generation)
+        except Exception as e:
+            if self._conn is not None:
+                # MariaDB unreachable: keep answering from the current snapshot, check again later
+                with self._lock:
+                    self._checked_at = time.monotonic()
+                    self._stats["refresh_errors"] += 1
+                return
+            if isinstance(e, ReplicaError):
+                raise
+            raise ReplicaError(f"snapshot failed: {e}") from e
+
+        with self._lock:
+            old_conn, self._conn = self._conn, new_conn
+            self._uri = self._reader_uri(generation)
+            self._generation = generation
+            self._version = version
+            self._checked_at = time.monotonic()
+            self._stats["refreshes"] += 1
+            self._stats["last_refresh_s"] = round(time.perf_counter() - start, 3)
+        # Readers still on the old snapshot keep it alive until their next query
+        if old_conn is not None:
+            old_conn.close()
+
+    def current_version(self) -> Optional[str]:
+        """
+        Data version of the snapshot queries are answered from (refreshed first when due).
+        """
+        self.refresh()
+        with self._lock:
+            return self._version
+
+    def _translate(self, sql_str: str) -> str:
+        if not re.match(r"^\s*(\(\s*)*(SELECT|WITH)\b", sql_str, re.IGNORECASE):
+            raise ReplicaError("only SELECT statements are served from the replica")
+        return translate_mysql_to_sqlite(sql_str, self.database)
+
+    def can_serve(self, sql_str: str) -> bool:
+        """
+        Returns True if execute() will run the statement locally instead of sending it to MariaDB
+        (barring SQLite errors at run time).
+        """
+        try:
+            self._translate(sql_str)
+        except ReplicaError:
+            return False
+        return True
+
+    def execute(self, sql_str: str, max_rows: int = 0) -> ResultSet:
+        """
+        Runs a read-only statement against the replica and returns at most `max_rows` rows (0 = all).
+
+        Raises:
+            ReplicaTimeoutError: If the statement ran longer than `timeout` seconds.
+            ReplicaError: If the replica cannot serve the statement (caller should fall back).
+        """
+        try:
+            translated = self._translate(sql_str)
+        except DialectError:
+            with self._lock:
+                self._stats["translation_failures"] += 1
+            raise
+
+        self.refresh()
+        conn = self._reader()
+        self._local.deadline = time.monotonic() + self.timeout if self.timeout else float("inf")
+        try:
+            cursor = conn.execute(translated)
+            rows = ResultSet.from_cursor(cursor, max_rows)
+        except sqlite3.Error as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            if isinstance(e, sqlite3.OperationalError) and str(e) == "interrupted":
+                raise ReplicaTimeoutError(f"statement exceeded {self.timeout:g}s") from e
+            raise ReplicaError(f"SQLite error: {e}") from e
+        with self._lock:
+            self._stats["queries"] += 1
+        return rows
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["version"] = self._version
+        return snapshot
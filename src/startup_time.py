@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Startup-time check for the entry points.
+
+Each target is imported in a fresh interpreter, the way the entry point starts:
+    cli     main            (python main.py)
+    web     web_server      (what every gunicorn worker imports before serving)
+    gradio  gradio_chat     (python gradio_chat.py)
+
+The median wall time over --runs interpreters is compared with the target's budget, and
+one extra run under `python -X importtime` lists the slowest imports and fails the check
+when a heavy package the entry point must only load on first use (openai, langchain, ...)
+is imported at startup. With --warm-up the web worker also runs web_server.warm_up() and
+reports each step, i.e. the time until the worker answers ready on /readyz (needs the
+database and the LLM endpoint).
+
+Usage:
+    python startup_time.py
+    python startup_time.py --targets web --runs 10 --web-budget-ms 400 --warm-up
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (module imported, default budget in ms (0 = report only), packages that must not load at import)
+TARGETS = {
+    "cli": ("main", 300, ("openai", "langchain", "langchain_openai", "gradio", "flask")),
+    "web": ("web_server", 500, ("openai", "langchain", "langchain_openai", "gradio")),
+    "gradio": ("gradio_chat", 0, ("openai", "langchain", "langchain_openai", "flask")),
+}
+
+_WARM_UP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import web_server
+imported = time.perf_counter()
+web_server.warm_up(retry_interval=1.0)
+print(json.dumps({"import_ms": (imported - start) * 1000, "ready_ms": (time.perf_counter() - start) * 1000,
+                  "status": web_server._state["status"], "steps": web_server._state["steps"]}))
+"""
+
+
+def time_import(module: str) -> float:
+    """
+    Wall time in ms of a fresh interpreter importing `module` (interpreter start included).
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=SRC_DIR, check=True,
+                   stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def import_profile(module: str) -> list:
+    """
+    Runs `python -X importtime -c "import <module>"`.
+
+    Returns:
+        list: (module name, nesting depth, self ms, cumulative ms) in import order.
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=SRC_DIR,
+                               check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        self_us, cumulative_us, name = parts[0], parts[1], parts[2]
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((name.strip(), depth, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return entries
+
+
+def heavy_imports(entries: list, forbidden: tuple) -> list:
+    """
+    Forbidden top-level packages that were imported.
+    """
+    loaded = {name.split(".")[0] for name, _, _, _ in entries}
+    return [package for package in forbidden if package in loaded]
+
+
+def slowest_imports(entries: list, module: str, top: int) -> list:
+    """
+    The `top` imports made by `module` with the largest cumulative time that are not part of
+    another listed one (interpreter start-up imports are left out).
+    """
+    # importtime lists a module after everything it imported
+    end = max(i for i, entry in enumerate(entries) if entry[0] == module and entry[1] == 0)
+    start = end
+    while start > 0 and entries[start - 1][1] > 0:
+        start -= 1
+    ranked = sorted(entries[start:end], key=lambda entry: -entry[3])
+    chosen = []
+    for entry in ranked:
+        if len(chosen) >= top:
+            break
+        if all(not _contains(entries, other, entry) for other in chosen):
+            chosen.append(entry)
+    return chosen
+
+
+def _contains(entries: list, outer: tuple, inner: tuple) -> bool:
+    # Children precede their parent and are nested deeper, back to the previous entry at the parent's depth
+    index = entries.index(outer)
+    for entry in reversed(entries[:index]):
+        if entry[1] <= outer[1]:
+            return False
+        if entry == inner:
+            return True
+    return False
+
+
+def check_target(name: str, runs: int, budget_ms: float, top: int) -> bool:
+    module, _, forbidden = TARGETS[name]
+    samples = [time_import(module) for _ in range(runs)]
+    median = statistics.median(samples)
+    entries = import_profile(module)
+    heavy = heavy_imports(entries, forbidden)
+
+    over = budget_ms and median > budget_ms
+    verdict = "FAIL" if over or heavy else "ok"
+    budget = f"budget {budget_ms:g} ms" if budget_ms else "no budget"
+    print(f"{name:<7} import {module}: median {median:.0f} ms over {runs} runs "
+          f"(min {min(samples):.0f}, max {max(samples):.0f}), {budget}  {verdict}")
+    if heavy:
+        print(f"        loaded at startup, should be lazy: {', '.join(heavy)}")
+    for entry_name, _, _, cumulative in slowest_imports(entries, module, top):
+        print(f"        {cumulative:8.1f} ms  {entry_name}")
+    return verdict == "ok"
+
+
+def check_warm_up(timeout: float) -> bool:
+    try:
+        completed = subprocess.run([sys.executable, "-c", _WARM_UP_SCRIPT], cwd=SRC_DIR, timeout=timeout,
+                                   stdout=subprocess.PIPE, text=True)
+    except subprocess.TimeoutExpired:
+        print(f"web     warm-up did not finish within {timeout:g} s (database or LLM endpoint unreachable?)")
+        return False
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    print(f"web     ready after {report['ready_ms']:.0f} ms (import {report['import_ms']:.0f} ms), "
+          f"status {report['status']}")
+    for step, result in report["steps"].items():
+        error = f"  {result['error']}" if result.get("error") else ""
+        print(f"        {result['elapsed_ms']:8.1f} ms  {step}{error}")
+    return report["status"] == "ready"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure entry-point startup time against budgets.")
+    parser.add_argument("--targets", default="cli,web", help=f"comma-separated subset of {','.join(TARGETS)}")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per target")
+    for name, (_, budget, _) in TARGETS.items():
+        parser.add_argument(f"--{name}-budget-ms", type=float, default=budget,
+                            help=f"median import budget of the {name} target (0 = report only)")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports listed per target")
+    parser.add_argument("--warm-up", action="store_true", help="also time web_server.warm_up() until ready")
+    parser.add_argument("--warm-up-timeout", type=float, default=60, help="seconds before the warm-up is given up")
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    ok = True
+    for name in targets:
+        ok = check_target(name, max(1, args.runs), getattr(args, f"{name}_budget_ms"), args.top) and ok
+    if args.warm_up:
+        ok = check_warm_up(args.warm_up_timeout) and ok
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Per-question span tracing.
+
+A Trace is opened for every question by main.py and made current through a context
+variable; pipeline stages wrap their work in span(), and the DB runner and the LLM
+scheduler report round trips, rows and token usage to whatever span is current.
+Context variables follow asyncio tasks and asyncio.to_thread(), so concurrent
+statements and worker threads land in the right trace.
+
+Finished traces are appended to <TRACE_LOG_DIR>/traces-<pid>.jsonl by a background writer,
+and stage durations, DB round trips, rows and tokens feed the metrics served at /metrics.
+"""
+
+import atexit
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from chat_log_writer import JsonlLogWriter
+from config_reader import Config
+from metrics import REGISTRY
+
+QUESTIONS = REGISTRY.counter("aidb_questions_total", "Questions answered, by pipeline path and outcome.",
+                             ("kind", "path", "status"))
+QUESTION_DURATION = REGISTRY.histogram("aidb_question_duration_seconds", "End-to-end question latency.",
+                                       ("kind", "path"))
+STAGE_DURATION = REGISTRY.histogram("aidb_stage_duration_seconds", "Duration of pipeline stages (spans).",
+                                    ("stage",))
+DB_ROUND_TRIPS = REGISTRY.counter("aidb_db_round_trips_total", "Statements sent to a database.", ("source",))
+DB_ROWS = REGISTRY.counter("aidb_db_rows_total", "Rows returned by the database.", ("source",))
+LLM_REQUESTS = REGISTRY.counter("aidb_llm_requests_total", "Completed chat-completion requests.", ("model",))
+LLM_TOKENS = REGISTRY.counter("aidb_llm_tokens_total", "Tokens reported in the OpenAI usage field.",
+                              ("model", "type"))
+
+CURRENT_TRACE: ContextVar[Optional["Trace"]] = ContextVar("aidb_trace", default=None)
+_CURRENT_SPAN: ContextVar[Optional["Span"]] = ContextVar("aidb_span", default=None)
+
+
+class Span:
+    """
+    One timed stage; `attributes` collects counters and details reported while it was current.
+    """
+    __slots__ = ("span_id", "parent_id", "name", "start", "duration_ms", "attributes")
+
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, attributes: dict):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.attributes = attributes
+
+    def add(self, key: str, amount: float):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def end(self):
+        self.duration_ms = round((time.perf_counter() - self.start) * 1000, 2)
+        STAGE_DURATION.observe(self.duration_ms / 1000, stage=self.name)
+
+    def to_dict(self, trace_start: float) -> dict:
+        return {"id": self.span_id, "parent": self.parent_id, "name": self.name,
+                "start_ms": round((self.start - trace_start) * 1000, 2),
+                "duration_ms": self.duration_ms, "attributes": self.attributes}
+
+
+class Trace:
+    """
+    Spans and totals of one question. Used as a context manager it is current inside the
+    block, and is finished (recorded in the metrics and the trace file) on exit.
+
+    Args:
+        kind (str): "question" (process_question) or "stream" (process_question_stream).
+    """
+
+    def __init__(self, kind: str, question: str, language: str):
+        self.trace_id = uuid.uuid4().hex
+        self.kind = kind
+        self.question = question
+        self.language = language
+        self.start_time = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.attributes = {"path": "llm"}
+        self.totals = {"db_round_trips": 0, "db_rows": 0, "llm_requests": 0,
+                       "prompt_tokens": 0, "completion_tokens": 0}
+        self.status = "success"
+        self.error = None
+        self.duration_ms = None
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        """
+        Opens a span without making it current (for stages that yield, see span() otherwise).
+        """
+        with self._lock:
+            span = Span(len(self._spans) + 1, parent.span_id if parent else None, name, attributes)
+            self._spans.append(span)
+        return span
+
+    def add(self, key: str, amount: float):
+        with self._lock:
+            self.totals[key] += amount
+
+    def set_error(self, e: Exception):
+        self.status = "error"
+        self.error = {"type": type(e).__name__, "message": str(e)}
+
+    @contextmanager
+    def activate(self):
+        """
+        Makes this trace current for the block.
+        """
+        token = CURRENT_TRACE.set(self)
+        span_token = _CURRENT_SPAN.set(None)
+        try:
+            yield self
+        finally:
+            _CURRENT_SPAN.reset(span_token)
+            CURRENT_TRACE.reset(token)
+
+    def __enter__(self):
+        self._activation = self.activate()
+        return self._activation.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and self.status == "success":
+            self.set_error(exc)
+        self._activation.__exit__(exc_type, exc, tb)
+        self.finish()
+        return False
+
+    def finish(self):
+        """
+        Records the trace in the metrics and the trace file. Only the first call has an effect.
+        """
+        with self._lock:
+            if self.duration_ms is not None:
+                return
+            self.duration_ms = round((time.perf_counter() - self.start) * 1000, 2)
+        path = self.attributes["path"]
+        QUESTIONS.inc(kind=self.kind, path=path, status=self.status)
+        QUESTION_DURATION.observe(self.duration_ms / 1000, kind=self.kind, path=path)
+        writer = get_trace_writer()
+        if writer is not None:
+            writer.write(self.to_dict())
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [span.to_dict(self.start) for span in self._spans]
+            totals = dict(self.totals)
+        return {
+            "trace_id": self.trace_id,
+            "kind": self.kind,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "question": self.question,
+            "language": self.language,
+            "attributes": self.attributes,
+            "totals": totals,
+            "spans": spans,
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return CURRENT_TRACE.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Times the block as a stage of the current trace and makes it the current span.
+    Without a trace the duration still goes to the stage metric.
+
+    Yields:
+        Span: duration_ms is set once the block exits.
+    """
+    trace = CURRENT_TRACE.get()
+    parent = _CURRENT_SPAN.get()
+    if trace is not None:
+        current = trace.start_span(name, parent, **attributes)
+    else:
+        current = Span(0, None, name, attributes)
+    token = _CURRENT_SPAN.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _CURRENT_SPAN.reset(token)
+        current.end()
+
+
+def annotate(**attributes):
+    """
+    Sets attributes on the current span, if any.
+    """
+    current = _CURRENT_SPAN.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+async def trace_async_generator(trace: Trace, agen):
+    """
+    Iterates `agen` with `trace` current during every step and finishes the trace at the end.
+
+    Needed because a generator consumed through iterate_async_generator() resumes in a new
+    task, i.e. a fresh context, for every item. Spans inside `agen` must therefore not
+    enclose a yield; use Trace.start_span() for stages that do.
+    """
+    completed = False
+    try:
+        while True:
+            with trace.activate():
+                try:
+                    item = await agen.__anext__()
+                except StopAsyncIteration:
+                    completed = True
+                    return
+            yield item
+    except Exception as e:
+        trace.set_error(e)
+        raise
+    finally:
+        if not completed and trace.status == "success":
+            trace.status = "cancelled"
+        with trace.activate():
+            await agen.aclose()
+        trace.finish()
+
+
+def record_db_round_trip(source: str, rows: int):
+    """
+    Counts one statement sent to `source` ("mariadb" or "replica") and the rows it returned.
+    """
+    DB_ROUND_TRIPS.inc(source=source)
+    DB_ROWS.inc(rows, source=source)
+    trace = CURRENT_TRACE.get()
+    if trace is not None:
+        trace.add("db_round_trips", 1)
+        trace.add("db_rows", rows)
+    current = _CURRENT_SPAN.get()
+    if current is not None:
+        current.add("db_round_trips", 1)
+        current.add("db_rows", rows)
+
+
+def record_llm_request(model: str, wait_seconds: float = 0.0, retries: int = 0):
+    """
+    Counts one completed chat-completion request with its scheduler queue wait and retries.
+    """
+    LLM_REQUESTS.inc(model=model)
+    trace = CURRENT_TRACE.get()
+    if trace is not None:
+        trace.add("llm_requests", 1)
+    current = _CURRENT_SPAN.get()
+    if current is not None:
+        current.attributes["model"] = model
+        current.add("llm_wait_ms", round(wait_seconds * 1000, 2))
+        current.add("llm_retries", retries)
+
+
+def record_llm_usage(model: str, usage):
+    """
+    Adds the prompt and completion tokens of an OpenAI `usage` object (None is ignored).
+    """
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    LLM_TOKENS.inc(prompt_tokens, model=model, type="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model, type="completion")
+    trace = CURRENT_TRACE.get()
+    if trace is not None:
+        trace.add("prompt_tokens", prompt_tokens)
+        trace.add("completion_tokens", completion_tokens)
+    current = _CURRENT_SPAN.get()
+    if current is not None:
+        current.add("prompt_tokens", prompt_tokens)
+        current.add("completion_tokens", completion_tokens)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_trace_writer():
+    """
+    Returns the process-wide trace file writer, or None when Config.TRACE_LOG_DIR is empty.
+    """
+    global _writer
+    if not Config.TRACE_LOG_DIR:
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                # One file per process: gunicorn workers must not append to or rotate each other's file.
+                # Traces are diagnostics, so fsync at most once a second instead of per batch.
+                _writer = JsonlLogWriter(directory=Config.TRACE_LOG_DIR, basename=f"traces-{os.getpid()}",
+                                         fsync="interval")
+                atexit.register(_writer.close)
+    return _writer
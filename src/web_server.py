@@ -1,8 +1,156 @@
-from flask import Flask, render_template, request, jsonify
-from main import process_question
+import json
+import threading
+import time
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from main import process_question, process_question_stream, process_questions_batch
+from result_set import json_default
+from config_reader import Config
 
 app = Flask(__name__)
 
+# Lifecycle of this worker process: starting -> ready -> draining
+_state = {"status": "starting", "steps": {}, "in_flight": 0, "started_at": time.time()}
+_state_cond = threading.Condition()
+
+# Endpoints counted as in-flight questions for graceful draining
+QUESTION_ENDPOINTS = {'ask', 'ask_batch'}
+
+def _warm_up_step(name: str, fn, required: bool = True) -> bool:
+    start = time.perf_counter()
+    try:
+        fn()
+        result = {"ok": True}
+    except Exception as e:
+        result = {"ok": not required, "error": f"{type(e).__name__}: {e}"}
+        print(f"[WARNING] Warm-up step '{name}' failed: {e}")
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    with _state_cond:
+        _state["steps"][name] = result
+    return result["ok"]
+
+def _warm_db():
+    from db_runner import get_pool, run_sql_from_config, get_async_pool
+    from async_runner import run_coroutine
+    get_pool()
+    run_sql_from_config("SELECT 1")
+    # The async pipeline runs on the shared background loop with its own pool
+    run_coroutine(get_async_pool())
+
+def _warm_metadata():
+    from openai_sql import build_system_prompt
+    # With entity pruning this loads the entity index instead of the full metadata blocks
+    build_system_prompt("" if Config.PROMPT_ENTITY_PRUNING else None)
+
+def _warm_llm():
+    from openai_sql import SQL_MODEL
+    from llm_scheduler import get_async_client
+    from async_runner import run_coroutine
+    async def handshake():
+        # A cheap authenticated call opens the TLS connection the first question will reuse
+        await get_async_client().models.retrieve(SQL_MODEL)
+    run_coroutine(handshake())
+
+def warm_up(retry_interval: float = 5.0):
+    """
+    Prepares this worker before it is reported ready: database connections (sync pool and the
+    async pool on the pipeline loop), the metadata prompt cache and the first LLM client
+    handshake. Required steps are retried until they succeed; the LLM handshake is best effort.
+    """
+    while not (_warm_up_step("database", _warm_db) and _warm_up_step("metadata_prompt", _warm_metadata)):
+        if _state["status"] == "draining":
+            return
+        time.sleep(retry_interval)
+    _warm_up_step("llm_client", _warm_llm, required=False)
+    with _state_cond:
+        if _state["status"] == "starting":
+            _state["status"] = "ready"
+            _state["ready_after_s"] = round(time.time() - _state["started_at"], 3)
+
+def start_warm_up() -> threading.Thread:
+    """
+    Runs warm_up() in the background so /healthz answers while the worker is still warming.
+    """
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def begin_drain():
+    """
+    Stops reporting ready and refuses new questions; in-flight ones keep running.
+    """
+    with _state_cond:
+        _state["status"] = "draining"
+        _state_cond.notify_all()
+
+def wait_for_drain(timeout: float) -> bool:
+    """
+    Blocks until no question is in flight or `timeout` seconds passed. Returns True if drained.
+    """
+    deadline = time.monotonic() + timeout
+    with _state_cond:
+        while _state["in_flight"] > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            _state_cond.wait(remaining)
+    return True
+
+def _finish_question():
+    with _state_cond:
+        _state["in_flight"] -= 1
+        _state_cond.notify_all()
+
+@app.before_request
+def _track_question():
+    if request.endpoint not in QUESTION_ENDPOINTS:
+        return None
+    with _state_cond:
+        if _state["status"] == "draining":
+            return jsonify({'error': 'Server is shutting down'}), 503, {'Retry-After': '5'}
+        _state["in_flight"] += 1
+    # Runs when the response is closed, i.e. after the last streamed event as well
+    request.environ["aidb.finish_question"] = True
+    return None
+
+@app.after_request
+def _release_question(response):
+    if request.environ.pop("aidb.finish_question", False):
+        response.call_on_close(_finish_question)
+    return response
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: warm-up finished and not shutting down
+    with _state_cond:
+        body = {
+            'status': _state["status"],
+            'in_flight': _state["in_flight"],
+            'steps': dict(_state["steps"]),
+        }
+    return jsonify(body), (200 if body['status'] == 'ready' else 503)
+
+@app.route('/llm_stats', methods=['GET'])
+def llm_stats():
+    # LLM call scheduler queues and retries, prompt-token savings and questions that skipped the LLM
+    from llm_scheduler import get_llm_scheduler_stats
+    from prompt_helper import get_prompt_pruning_stats
+    from fast_path import get_fast_path_stats
+    stats = get_llm_scheduler_stats()
+    stats["prompt_pruning"] = get_prompt_pruning_stats()
+    stats["fast_path"] = get_fast_path_stats()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus scrape endpoint: stage durations, DB round trips and rows, LLM tokens (this worker only)
+    from metrics import REGISTRY, CONTENT_TYPE
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/', methods=['GET'])
 def index():
     return render_template('index.html')
@@ -15,6 +163,14 @@ def ask():
     
     if not question:
         return jsonify({'error': 'Question is required'}), 400
+
+    # Stream pipeline stages and summary tokens as server-sent events
+    if data.get('stream') or request.accept_mimetypes.best == 'text/event-stream':
+        return Response(
+            stream_with_context(_sse_events(question, language)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
     
     try:
         result = process_question(question, language)  # Pass language parameter to process_question
@@ -22,5 +178,56 @@ def ask():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/ask_batch', methods=['POST'])
+def ask_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    questions = data.get('questions') or []
+    language = data.get('language', 'en')
+
+    if not isinstance(questions, list) or not questions:
+        return jsonify({'error': 'A non-empty list of questions is required'}), 400
+    if len(questions) > Config.BATCH_MAX_QUESTIONS:
+        return jsonify({'error': f'At most {Config.BATCH_MAX_QUESTIONS} questions per batch'}), 400
+
+    max_concurrency = data.get('max_concurrency')
+    if max_concurrency is not None:
+        try:
+            if isinstance(max_concurrency, (bool, float)):
+                raise ValueError(max_concurrency)
+            max_concurrency = int(max_concurrency)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'max_concurrency must be an integer'}), 400
+        # Callers may lower the fan-out, never raise it above the server limit
+        max_concurrency = max(1, min(max_concurrency, Config.BATCH_MAX_CONCURRENCY))
+
+    try:
+        return jsonify(process_questions_batch(questions, language, max_concurrency))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False, default=json_default)}\n\n"
+
+def _sse_events(question: str, language: str):
+    """
+    Translates process_question_stream() events into server-sent event frames.
+    """
+    for event in process_question_stream(question, language):
+        name = event["event"]
+        if name == "sql_generated":
+            yield _sse(name, {'sql': event['sql']})
+        elif name == "rows_fetched":
+            yield _sse(name, {'results': event['results']})
+        elif name == "summary_token":
+            yield _sse(name, {'text': event['text']})
+        elif name == "done":
+            yield _sse(name, {'summary': str(event['response'])})
+        elif name == "error":
+            yield _sse(name, {'error': event['error']['message']})
+
 if __name__ == '__main__':
+    # Development server; production: gunicorn -c gunicorn.conf.py web_server:app
+    start_warm_up()
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file